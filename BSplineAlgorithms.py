@@ -136,6 +136,8 @@ class BSplineAlgorithms(object):
         self.REL_TOL_CLOSED = tol
         if tol > 0.0:
             self.tol = tol # parametric tolerance
+        # number of intersections computed with the distToShape fallback
+        self.nbFallbacks = 0
     def error(self,mes):
         print(mes)
     def scale(self, c):
@@ -156,48 +158,10 @@ class BSplineAlgorithms(object):
                 dist = pFirst.distanceToPoint(points[uidx][vidx])
                 theScale = max(theScale, dist)
         return theScale
-    def bsplineBasisMat(self, degree, knots, params, derivOrder):
-        import numpy as np
-        #from scipy import linalg
-        import nurbs_tools # import BsplineBasis
-        ncp = len(knots) - degree - 1
-        mx = np.array([[0.]*ncp for i in range(len(params))])
-        #math_Matrix mx(1, params.Length(), 1, ncp);
-        #mx.Init(0.);
-        bspl_basis = np.array([[0.]*(ncp) for i in range(derivOrder + 1)])
-        #math_Matrix bspl_basis(1, derivOrder + 1, 1, degree + 1);
-        #bspl_basis.Init(0.);
-        #debug("params %s"%str(params))
-        for iparm in range(len(params)): # for (Standard_Integer iparm = 1; iparm <= params.Length(); ++iparm) {
-            basis_start_index = 0
-            
-            bb = nurbs_tools.BsplineBasis()
-            bb.knots = knots
-            bb.degree = degree
-            #span = bb.find_span(params[iparm])
-            #res = bb.ders_basis_funs( span, params[iparm], derivOrder)
-            for irow in range(derivOrder+1):
-                #debug("irow %s"%str(irow))
-                #debug("bspl_basis[irow] %s"%str(bspl_basis[irow]))
-                bspl_basis[irow] = bb.evaluate(params[iparm],d=irow)
-                #debug("bspl_basis[irow] %s"%str(bspl_basis[irow]))
-                #for ival in range(len(res[irow])):
-                    #bspl_basis[irow][ival+span] = res[irow][ival]
-            ##if OCC_VERSION_HEX >= VERSION_HEX_CODE(7,1,0)
-                    #BSplCLib::EvalBsplineBasis(derivOrder, degree + 1, knots, params.Value(iparm), basis_start_index, bspl_basis);
-            ##else
-                    #BSplCLib::EvalBsplineBasis(1, derivOrder, degree + 1, knots, params.Value(iparm), basis_start_index, bspl_basis);
-            ##endif
-            #if(derivOrder > 0):
-                #help_vector = np.array([0.]*ncp) #(1, ncp);
-                ###help_vector.Init(0.);
-                ##help_vector.Set(basis_start_index, basis_start_index + degree, bspl_basis.Row(derivOrder + 1));
-                #mx[iparm] = bspl_basis[derivOrder] #mx.SetRow(iparm, help_vector);
-            #else:
-                #mx[iparm] = bspl_basis[derivOrder] #  mx.Set(iparm, iparm, basis_start_index, basis_start_index + degree, bspl_basis);
-            for i in range(len(bspl_basis[derivOrder])):
-                mx[iparm][basis_start_index+i] = bspl_basis[derivOrder][i]
-        return(mx)
+    def bsplineBasisMat(self, degree, knots, params, derivOrder, form="dense"):
+        # all the parameters are evaluated at once, see nurbs_tools.basis_matrix
+        import nurbs_tools
+        return(nurbs_tools.basis_matrix(degree, knots, params, derivOrder, form))
     def intersections(self, spline1, spline2, tol3d):
         # light weight simple minimizer
         # check parametrization of B-splines beforehand
@@ -249,6 +213,7 @@ class BSplineAlgorithms(object):
 
         if len(inters) == 0:
             debug("intersectCC failed !")
+            self.nbFallbacks += 1
             e1 = spline1.toShape()
             e2 = spline2.toShape()
             d,pts,info = e1.distToShape(e2)
@@ -302,36 +267,48 @@ class BSplineAlgorithms(object):
         interpPointsVDir = [0] * nPointsAdapt
 
         # now continue to create new control points by interpolating the remaining columns of controlPoints in Skinning direction (here v-direction) by B-splines
-        for cpUIdx in range(numControlPointsU): #(int cpUIdx = 1; cpUIdx <= numControlPointsU; ++cpUIdx) {
-            for cpVIdx in range(nPointsAdapt): #(int cpVIdx = 1; cpVIdx <= nPointsAdapt; ++cpVIdx) {
-                #print("%dx%d - %d"%(cpUIdx, cpVIdx, compatSplines[cpVIdx].NbPoles))
-                interpPointsVDir[cpVIdx] = compatSplines[cpVIdx].getPole(cpUIdx+1)
-            interpSpline = Part.BSplineCurve()
-            #print("interpSpline")
-            #print(interpPointsVDir[:2])
-            #print(vParameters)
-            #print(makeClosed)
-            interpSpline.interpolate(Points=interpPointsVDir, Parameters=vParameters, PeriodicFlag=makeClosed, Tolerance=tolerance)
-            
-            #debug(interpSpline)
-            if makeClosed:
-                self.clampBSpline(interpSpline)
-            #debug(interpSpline)
-
-            if cpUIdx == 0:
-                degreeV = interpSpline.Degree
-                knotsV = interpSpline.getKnots()
-                multsV = interpSpline.getMultiplicities()
-                cpSurf = [[0]*interpSpline.NbPoles for i in range(numControlPointsU)] # new TColgp_HArray2OfPnt(1, static_cast<Standard_Integer>(numControlPointsU), 1, interpSpline->NbPoles());
-
-            # the final surface control points are the control points resulting from
-            # the interpolation
-            for i in range(interpSpline.NbPoles): # for (int i = cpSurf->LowerCol(); i <= cpSurf->UpperCol(); ++i) {
-                cpSurf[cpUIdx][i] = interpSpline.getPole(i+1)
-
-            # check degree always the same
-            assert(degreeV == interpSpline.Degree)
+        if not makeClosed:
+            # all the columns share the same parameters, hence the same interpolation matrix :
+            # it is factored once, and solved for all the columns together
+            import numpy as np
+            import nurbs_tools
+            cp = np.array([[(p.x, p.y, p.z) for p in c.getPoles()] for c in compatSplines])
+            poles, interpSpline = self.interpolateColumns(cp.transpose(1,0,2), vParameters, tolerance)
+            degreeV = interpSpline.Degree
+            knotsV = interpSpline.getKnots()
+            multsV = interpSpline.getMultiplicities()
+            cpSurf = nurbs_tools.array_to_vectors(poles)
+        else:
+            for cpUIdx in range(numControlPointsU): #(int cpUIdx = 1; cpUIdx <= numControlPointsU; ++cpUIdx) {
+                for cpVIdx in range(nPointsAdapt): #(int cpVIdx = 1; cpVIdx <= nPointsAdapt; ++cpVIdx) {
+                    #print("%dx%d - %d"%(cpUIdx, cpVIdx, compatSplines[cpVIdx].NbPoles))
+                    interpPointsVDir[cpVIdx] = compatSplines[cpVIdx].getPole(cpUIdx+1)
+                interpSpline = Part.BSplineCurve()
+                #print("interpSpline")
+                #print(interpPointsVDir[:2])
+                #print(vParameters)
+                #print(makeClosed)
+                interpSpline.interpolate(Points=interpPointsVDir, Parameters=vParameters, PeriodicFlag=makeClosed, Tolerance=tolerance)
             
+                #debug(interpSpline)
+                if makeClosed:
+                    self.clampBSpline(interpSpline)
+                #debug(interpSpline)
+
+                if cpUIdx == 0:
+                    degreeV = interpSpline.Degree
+                    knotsV = interpSpline.getKnots()
+                    multsV = interpSpline.getMultiplicities()
+                    cpSurf = [[0]*interpSpline.NbPoles for i in range(numControlPointsU)] # new TColgp_HArray2OfPnt(1, static_cast<Standard_Integer>(numControlPointsU), 1, interpSpline->NbPoles());
+
+                # the final surface control points are the control points resulting from
+                # the interpolation
+                for i in range(interpSpline.NbPoles): # for (int i = cpSurf->LowerCol(); i <= cpSurf->UpperCol(); ++i) {
+                    cpSurf[cpUIdx][i] = interpSpline.getPole(i+1)
+
+                # check degree always the same
+                assert(degreeV == interpSpline.Degree)
+
         knotsU = firstCurve.getKnots()
         multsU = firstCurve.getMultiplicities()
         
@@ -350,6 +327,23 @@ class BSplineAlgorithms(object):
         skinnedSurface.buildFromPolesMultsKnots(cpSurf, multsU, multsV, knotsU, knotsV, firstCurve.isPeriodic(), makeClosed, degreeU, degreeV)
 
         return skinnedSurface
+    def interpolateColumns(self, columns, parameters, tolerance):
+        """Interpolate several columns of points with the same parameters (non periodic).
+        columns is a numpy array of shape (nb_columns, nb_points, 3)
+        The first column is interpolated by OCC, to get the degree and knots.
+        The interpolation matrix is then solved once for all the columns.
+        Returns the poles array (nb_columns, nb_poles, 3) and the first interpolated curve"""
+        import numpy as np
+        first = Part.BSplineCurve()
+        first.interpolate(Points=[FreeCAD.Vector(*p) for p in columns[0]], Parameters=parameters, PeriodicFlag=False, Tolerance=tolerance)
+        nCols, nPts = columns.shape[0], columns.shape[1]
+        # interpolation without tangent constraints : as many poles as points
+        assert(first.NbPoles == nPts)
+        mat = self.bsplineBasisMat(first.Degree, first.KnotSequence, parameters, 0)
+        rhs = columns.transpose(1,0,2).reshape(nPts, nCols*3)
+        sol = np.linalg.solve(mat, rhs)
+        poles = sol.reshape(nPts, nCols, 3).transpose(1,0,2)
+        return(poles, first)
     def matchDegree(self, curves):
         maxDegree = 0
         for bs in curves: #(std::vector<Handle(Geom_BSplineCurve) >::const_iterator it = bsplines.begin(); it != bsplines.end(); ++it) {
@@ -401,16 +395,26 @@ class BSplineAlgorithms(object):
 
         # first interpolate all points by B-splines in u-direction
         uSplines = list()
-        for cpVIdx in range(len(points[0])): #for (int cpVIdx = points.LowerCol(); cpVIdx <= points.UpperCol(); ++cpVIdx) {
-            points_u = [0]*nPointsUpper
-            for iPointU in range(nPointsUpper):#for (int iPointU = points_u->Lower(); iPointU <= points_u->Upper(); ++iPointU) {
-                points_u[iPointU] = points[iPointU][cpVIdx]
-            curve = Part.BSplineCurve()
-            curve.interpolate(Points=points_u, Parameters=uParams, PeriodicFlag=makeUDirClosed, Tolerance=tolerance)
-
-            if makeUDirClosed:
-                self.clampBSpline(curve)
-            uSplines.append(curve)
+        if not makeUDirClosed:
+            # same interpolation matrix for all the columns, see interpolateColumns
+            import numpy as np
+            pts = np.array([[(p.x, p.y, p.z) for p in row] for row in points[:nPointsUpper]])
+            poles, firstSpline = self.interpolateColumns(pts.transpose(1,0,2), uParams, tolerance)
+            for cpVIdx in range(len(poles)):
+                curve = Part.BSplineCurve()
+                curve.buildFromPolesMultsKnots([FreeCAD.Vector(*p) for p in poles[cpVIdx]], firstSpline.getMultiplicities(), firstSpline.getKnots(), False, firstSpline.Degree)
+                uSplines.append(curve)
+        else:
+            for cpVIdx in range(len(points[0])): #for (int cpVIdx = points.LowerCol(); cpVIdx <= points.UpperCol(); ++cpVIdx) {
+                points_u = [0]*nPointsUpper
+                for iPointU in range(nPointsUpper):#for (int iPointU = points_u->Lower(); iPointU <= points_u->Upper(); ++iPointU) {
+                    points_u[iPointU] = points[iPointU][cpVIdx]
+                curve = Part.BSplineCurve()
+                curve.interpolate(Points=points_u, Parameters=uParams, PeriodicFlag=makeUDirClosed, Tolerance=tolerance)
+
+                if makeUDirClosed:
+                    self.clampBSpline(curve)
+                uSplines.append(curve)
 
         # now create a skinned surface with these B-splines which represents the interpolating surface
         interpolatingSurf = self.curvesToSurface(uSplines, vParams, makeVDirClosed )
@@ -63,48 +63,64 @@ def insertKnot(knot, count, degree, knots, mults, tol = 1e-5):
         # knot found, increase multiplicity
         mults[pos] = min(mults[pos] + count, degree)
         
-def bsplineBasisMat(degree, knots, params, derivOrder):
+def bsplineBasisMat(degree, knots, params, derivOrder, form="dense"):
+    # all the parameters are evaluated at once, see nurbs_tools.basis_matrix
+    import nurbs_tools
+    return(nurbs_tools.basis_matrix(degree, knots, params, derivOrder, form))
+
+def normal_matrix_banded(first, values, ncp):
+    """Build the normal matrix A.T*A of a basis matrix A given in compact form
+    (see nurbs_tools.basis_matrix), in lower banded storage : band[k, j] = M[j+k, j]"""
     import numpy as np
-    #from scipy import linalg
-    import nurbs_tools # import BsplineBasis
-    ncp = len(knots) - degree - 1
-    mx = np.array([[0.]*ncp for i in range(len(params))])
-    #math_Matrix mx(1, params.Length(), 1, ncp);
-    #mx.Init(0.);
-    bspl_basis = np.array([[0.]*(ncp) for i in range(derivOrder + 1)])
-    #math_Matrix bspl_basis(1, derivOrder + 1, 1, degree + 1);
-    #bspl_basis.Init(0.);
-    #debug("params %s"%str(params))
-    for iparm in range(len(params)): # for (Standard_Integer iparm = 1; iparm <= params.Length(); ++iparm) {
-        basis_start_index = 0
-        
-        bb = nurbs_tools.BsplineBasis()
-        bb.knots = knots
-        bb.degree = degree
-        #span = bb.find_span(params[iparm])
-        #res = bb.ders_basis_funs( span, params[iparm], derivOrder)
-        for irow in range(derivOrder+1):
-            #debug("irow %s"%str(irow))
-            #debug("bspl_basis[irow] %s"%str(bspl_basis[irow]))
-            bspl_basis[irow] = bb.evaluate(params[iparm],d=irow)
-            #debug("bspl_basis[irow] %s"%str(bspl_basis[irow]))
-            #for ival in range(len(res[irow])):
-                #bspl_basis[irow][ival+span] = res[irow][ival]
-        ##if OCC_VERSION_HEX >= VERSION_HEX_CODE(7,1,0)
-                #BSplCLib::EvalBsplineBasis(derivOrder, degree + 1, knots, params.Value(iparm), basis_start_index, bspl_basis);
-        ##else
-                #BSplCLib::EvalBsplineBasis(1, derivOrder, degree + 1, knots, params.Value(iparm), basis_start_index, bspl_basis);
-        ##endif
-        #if(derivOrder > 0):
-            #help_vector = np.array([0.]*ncp) #(1, ncp);
-            ###help_vector.Init(0.);
-            ##help_vector.Set(basis_start_index, basis_start_index + degree, bspl_basis.Row(derivOrder + 1));
-            #mx[iparm] = bspl_basis[derivOrder] #mx.SetRow(iparm, help_vector);
-        #else:
-            #mx[iparm] = bspl_basis[derivOrder] #  mx.Set(iparm, iparm, basis_start_index, basis_start_index + degree, bspl_basis);
-        for i in range(len(bspl_basis[derivOrder])):
-            mx[iparm][basis_start_index+i] = bspl_basis[derivOrder][i]
-    return(mx)
+    p = values.shape[1] - 1
+    band = np.zeros((p+1, ncp))
+    for k in range(p+1):
+        for i in range(p+1-k):
+            band[k] += np.bincount(first+i, weights=values[:,i]*values[:,i+k], minlength=ncp)
+    return(band)
+
+def cholesky_banded(band, eps=None):
+    """Cholesky factorization of a symmetric positive definite banded matrix,
+    in lower banded storage. Returns L in the same storage.
+    Raises numpy.linalg.LinAlgError if the matrix is not numerically positive definite,
+    i.e. if a pivot is <= eps * norm of the matrix (eps defaults to n times the machine epsilon).
+    This happens with a rank deficient normal matrix (too few points in a knot span)"""
+    import numpy as np
+    L = np.array(band, dtype=float)
+    p = L.shape[0] - 1
+    n = L.shape[1]
+    if eps is None:
+        eps = n * np.finfo(float).eps
+    # bound of the infinity norm : each row has at most 2p+1 non zero terms
+    tol = eps * (2*p+1) * np.abs(L).max() if L.size else 0.
+    for j in range(n):
+        # also rejects nan pivots
+        if not L[0,j] > tol:
+            raise np.linalg.LinAlgError("Matrix is not positive definite (pivot %g at row %d)"%(L[0,j], j))
+        L[0,j] = np.sqrt(L[0,j])
+        kn = min(p, n-j-1)
+        if kn > 0:
+            L[1:kn+1,j] /= L[0,j]
+            col = L[1:kn+1,j]
+            for a in range(1, kn+1):
+                L[0:kn-a+1,j+a] -= col[a-1:kn] * col[a-1]
+    return(L)
+
+def cho_solve_banded(L, rhs):
+    """Solve L*L.T*x = rhs, with L from cholesky_banded.
+    rhs can hold several right hand sides (one per column)"""
+    import numpy as np
+    p = L.shape[0] - 1
+    n = L.shape[1]
+    x = np.array(rhs, dtype=float).reshape(n, -1)
+    for j in range(n):
+        x[j] /= L[0,j]
+        kn = min(p, n-j-1)
+        x[j+1:j+kn+1] -= np.outer(L[1:kn+1,j], x[j])
+    for j in range(n-1, -1, -1):
+        kn = min(p, n-j-1)
+        x[j] = (x[j] - np.dot(L[1:kn+1,j], x[j+1:j+kn+1])) / L[0,j]
+    return(x.reshape(np.shape(rhs)))
 
 class BSplineApproxInterp(object):
     # used in BSplineAlgorithms.reparametrizeBSplineContinuouslyApprox
@@ -116,6 +132,36 @@ class BSplineApproxInterp(object):
         self.C2Continuous = continuous_if_closed
         self.indexOfInterpolated = list()
         self.indexOfKinks = list()
+        # linear solver used by python_solve : "dense" or "banded"
+        self.solver = "banded"
+        # incremental mode : the parts of the system that don't depend
+        # on the approximated parameters are cached between python_solve calls
+        self.incremental = True
+        self.clearCache()
+    def clearCache(self):
+        self.cache = dict()
+        # number of cached items that were built / reused
+        self.cacheStats = {"built": 0, "skipped": 0}
+    def cached(self, table, key, build):
+        if not self.incremental:
+            return(build())
+        if key in table:
+            self.cacheStats["skipped"] += 1
+            return(table[key])
+        self.cacheStats["built"] += 1
+        table[key] = build()
+        return(table[key])
+    def knotData(self, knots, mults):
+        # data that depends only on the knot vector
+        import numpy as np
+        def build():
+            flatKnots = []
+            for i in range(len(knots)):
+                flatKnots += [knots[i]]*mults[i]
+            return({"flatKnots": np.array(flatKnots, dtype=float),
+                    "interpolation": dict(),
+                    "continuity": dict()})
+        return(self.cached(self.cache, (tuple(knots), tuple(mults)), build))
     def InterpolatePoint(self, pointIndex, withKink):
         if not pointIndex in self.indexOfApproximated:
             debug("Invalid index in CTiglBSplineApproxInterp::InterpolatePoint")
@@ -124,9 +170,12 @@ class BSplineApproxInterp(object):
             debug("Successfully switched point #%d from approx to interp"%(pointIndex))
             self.indexOfApproximated.remove(pointIndex)
             self.indexOfInterpolated.append(int(pointIndex))
+            self.clearCache()
         if withKink:
             self.indexOfKinks.append(pointIndex)
-    def FitCurveOptimal(self, initialParms, maxIter):
+    def FitCurveOptimal(self, initialParms, maxIter, minImprovement=1e-6):
+        # the iterations stop when the relative improvement of the error
+        # falls below minImprovement
         parms = list()
         # compute initial parameters, if initialParms empty
         if len(initialParms) == 0:
@@ -157,7 +206,7 @@ class BSplineApproxInterp(object):
         debug("error = %f"%error)
         debug("(%0.4f - %0.4f)/max(%0.4f,1e-6) = %0.5f "%(old_error,error,error,((old_error-error)/max(error, 1e-6))))
 
-        while ( (error>0) and ((old_error-error)/max(error, 1e-6) > 1e-6) and (iteration < maxIter) ):
+        while ( (error>0) and ((old_error-error)/max(error, 1e-6) > minImprovement) and (iteration < maxIter) ):
             debug("FitCurveOptimal iteration #%d"%iteration)
             old_error = error
             self.optimizeParameters(result, parms)
@@ -165,7 +214,7 @@ class BSplineApproxInterp(object):
             debug("error = %f"%error)
             debug("(%0.4f - %0.4f)/max(%0.4f,1e-6) = %0.5f "%(old_error,error,error,((old_error-error)/max(error, 1e-6))))
             iteration += 1
-        
+        debug("FitCurveOptimal : %d iterations, %d cached items built, %d rebuilds skipped"%(iteration, self.cacheStats["built"], self.cacheStats["skipped"]))
         return(result,error)
     def computeParameters(self, alpha):
         sum = 0.0
@@ -225,17 +274,20 @@ class BSplineApproxInterp(object):
         #debug("computeKnots(ncp, params, knots, mults):\n%s\n%s\n%s\n%s"%(ncp, parms, knots, mults))
         return(knots, mults)
     def maxDistanceOfBoundingBox(self, points):
+        import numpy as np
+        pts = np.array([[p.x, p.y, p.z] for p in points], dtype=float).reshape(-1,3)
         maxDistance = 0.
-        for i in range(len(points)): #(int i = points.Lower(); i <= points.Upper(); ++i) {
-            for j in range(len(points)): #for (int j = points.Lower(); j <= points.Upper(); ++j) {
-                distance = points[i].distanceToPoint(points[j])
-                if (maxDistance < distance):
-                    maxDistance = distance
+        # rows are processed by blocks to limit memory use
+        for i in range(0, len(pts), 256):
+            dist2 = np.sum((pts[i:i+256,None,:] - pts[None,:,:])**2, axis=2)
+            maxDistance = max(maxDistance, float(np.sqrt(dist2.max())))
         return(maxDistance)
     def isClosed(self):
-        maxDistance = self.maxDistanceOfBoundingBox(self.pnts)
-        error = 1e-12*maxDistance
-        return(self.pnts[0].distanceToPoint(self.pnts[-1]) < error)
+        def build():
+            maxDistance = self.maxDistanceOfBoundingBox(self.pnts)
+            error = 1e-12*maxDistance
+            return(self.pnts[0].distanceToPoint(self.pnts[-1]) < error)
+        return(self.cached(self.cache, "closed", build))
     def firstAndLastInterpolated(self):
         first = 0 in self.indexOfInterpolated
         last = (len(self.pnts) - 1) in self.indexOfInterpolated
@@ -272,27 +324,17 @@ class BSplineApproxInterp(object):
             continuity_entries[2] = diff0_1 - diff0_2
 
         return(continuity_entries)
+    def pointsArray(self, indices=None):
+        import numpy as np
+        pts = self.cached(self.cache, "points", lambda: np.array([[p.x, p.y, p.z] for p in self.pnts], dtype=float).reshape(-1,3))
+        if indices is None:
+            return(pts)
+        return(pts[list(indices)])
     def python_solve(self, params, knots, mults):
         import numpy as np
-        #debug("python_solve(params, knots, mults):\n%s\n%s\n%s"%(params, knots, mults))
-        
-        # 
-        
-        # TODO knots and mults are OCC arrays (1-based)
-        # TODO I replaced the following OCC objects with numpy arrays:
-        #math_Matrix (Init, Set, Transposed, Multiplied, )
-        #math_Gauss (Solve, IsDone)
-        #math_Vector (Set)
         # compute flat knots to solve system
-        
-        # TODO check code below !!!
-        #nFlatKnots = BSplCLib::KnotSequenceLength(mults, self.degree, False)
-        #TColStd_Array1OfReal flatKnots(1, nFlatKnots)
-        #BSplCLib::KnotSequence(knots, mults, flatKnots)
-        flatKnots = [] 
-        for i in range(len(knots)):
-            flatKnots += [knots[i]]*mults[i]
-            
+        knotData = self.knotData(knots, mults)
+        flatKnots = knotData["flatKnots"]
 
         n_apprxmated = len(self.indexOfApproximated)
         n_intpolated = len(self.indexOfInterpolated)
@@ -303,7 +345,7 @@ class BSplineApproxInterp(object):
             if self.firstAndLastInterpolated():
                 # Remove C0 as they are already equal by design
                 n_continuityConditions -= 1
-        
+
         # Number of control points required
         nCtrPnts = len(flatKnots) - self.degree - 1
 
@@ -314,191 +356,153 @@ class BSplineApproxInterp(object):
         if (n_apprxmated == 0 and not nCtrPnts == (n_intpolated + n_continuityConditions)):
             raise RuntimeError("Wrong number of control points for curve interpolation!")
 
-        # Build left hand side of the equation
-        n_vars = nCtrPnts + n_intpolated + n_continuityConditions
-        lhs = np.array([[0.]*(n_vars) for i in range(n_vars)])
-        #math_Matrix lhs(1, n_vars, 1, n_vars)
-        #lhs.Init(0.)
-        
-        # Allocate right hand side
-        #math_Vector rhsx(1, n_vars)
-        #math_Vector rhsy(1, n_vars)
-        #math_Vector rhsz(1, n_vars)
-        rhsx = np.array([0.]*n_vars)
-        rhsy = np.array([0.]*n_vars)
-        rhsz = np.array([0.]*n_vars)
-        #debug(n_apprxmated)
-        if (n_apprxmated > 0):
-            # Write b vector. These are the points to be approximated
-            appParams = np.array([0.]*n_apprxmated) # TColStd_Array1OfReal appParams(1, n_apprxmated)
-            #math_Vector bx(1, n_apprxmated)
-            #math_Vector by(1, n_apprxmated)
-            #math_Vector bz(1, n_apprxmated)
-            bx = np.array([0.]*n_apprxmated)
-            by = np.array([0.]*n_apprxmated)
-            bz = np.array([0.]*n_apprxmated)
-        
-            #appIndex = 0
-            for idx in range(len(self.indexOfApproximated)): #for (std::vector<size_t>::const_iterator it_idx = m_indexOfApproximated.begin() it_idx != m_indexOfApproximated.end() ++it_idx) {
-                ioa = self.indexOfApproximated[idx] # + 1
-                p = self.pnts[ioa]
-                
-                bx[idx] = p.x
-                by[idx] = p.y
-                bz[idx] = p.z
-                appParams[idx] = params[ioa]
-                #debug(appParams[idx])
-                #appIndex += 1
-
-            # Solve constrained linear least squares
-            # min(Ax - b) s.t. Cx = d
-            # Create left hand side block matrix
-            # A.T*A  C.T
-            # C      0
-            #math_Matrix A = CTiglBSplineAlgorithms::bsplineBasisMat(m_degree, flatKnots, appParams)
-            #math_Matrix At = A.Transposed()
-            
-            #bsa = BSplineAlgorithms(1e-6)
-            A = bsplineBasisMat(self.degree, flatKnots, appParams, 0)
-            #debug("self.degree %s"%str(self.degree))
-            #debug("flatKnots %s"%str(flatKnots))
-            #debug("appParams %s"%str(appParams))
-            At = A.T
-            mul = np.matmul(At,A)
-            #debug(lhs)
-            #debug(mul)
-            for i in range(len(mul)):
-                for j in range(len(mul)):
-                    lhs[i][j] = mul[i][j]
-            #debug("mul : %s"%str(mul.shape))
-            #debug("rhsx : %s"%(rhsx.shape))
-            #debug("np.matmul(At,bx) : %s"%(np.matmul(At,bx).shape))
-            l = len(np.matmul(At,bx))
-            rhsx[0:l] = np.matmul(At,bx)
-            rhsy[0:l] = np.matmul(At,by)
-            rhsz[0:l] = np.matmul(At,bz)
-        #debug("lhs : %s"%str(lhs))
-        if (n_intpolated + n_continuityConditions > 0):
-            # Write d vector. These are the points that should be interpolated as well as the continuity constraints for closed curve
-            #math_Vector dx(1, n_intpolated + n_continuityConditions, 0.)
-            dx = np.array([0.]*(n_intpolated + n_continuityConditions))
-            dy = np.array([0.]*(n_intpolated + n_continuityConditions))
-            dz = np.array([0.]*(n_intpolated + n_continuityConditions))
-            if(n_intpolated > 0):
-                interpParams = [0]*n_intpolated
-                #intpIndex = 0
-                #for (std::vector<size_t>::const_iterator it_idx = m_indexOfInterpolated.begin() it_idx != m_indexOfInterpolated.end() ++it_idx) {
-                    #Standard_Integer ipnt = static_cast<Standard_Integer>(*it_idx + 1)
-                for idx in range(len(self.indexOfInterpolated)): #for (std::vector<size_t>::const_iterator it_idx = m_indexOfApproximated.begin() it_idx != m_indexOfApproximated.end() ++it_idx) {
-                    ioi = self.indexOfInterpolated[idx] # + 1
-                    p = self.pnts[ioi]
-                    dx[idx] = p.x
-                    dy[idx] = p.y
-                    dz[idx] = p.z
-                    try:
-                        interpParams[idx] = params[ioi]
-                    except:
-                        debug(ioi)
-                    #intpIndex += 1
-
-                C = bsplineBasisMat(self.degree, flatKnots, interpParams, 0)
-                Ct = C.T
-                #debug("C : %s"%str(C.shape))
-                #debug("Ct : %s"%str(Ct.shape))
-                #debug("lhs : %s"%str(lhs.shape))
-                for i in range(nCtrPnts):
-                    for j in range(n_intpolated):
-                        lhs[i][j + nCtrPnts] = Ct[i][j]
-                        lhs[j + nCtrPnts][i] = C[j][i]
-                #lhs.Set(1, nCtrPnts, nCtrPnts + 1, nCtrPnts + n_intpolated, Ct)
-                #lhs.Set(nCtrPnts + 1,  nCtrPnts + n_intpolated, 1, nCtrPnts, C)
-                #debug("lhs : %s"%str(lhs.shape))
-                
-            # sets the C2 continuity constraints for closed curves on the left hand side if requested
-            if (self.isClosed() and self.C2Continuous):
-                continuity_entries = self.getContinuityMatrix(nCtrPnts, n_continuityConditions, params, flatKnots)
-                continuity_entriest = continuity_entries.T
-                debug("continuity_entries : %s"%str(continuity_entries.shape))
-                for i in range(n_continuityConditions):
-                    for j in range(nCtrPnts):
-                        lhs[nCtrPnts + n_intpolated + i][j] = continuity_entries[i][j]
-                        lhs[j][nCtrPnts + n_intpolated + i] = continuity_entriest[j][i]
-                #lhs.Set(nCtrPnts + n_intpolated + 1, nCtrPnts + n_intpolated + n_continuityConditions, 1, nCtrPnts, continuity_entries)
-                #lhs.Set(1, nCtrPnts, nCtrPnts + n_intpolated + 1, nCtrPnts + n_intpolated + n_continuityConditions, continuity_entries.Transposed())
-
-            rhsx[nCtrPnts:n_vars+1] = dx
-            rhsy[nCtrPnts:n_vars+1] = dy
-            rhsz[nCtrPnts:n_vars+1] = dz
-            #rhsy.Set(nCtrPnts + 1, n_vars, dy)
-            #rhsz.Set(nCtrPnts + 1, n_vars, dz)
-
-        #math_Gauss solver(lhs)
-
-        #math_Vector cp_x(1, n_vars)
-        #math_Vector cp_y(1, n_vars)
-        #math_Vector cp_z(1, n_vars)
-
-        #solver.Solve(rhsx, cp_x)
-        #if (!solver.IsDone()) {
-            #raise RuntimeError("Singular Matrix")
-        #}
-        #debug("lhs : %s"%str(lhs))
-        #debug("rhsx : %s"%str(rhsx))
-        
-        cp_x = np.linalg.solve(lhs, rhsx)
-        if not np.allclose(np.dot(lhs, cp_x), rhsx):
-            raise RuntimeError("Singular Matrix")
-
-        #solver.Solve(rhsy, cp_y)
-        #if (!solver.IsDone()) {
-            #raise RuntimeError("Singular Matrix")
-        #}
-        cp_y = np.linalg.solve(lhs, rhsy)
-        if not np.allclose(np.dot(lhs, cp_y), rhsy):
-            raise RuntimeError("Singular Matrix")
-        
-        #solver.Solve(rhsz, cp_z)
-        #if (!solver.IsDone()) {
-            #raise RuntimeError("Singular Matrix")
-        #}
-        cp_z = np.linalg.solve(lhs, rhsz)
-        if not np.allclose(np.dot(lhs, cp_z), rhsz):
-            raise RuntimeError("Singular Matrix")
-        
-        poles = [FreeCAD.Vector(cp_x[i], cp_y[i], cp_z[i]) for i in range(nCtrPnts)]
-        #TColgp_Array1OfPnt poles(1, nCtrPnts)
-        #for (Standard_Integer icp = 1 icp <= nCtrPnts ++icp) {
-            #gp_Pnt pnt(cp_x.Value(icp), cp_y.Value(icp), cp_z.Value(icp))
-            #poles.SetValue(icp, pnt)
-        #}
-
+        params = np.asarray(params, dtype=float)
+        # b vector and basis matrix (compact form) of the points to be approximated
+        b = self.pointsArray(self.indexOfApproximated)
+        appBasis = bsplineBasisMat(self.degree, flatKnots, params[self.indexOfApproximated], 0, "compact")
+
+        # C matrix and d vector of the constraints :
+        # the points that should be interpolated as well as the continuity constraints for closed curve
+        C = np.zeros((n_intpolated + n_continuityConditions, nCtrPnts))
+        d = np.zeros((n_intpolated + n_continuityConditions, 3))
+        if n_intpolated > 0:
+            interpParams = params[self.indexOfInterpolated]
+            C[:n_intpolated] = self.cached(knotData["interpolation"], tuple(interpParams), lambda: bsplineBasisMat(self.degree, flatKnots, interpParams, 0))
+            d[:n_intpolated] = self.pointsArray(self.indexOfInterpolated)
+        if n_continuityConditions > 0:
+            C[n_intpolated:] = self.cached(knotData["continuity"], (params[0], params[-1]), lambda: self.getContinuityMatrix(nCtrPnts, n_continuityConditions, params, flatKnots))
+
+        cp = None
+        if self.solver == "banded" and n_apprxmated > 0:
+            try:
+                cp = self.solveBanded(appBasis, b, C, d, nCtrPnts)
+            except np.linalg.LinAlgError:
+                debug("Banded solver failed (normal matrix is not positive definite). Switching to dense solver")
+        if cp is None:
+            cp = self.solveDense(appBasis, b, C, d, nCtrPnts)
+
+        poles = [FreeCAD.Vector(cp[i,0], cp[i,1], cp[i,2]) for i in range(nCtrPnts)]
         result = Part.BSplineCurve()
         result.buildFromPolesMultsKnots(poles, mults, knots, False, self.degree)
 
         # compute error
         max_error = 0.
-        #for (std::vector<size_t>::const_iterator it_idx = m_indexOfApproximated.begin() it_idx != m_indexOfApproximated.end() ++it_idx) {
-            #Standard_Integer ipnt = static_cast<Standard_Integer>(*it_idx + 1)
-        for idx in range(len(self.indexOfApproximated)):
-            ioa = self.indexOfApproximated[idx]
-            p = self.pnts[ioa]
-            par = params[ioa]
-
-            error = result.value(par).distanceToPoint(p)
-            max_error = max(max_error, error)
-        return(result, max_error)
+        if n_apprxmated > 0:
+            first, values = appBasis
+            curve_pts = np.zeros((n_apprxmated, 3))
+            for i in range(self.degree + 1):
+                curve_pts += values[:,i,None] * cp[first+i]
+            max_error = np.sqrt(np.max(np.sum((curve_pts - b)**2, axis=1)))
+        return(result, float(max_error))
+    def solveDense(self, appBasis, b, C, d, nCtrPnts):
+        # Solve constrained linear least squares
+        # min(Ax - b) s.t. Cx = d
+        # with the left hand side block matrix
+        # A.T*A  C.T
+        # C      0
+        import numpy as np
+        n_vars = nCtrPnts + len(C)
+        lhs = np.zeros((n_vars, n_vars))
+        rhs = np.zeros((n_vars, 3))
+        if len(b) > 0:
+            first, values = appBasis
+            A = np.zeros((len(b), nCtrPnts))
+            for i in range(self.degree + 1):
+                A[np.arange(len(b)), first+i] = values[:,i]
+            lhs[:nCtrPnts,:nCtrPnts] = np.dot(A.T, A)
+            rhs[:nCtrPnts] = np.dot(A.T, b)
+        lhs[nCtrPnts:,:nCtrPnts] = C
+        lhs[:nCtrPnts,nCtrPnts:] = C.T
+        rhs[nCtrPnts:] = d
+        # x, y and z are solved together
+        cp = np.linalg.solve(lhs, rhs)
+        if not np.allclose(np.dot(lhs, cp), rhs):
+            raise RuntimeError("Singular Matrix")
+        return(cp[:nCtrPnts])
+    def solveBanded(self, appBasis, b, C, d, nCtrPnts):
+        # Same system as solveDense, but the normal matrix A.T*A is stored
+        # as a band of width degree+1, and factored once by a banded Cholesky.
+        # The constraints are eliminated with the Schur complement :
+        # x = N^-1 (A.T*b - C.T*l)   with   (C N^-1 C.T) l = C N^-1 A.T*b - d
+        # Raises numpy.linalg.LinAlgError if A.T*A is not positive definite
+        import numpy as np
+        first, values = appBasis
+        band = normal_matrix_banded(first, values, nCtrPnts)
+        atb = np.zeros((nCtrPnts, 3))
+        for i in range(self.degree + 1):
+            for c in range(3):
+                atb[:,c] += np.bincount(first+i, weights=values[:,i]*b[:,c], minlength=nCtrPnts)
+        L = cholesky_banded(band)
+        if len(C) == 0:
+            return(cho_solve_banded(L, atb))
+        # all the right hand sides are solved with a single factorization
+        y = cho_solve_banded(L, np.hstack((atb, C.T)))
+        yb = y[:,:3]
+        yc = y[:,3:]
+        lam = np.linalg.solve(np.dot(C, yc), np.dot(C, yb) - d)
+        return(yb - np.dot(yc, lam))
     def optimizeParameters(self, curve, params):
         #/**
         #* @brief Recalculates the curve parameters t_k after the
         #* control points are fitted to achieve an even better fit.
         #*/
         # optimize each parameter by finding it's position on the curve
-        # for (std::vector<size_t>::const_iterator it_idx = m_indexOfApproximated.begin(); it_idx != m_indexOfApproximated.end(); ++it_idx) {
-        for i in self.indexOfApproximated: #range(len(self.indexOfApproximated)):
-            parameter, error = self.projectOnCurve(self.pnts[i], curve, params[i])
-            #debug("optimize Parameter %d from %0.4f to %0.4f"%(i,params[i],parameter))
+        # all the approximated points are projected together, see projectOnCurveArray
+        idx = self.indexOfApproximated
+        initial = [params[i] for i in idx]
+        parameters, errors = self.projectOnCurveArray(self.pointsArray(idx), curve, initial)
+        for i, parameter in zip(idx, parameters):
             # store optimised parameter
-            params[i] = parameter
+            params[i] = float(parameter)
+    def projectOnCurveArray(self, pnts, curve, inital_Parms, maxIter=10, eps=1.0e-6):
+        # Batched version of projectOnCurve.
+        # Newton iterations are run on the whole array of parameters,
+        # each parameter being frozen as soon as it has converged.
+        # Iteration statistics are stored in self.projectionStats
+        import numpy as np
+        import nurbs_tools
+        pnts = np.asarray(pnts, dtype=float).reshape(-1,3)
+        t0 = np.asarray(inital_Parms, dtype=float)
+        t = t0.copy()
+        f = np.zeros(len(t))
+        iterations = np.zeros(len(t), dtype=int)
+        converged = np.zeros(len(t), dtype=bool)
+        flatKnots = curve.KnotSequence
+        poles = curve.getPoles()
+        weights = None
+        if curve.isRational():
+            weights = curve.getWeights()
+        fp = curve.FirstParameter
+        lp = curve.LastParameter
+        active = np.arange(len(t))
+        while len(active) > 0:
+            # points and derivatives of the spline wrt parameter t
+            ders = nurbs_tools.curve_derivatives_array(curve.Degree, flatKnots, poles, t[active], 2, weights)
+            diff = ders[:,0] - pnts[active]
+            dp = ders[:,1]
+            d2p = ders[:,2]
+            # compute objective function and their derivative
+            f[active] = np.sum(diff**2, axis=1)
+            df = np.sum(diff * dp, axis=1)
+            d2f = np.sum(diff * d2p, axis=1) + np.sum(dp**2, axis=1)
+            # newton iterate
+            dt = -df / d2f
+            t_new = t[active] + dt
+            # if parameter out of range reset it to the start value
+            out = (t_new < fp) | (t_new > lp) | np.isnan(t_new)
+            t_new[out] = t0[active][out]
+            dt[out] = 0.
+            t[active] = t_new
+            iterations[active] += 1
+            converged[active] = np.abs(dt) < eps
+            active = active[~converged[active] & (iterations[active] < maxIter)]
+        self.projectionStats = {"points": len(t),
+                                "total_iterations": int(np.sum(iterations)),
+                                "max_iterations": int(np.max(iterations)) if len(t) else 0,
+                                "mean_iterations": float(np.mean(iterations)) if len(t) else 0.,
+                                "not_converged": int(np.sum(~converged))}
+        debug("projectOnCurveArray : %(points)d points, %(total_iterations)d iterations (max %(max_iterations)d, mean %(mean_iterations)0.2f), %(not_converged)d not converged"%self.projectionStats)
+        return(t, np.sqrt(f))
     def projectOnCurve(self, pnt, curve, inital_Parm):
         maxIter = 10 # maximum No of iterations
         eps  = 1.0e-6 # accuracy of arc length parameter
@@ -542,3 +546,36 @@ class BSplineApproxInterp(object):
                 break
 
         return(t, pow(f,0.5))
+
+def benchmark(pole_counts=(10, 20, 50, 100, 200, 400), nb_points=2000, degree=3):
+    """Compare the dense and banded solvers of BSplineApproxInterp.python_solve,
+    on the approximation of a helix with interpolated end points.
+    Returns a list of (nb_poles, dense_time, banded_time, max_pole_deviation)"""
+    import time
+    import numpy as np
+    from math import cos, sin
+    pts = [FreeCAD.Vector(cos(0.01*i), sin(0.01*i), 0.001*i) for i in range(nb_points)]
+    results = list()
+    print("  poles   dense (s)  banded (s)  deviation")
+    for ncp in pole_counts:
+        approx = BSplineApproxInterp(pts, ncp, degree, False)
+        approx.InterpolatePoint(0, False)
+        approx.InterpolatePoint(nb_points-1, False)
+        params = np.array(approx.computeParameters(0.5))
+        knots, mults = approx.computeKnots(ncp, params)
+        flatKnots = []
+        for i in range(len(knots)):
+            flatKnots += [knots[i]]*mults[i]
+        b = approx.pointsArray(approx.indexOfApproximated)
+        appBasis = bsplineBasisMat(degree, flatKnots, params[approx.indexOfApproximated], 0, "compact")
+        C = bsplineBasisMat(degree, flatKnots, params[approx.indexOfInterpolated], 0)
+        d = approx.pointsArray(approx.indexOfInterpolated)
+        t0 = time.time()
+        cp_dense = approx.solveDense(appBasis, b, C, d, ncp)
+        t1 = time.time()
+        cp_banded = approx.solveBanded(appBasis, b, C, d, ncp)
+        t2 = time.time()
+        dev = float(np.max(np.abs(cp_dense - cp_banded)))
+        print("%7d  %10.5f  %10.5f  %9.2e"%(ncp, t1-t0, t2-t1, dev))
+        results.append((ncp, t1-t0, t2-t1, dev))
+    return(results)
@@ -14,12 +14,131 @@ TOOL_ICON = _utils.iconsPath() + '/discretize.svg'
 debug = _utils.debug
 debug = _utils.doNothing
 
+ALGORITHMS = ["Number","QuasiNumber","Distance","Deflection","QuasiDeflection","Angular-Curvature"]
+
+# edge -> wire lookup tables, by shape
+wire_index_cache = _utils.LRUCache(64)
+
+def discretize_args(algorithm, number=100, distance=1.0, deflection=1.0, angular=0.1, curvature=0.1, minimum=2):
+    """Returns the keyword arguments of the discretize method of edges and wires, for the given algorithm"""
+    if   algorithm == "Number":
+        return({"Number": number})
+    elif algorithm == "QuasiNumber":
+        return({"QuasiNumber": number})
+    elif algorithm == "Distance":
+        return({"Distance": distance})
+    elif algorithm == "Deflection":
+        return({"Deflection": deflection})
+    elif algorithm == "QuasiDeflection":
+        return({"QuasiDeflection": deflection})
+    elif algorithm == "Angular-Curvature":
+        return({"Angular": angular, "Curvature": curvature, "Minimum": minimum})
+    raise ValueError("Unknown discretization algorithm : %s"%algorithm)
+
+def parent_wire(shape, edge):
+    """Returns the wire of shape that contains edge, or None.
+    The edge -> wire table of shape is built on first call, and cached"""
+    key = shape.hashCode()
+    entry = wire_index_cache.get(key)
+    if (entry is None) or (not entry[0].isSame(shape)):
+        index = dict()
+        for w in shape.Wires:
+            for e in w.Edges:
+                index.setdefault(e.hashCode(), []).append((e, w))
+        entry = (shape, index)
+        wire_index_cache.set(key, entry)
+    for e, w in entry[1].get(edge.hashCode(), []):
+        if edge.isSame(e):
+            return(w)
+    return(None)
+
+def points_array(pts):
+    """Converts a list of FreeCAD.Vector to a (n,3) float64 numpy array"""
+    import numpy as np
+    return(np.array([(p.x, p.y, p.z) for p in pts], dtype=np.float64).reshape(-1,3))
+
+def discretize_brep(task):
+    """Process pool worker. task = (brep string, shape type, discretize kwargs)"""
+    brep, shape_type, args = task
+    sh = Part.Shape()
+    sh.importBrepFromString(brep)
+    if shape_type == "Wire":
+        target = sh.Wires[0]
+    else:
+        target = sh.Edges[0]
+    return(points_array(target.discretize(**args)))
+
+def discretize_brep_chunk(tasks):
+    """Process pool worker. Discretizes a list of discretize_brep tasks"""
+    return([discretize_brep(task) for task in tasks])
+
+def iter_targets(shapes):
+    """Edges and wires of a list of shapes"""
+    for sh in shapes:
+        if isinstance(sh, (Part.Edge, Part.Wire)):
+            yield(sh)
+        else:
+            for e in sh.Edges:
+                yield(e)
+
+def iter_chunks(targets, args, chunksize):
+    """Lists of discretize_brep tasks, the brep strings being exported one chunk at a time"""
+    chunk = []
+    for sh in targets:
+        chunk.append((sh.exportBrepToString(), sh.ShapeType, args))
+        if len(chunk) == chunksize:
+            yield(chunk)
+            chunk = []
+    if chunk:
+        yield(chunk)
+
+def iter_discretize(shapes, algorithm="Number", parallel=False, max_workers=None, chunksize=16, **params):
+    """Discretize many edges and wires.
+    Yields one (n,3) float64 numpy array per edge or wire, in input order.
+    Other shapes are discretized edge by edge.
+    params are the arguments of discretize_args (number, distance, deflection, ...)
+    In parallel mode, the shapes are sent to a process pool, as brep strings, by chunks,
+    and the results are streamed as soon as the chunks are done.
+    The process pool is only used without GUI (a fork of the GUI process is not safe),
+    otherwise, or if the pool can't be used, the shapes are discretized serially.
+    iter_discretize(edges, "Deflection", deflection=0.01)"""
+    args = discretize_args(algorithm, **params)
+    targets = iter_targets(shapes)
+    if parallel and not FreeCAD.GuiUp:
+        import os
+        from collections import deque
+        targets = list(targets)
+        done = 0
+        if len(targets) > 1:
+            try:
+                from concurrent.futures import ProcessPoolExecutor
+                # a few chunks ahead per worker, so that the workers are never idle
+                window = 2 * (max_workers or os.cpu_count() or 1)
+                with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    pending = deque()
+                    for chunk in iter_chunks(targets, args, chunksize):
+                        pending.append(pool.submit(discretize_brep_chunk, chunk))
+                        while len(pending) >= window:
+                            for pts in pending.popleft().result():
+                                done += 1
+                                yield(pts)
+                    while pending:
+                        for pts in pending.popleft().result():
+                            done += 1
+                            yield(pts)
+                return
+            except Exception as exc:
+                debug("iter_discretize : process pool failed (%s), switching to serial mode"%exc)
+        targets = targets[done:]
+    for sh in targets:
+        yield(points_array(sh.discretize(**args)))
+
 class Discretization:
     def __init__(self, obj , edge):
         debug("Discretization class Init")
         obj.addProperty("App::PropertyLinkSub",      "Edge",      "Discretization",   "Edge").Edge = edge
         obj.addProperty("App::PropertyEnumeration",  "Target",    "Discretization",   "Tool target").Target=["Edge","Wire"]
-        obj.addProperty("App::PropertyEnumeration",  "Algorithm", "Method",   "Discretization Method").Algorithm=["Number","QuasiNumber","Distance","Deflection","QuasiDeflection","Angular-Curvature"]
+        obj.addProperty("App::PropertyEnumeration",  "Algorithm", "Method",   "Discretization Method").Algorithm=ALGORITHMS
         obj.addProperty("App::PropertyInteger",      "Number",    "Method",   "Number of edge points").Number = 100
         obj.addProperty("App::PropertyFloat",        "Distance",  "Method",   "Distance between edge points").Distance=1.0
         obj.addProperty("App::PropertyFloat",        "Deflection","Method",   "Distance for deflection Algorithm").Deflection=1.0
@@ -41,9 +160,8 @@ class Discretization:
     def edgeBounds(self, obj):
         o = obj.Edge[0]
         e = obj.Edge[1][0]
-        n = eval(e.lstrip('Edge'))
         try:
-            edge = o.Shape.Edges[n-1]
+            edge = o.Shape.Edges[int(e.lstrip('Edge'))-1]
             return(edge.FirstParameter, edge.LastParameter)
         except:
             return(0,1)
@@ -51,57 +169,39 @@ class Discretization:
     def getTarget( self, obj, typ):
         o = obj.Edge[0]
         e = obj.Edge[1][0]
-        n = eval(e.lstrip('Edge'))
         try:
-            edge = o.Shape.Edges[n-1]
+            edge = o.Shape.Edges[int(e.lstrip('Edge'))-1]
             obj.setEditorMode("Target", 2)
-            for w in o.Shape.Wires:
-                for e in w.Edges:
-                    if edge.isSame(e):
-                        debug("found matching edge")
-                        debug("wire has %d edges"%len(w.Edges))
-                        obj.setEditorMode("Target", 0)
-                        if typ:
-                            return(w)
+            w = parent_wire(o.Shape, edge)
+            if w:
+                debug("found matching edge")
+                debug("wire has %d edges"%len(w.Edges))
+                obj.setEditorMode("Target", 0)
+                if typ:
+                    return(w)
             return(edge)
         except:
             return(None)
 
+    def getArgs(self, obj):
+        return(discretize_args(obj.Algorithm, obj.Number, obj.Distance, obj.Deflection, obj.Angular, obj.Curvature, obj.Minimum))
+
     def buildPoints(self, obj):
         if obj.Target == "Wire":
             target = self.getTarget(obj, True)
             if not target:
                 debug("Failed to get wire")
                 return(False)
-            if   obj.Algorithm == "Number":
-                obj.Points = target.discretize( Number = obj.Number)
-            elif obj.Algorithm == "QuasiNumber":
-                obj.Points = target.discretize( QuasiNumber = obj.Number)
-            elif obj.Algorithm == "Distance":
-                obj.Points = target.discretize( Distance = obj.Distance)
-            elif obj.Algorithm == "Deflection":
-                obj.Points = target.discretize( Deflection = obj.Deflection)
-            elif obj.Algorithm == "QuasiDeflection":
-                obj.Points = target.discretize( QuasiDeflection = obj.Deflection)
-            elif obj.Algorithm == "Angular-Curvature":
-                obj.Points = target.discretize( Angular = obj.Angular, Curvature = obj.Curvature, Minimum = obj.Minimum)
+            obj.Points = target.discretize(**self.getArgs(obj))
         else:
             target = self.getTarget(obj, False)
             if not target:
                 debug("Failed to get edge")
                 return(False)
-            if   obj.Algorithm == "Number":
-                obj.Points = target.discretize( Number = obj.Number,         First = obj.ParameterFirst, Last = obj.ParameterLast)
-            elif obj.Algorithm == "QuasiNumber":
-                obj.Points = target.discretize( QuasiNumber = obj.Number,    First = obj.ParameterFirst, Last = obj.ParameterLast)
-            elif obj.Algorithm == "Distance":
-                obj.Points = target.discretize( Distance = obj.Distance,     First = obj.ParameterFirst, Last = obj.ParameterLast)
-            elif obj.Algorithm == "Deflection":
-                obj.Points = target.discretize( Deflection = obj.Deflection, First = obj.ParameterFirst, Last = obj.ParameterLast)
-            elif obj.Algorithm == "QuasiDeflection":
-                obj.Points = target.discretize( QuasiDeflection = obj.Deflection, First = obj.ParameterFirst, Last = obj.ParameterLast)
-            elif obj.Algorithm == "Angular-Curvature":
-                obj.Points = target.discretize( Angular = obj.Angular, Curvature = obj.Curvature, Minimum = obj.Minimum, First = obj.ParameterFirst, Last = obj.ParameterLast)
+            args = self.getArgs(obj)
+            args["First"] = obj.ParameterFirst
+            args["Last"] = obj.ParameterLast
+            obj.Points = target.discretize(**args)
 
         return True
 
@@ -199,7 +299,7 @@ class Discretization:
     def __setstate__(self,state):
         self.obj = FreeCAD.ActiveDocument.getObject(state["name"])
         if not "Algorithm" in self.obj.PropertiesList:
-            self.obj.addProperty("App::PropertyEnumeration",  "Algorithm", "Method",   "Discretization Method").Algorithm=["Number","QuasiNumber","Distance","Deflection","QuasiDeflection","Angular-Curvature"]
+            self.obj.addProperty("App::PropertyEnumeration",  "Algorithm", "Method",   "Discretization Method").Algorithm=ALGORITHMS
         if not "Target" in self.obj.PropertiesList:
             self.obj.addProperty("App::PropertyEnumeration",  "Target",    "Discretization",   "Tool target").Target=["Edge","Wire"]
         self.obj.Algorithm = state["algo"]
@@ -270,9 +370,11 @@ class discretize:
 
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Discretize', 'ToolTip': 'Discretize an edge or a wire'}
+        import lazy_commands
+        return(lazy_commands.resources('Discretize'))
 
-FreeCADGui.addCommand('Discretize', discretize())
+import lazy_commands
+lazy_commands.add_command('Discretize', discretize())
 
 
 
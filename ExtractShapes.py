@@ -29,6 +29,8 @@ class extract:
         FreeCAD.ActiveDocument.recompute()
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Extract', 'ToolTip': 'Extract selected subshapes from objects'}
+        import lazy_commands
+        return(lazy_commands.resources('extract'))
 
-FreeCADGui.addCommand('extract', extract()) 
+import lazy_commands
+lazy_commands.add_command('extract', extract())
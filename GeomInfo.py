@@ -590,6 +590,7 @@ class GeomInfo:
                 #self.sensor.attach(self.coord.point)
 
     def GetResources(self):
-        #return {'Pixmap'  : 'python', 'MenuText': 'Toggle command', 'ToolTip': 'Example toggle command', 'Checkable': True}
-        return {'Pixmap' : path_curvesWB_icons+'/info.svg', 'MenuText': 'Geometry Info', 'ToolTip': 'displays info about the geometry of the selected topology', 'Checkable': False}
-FreeCADGui.addCommand('GeomInfo', GeomInfo())
+        import lazy_commands
+        return(lazy_commands.resources('GeomInfo'))
+import lazy_commands
+lazy_commands.add_command('GeomInfo', GeomInfo())
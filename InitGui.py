@@ -36,35 +36,11 @@ class CurvesWorkbench(Workbench):
         #import lineFP # cleaned
         #import bezierCurve
         #import editableSpline
-        import curveExtendFP # TODO use basisSpline
-        import JoinCurves
-        import splitCurves # cleaned
-        import Discretize # cleaned
-        import approximate
-        import ParametricBlendCurve # cleaned
-        import ParametricComb
-        import ZebraTool
-        import TrimFace
-        import GeomInfo
-        import ExtractShapes # cleaned
-        import IsoCurve
-        import Sketch_On_Surface
-        import Sweep2Rails
-        import hooks
-        import curveOnSurfaceFP
-        import blendSurfaceFP
-        import parametricSolid # cleaned
-        import ProfileSketch
-        import pasteSVG
-        import pipeshellProfileFP
-        import pipeshellFP
-        import gordonFP
-        import toConsole
-        import combined_curve
-        import curve_to_script
-        import sublink_edit
-        import adjacent_faces
-        import interpolate
+        # The command modules are imported on first activation of their command.
+        # lazy_commands.register(lazy=False) imports them all now,
+        # and lazy_commands.import_report() prints the import time of each module.
+        import lazy_commands
+        lazy_commands.register()
         #import sectionSketch
         #if hasattr(Part.BezierSurface,"extendByLength"):
             #import ExtendSurfaceFP
@@ -211,10 +211,8 @@ class ViewProviderIsoCurve:
 class CommandMacroIsoCurve:
     "Command to create IsoCurve feature"
     def GetResources(self):
-        return {'Pixmap'  : path_curvesWB_icons+'/isocurve.svg',
-                'MenuText': "IsoCurve",
-                'Accel': "",
-                'ToolTip': "IsoCurve: Create an IsoCurve from a face"}
+        import lazy_commands
+        return(lazy_commands.resources('IsoCurve'))
 
     def Activated(self):
         run()
@@ -227,7 +225,8 @@ class CommandMacroIsoCurve:
             return(False)
 
 if App.GuiUp:
-    Gui.addCommand("IsoCurve", CommandMacroIsoCurve())
+    import lazy_commands
+    lazy_commands.add_command("IsoCurve", CommandMacroIsoCurve())
 
 def run():
     f = Gui.Selection.Filter("SELECT Part::Feature SUBELEMENT Face COUNT 1..1000")
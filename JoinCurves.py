@@ -67,6 +67,112 @@ def forceClosed(curves, tol=1e-7):
     if p1.distanceToPoint(p2) > tol:
         curves[-1].setPole(curves[-1].NbPoles, p1)
 
+def endpoint_pairs(points, tol):
+    """Pairs the end points of curves that are closer than tol.
+    points[2*i] and points[2*i+1] are the start and end points of curve i.
+    The points are put in a spatial hash of cell size tol, so only neighbour cells are compared.
+    Returns the list partner : partner[k] is the index of the point matching points[k], or None"""
+    import math
+    cell = max(tol, 1e-12)
+    def key(p):
+        return((int(math.floor(p.x / cell)), int(math.floor(p.y / cell)), int(math.floor(p.z / cell))))
+    grid = dict()
+    for k, p in enumerate(points):
+        grid.setdefault(key(p), []).append(k)
+    candidates = list()
+    for k, p in enumerate(points):
+        i, j, l = key(p)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for dl in (-1, 0, 1):
+                    for m in grid.get((i + di, j + dj, l + dl), ()):
+                        # points of another curve, each pair only once
+                        if m // 2 > k // 2:
+                            d = p.distanceToPoint(points[m])
+                            if d <= tol:
+                                candidates.append((d, k, m))
+    # closest pairs first
+    candidates.sort()
+    partner = [None] * len(points)
+    for d, k, m in candidates:
+        if partner[k] is None and partner[m] is None:
+            partner[k] = m
+            partner[m] = k
+    return(partner)
+
+def chain_curves(partner):
+    """Orders the curves into chains, following the end point pairs.
+    Returns a list of (chain, closed), chain being a list of (curve index, reversed)"""
+    nb = len(partner) // 2
+    visited = [False] * nb
+    def walk(i, rev):
+        chain = list()
+        start = i
+        while True:
+            visited[i] = True
+            chain.append((i, rev))
+            nxt = partner[2 * i + (0 if rev else 1)]
+            if nxt is None or visited[nxt // 2]:
+                return(chain, (nxt is not None) and (nxt // 2 == start) and len(chain) > 1)
+            i = nxt // 2
+            rev = (nxt % 2 == 1)
+    chains = list()
+    # open chains start at a free end point
+    for i in range(nb):
+        if not visited[i]:
+            if partner[2 * i] is None:
+                chains.append(walk(i, False))
+            elif partner[2 * i + 1] is None:
+                chains.append(walk(i, True))
+    # remaining curves are in closed loops
+    for i in range(nb):
+        if not visited[i]:
+            chains.append(walk(i, False))
+    return(chains)
+
+def link_chains(chains, points):
+    """Links the open chains together, each time with the closest chain end.
+    Returns the linked chain"""
+    def ends(chain):
+        i, rev = chain[0]
+        j, rev2 = chain[-1]
+        return(points[2 * i + (1 if rev else 0)], points[2 * j + (0 if rev2 else 1)])
+    remaining = list(chains)
+    result = remaining.pop(0)
+    while remaining:
+        end = ends(result)[1]
+        best = None
+        for n, chain in enumerate(remaining):
+            a, b = ends(chain)
+            for d, rev in ((end.distanceToPoint(a), False), (end.distanceToPoint(b), True)):
+                if best is None or d < best[0]:
+                    best = (d, n, rev)
+        chain = remaining.pop(best[1])
+        if best[2]:
+            chain = [(i, not rev) for i, rev in reversed(chain)]
+        result = result + chain
+    return(result)
+
+def concatenate(curves):
+    """Builds one BSplineCurve from non-periodic curves connected end to start,
+    with a single buildFromPolesMultsKnots call.
+    Returns the curve and the indices of the junction knots"""
+    import nurbs_tools
+    return(nurbs_tools.concatenate_curves(curves))
+
+def smoothJunctions(c, junctions, tol):
+    """Tries to remove the C0 junction knots, returns the number of failures.
+    The knots are processed from the end, so that removing a knot (fully, for degree 1)
+    doesn't shift the indices of the remaining junctions"""
+    failed = 0
+    for idx in sorted(junctions, reverse=True):
+        try:
+            if not c.removeKnot(idx, c.Degree-1, tol):
+                failed += 1
+        except Part.OCCError:
+            failed += 1
+    return(failed)
+
 class join:
     "joins the selected edges into a single BSpline Curve"
     def __init__(self, obj):
@@ -88,7 +194,7 @@ class join:
             for l in obj.Edges:
                 o = l[0]
                 for ss in l[1]:
-                    n = eval(ss.lstrip('Edge'))
+                    n = int(ss.lstrip('Edge'))
                     res.append(o.Shape.Edges[n-1])
         return(res)
 
@@ -105,38 +211,66 @@ class join:
             c.segment(e.FirstParameter,e.LastParameter)
             curves.append(c)
         debug("Edges : \n%s"%str(curves))
-        
-        c0 = curves[0].copy()
-        outcurves = []
-        for n,c in enumerate(curves[1:]):
-            debug("joining edges %d and %d"%(n+1,n+2))
-            #i = False
-            tempCurve = c0.copy()
-            tan = alignedTangents(c0,c,obj.Tolerance)
-            if (tan is False) & obj.CornerBreak:
-                outcurves.append(c0)
-                c0 = c.copy()
-                debug("No tangency, adding breakpoint")
-            else:
-                r = c0.join(c)
-                if r is False:  #  join operation failed
-                    if obj.ForceContact:
-                        r = forceJoin(c0,c)
-                    else:
-                        outcurves.append(c0)
-                        c0 = c.copy()
-                        debug("Joining failed, adding breakpoint")
-                if r:
-                    i = forceC1Continuity(c0,obj.Tolerance)
-                    if (not (i.Continuity == 'C1')) & obj.CornerBreak:
-                        outcurves.append(tempCurve)
-                        c0 = c.copy()
-                        debug("Failed to smooth edge #"+str(curves[1:].index(c)+2)+"\n")
-        outcurves.append(c0)
-        if obj.ForceClosed:
-            forceClosed(outcurves)
-        outEdges = [Part.Edge(c) for c in outcurves]
-        obj.Shape = Part.Wire(outEdges)
+        self.stats = self.joinCurves(obj, curves)
+        debug("Join : %(curves)d curves, %(chains)d chains (%(closed)d closed), %(forced)d gaps forced (max gap %(max_gap)g), %(corners)d corner breaks, %(not_smooth)d junctions not C1, %(time)0.3fs"%self.stats)
+
+    def joinCurves(self, obj, curves):
+        """Orders the curves in chains, and merges each chain in one pass.
+        Returns statistics about chains and gaps"""
+        import time
+        t0 = time.time()
+        tol = obj.Tolerance
+        for c in curves:
+            if c.isPeriodic():
+                c.setNotPeriodic()
+        points = list()
+        for c in curves:
+            points += [c.value(c.FirstParameter), c.value(c.LastParameter)]
+        chains = chain_curves(endpoint_pairs(points, tol))
+        stats = {"curves": len(curves), "chains": len(chains), "closed": 0, "forced": 0,
+                 "max_gap": 0.0, "corners": 0, "not_smooth": 0}
+        if obj.ForceContact:
+            opened = [ch for ch, closed in chains if not closed]
+            if len(opened) > 1:
+                stats["forced"] = len(opened) - 1
+                chains = [(link_chains(opened, points), False)] + [(ch, closed) for ch, closed in chains if closed]
+        wires = list()
+        for chain, closed in chains:
+            if closed:
+                stats["closed"] += 1
+            oriented = list()
+            for i, rev in chain:
+                c = curves[i].copy()
+                if rev:
+                    c.reverse()
+                if oriented:
+                    # close the gap with the previous curve
+                    p = oriented[-1].getPole(oriented[-1].NbPoles)
+                    stats["max_gap"] = max(stats["max_gap"], p.distanceToPoint(c.getPole(1)))
+                    c.setPole(1, p)
+                oriented.append(c)
+            groups = [[oriented[0]]]
+            for c in oriented[1:]:
+                if obj.CornerBreak and not alignedTangents(groups[-1][-1], c, tol):
+                    debug("No tangency, adding breakpoint")
+                    stats["corners"] += 1
+                    groups.append([c])
+                else:
+                    groups[-1].append(c)
+            outcurves = list()
+            for group in groups:
+                c, junctions = concatenate(group)
+                stats["not_smooth"] += smoothJunctions(c, junctions, tol)
+                outcurves.append(c)
+            if obj.ForceClosed or closed:
+                forceClosed(outcurves)
+            wires.append(Part.Wire([Part.Edge(c) for c in outcurves]))
+        if len(wires) == 1:
+            obj.Shape = wires[0]
+        else:
+            obj.Shape = Part.Compound(wires)
+        stats["time"] = time.time() - t0
+        return(stats)
 
 class joinVP:
     def __init__(self,vobj):
@@ -220,6 +354,8 @@ class joinCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Join Curves', 'ToolTip': 'Joins the selected edges into BSpline Curves'}
+        import lazy_commands
+        return(lazy_commands.resources('join'))
 
-FreeCADGui.addCommand('join', joinCommand())
+import lazy_commands
+lazy_commands.add_command('join', joinCommand())
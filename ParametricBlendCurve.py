@@ -284,9 +284,11 @@ class ParametricBlendCurve:
         FreeCAD.ActiveDocument.recompute()
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'ParametricBlendCurve', 'ToolTip': 'Creates a parametric blend curve'}
+        import lazy_commands
+        return(lazy_commands.resources('ParametricBlendCurve'))
 
-FreeCADGui.addCommand('ParametricBlendCurve', ParametricBlendCurve())
+import lazy_commands
+lazy_commands.add_command('ParametricBlendCurve', ParametricBlendCurve())
 
 
 
@@ -1,6 +1,7 @@
 from __future__ import division # allows floating point division from integers
 import FreeCAD, Part, math
-import os, dummy, FreeCADGui
+import os, time, dummy, FreeCADGui
+import _utils
 from FreeCAD import Base
 from pivy import coin
 
@@ -9,6 +10,13 @@ path_curvesWB_icons =  os.path.join( path_curvesWB, 'Resources', 'icons')
 
 DEBUG = 0
 
+# Edge samples and iso edges are shared by all the combs of the session,
+# so that a property change only recomputes the edges that actually changed.
+sample_cache = _utils.LRUCache(512)
+iso_cache = _utils.LRUCache(256)
+# A scale-only update (slider, SHIFT + mouse) should fit in one frame
+FRAME_BUDGET = 1.0 / 30
+
 def debug(string):
     if DEBUG:
         FreeCAD.Console.PrintMessage(string)
@@ -73,6 +81,101 @@ def getEdgeData(edge, paramList):
     nor = getEdgeNormalList(edge, paramList)
     return [pts,cur,nor]
 
+def getEdgeDataArray(edge, paramList):
+    """Points, curvatures and normals of an edge at a list of parameters, as numpy arrays.
+    BSpline and Bezier edges are evaluated in one batched pass from the curve definition,
+    other edges (lines, conics, iso edges) are sampled one parameter at a time."""
+    import numpy as np
+    import nurbs_tools
+    curve = None
+    if isinstance(edge, Part.Edge):
+        curve = edge.Curve
+    if isinstance(curve, Part.BezierCurve):
+        curve = curve.toBSpline()
+    if not isinstance(curve, Part.BSplineCurve):
+        pts, cur, nor = getEdgeData(edge, paramList)
+        return(np.array([(p.x,p.y,p.z) for p in pts]).reshape(-1,3),
+               np.array(cur, dtype=float),
+               np.array([(n.x,n.y,n.z) for n in nor]).reshape(-1,3))
+    ders = nurbs_tools.curve_values(curve, paramList, 2)
+    d1 = ders[:,1]
+    d2 = ders[:,2]
+    cross = np.cross(d1, d2)
+    l1 = np.linalg.norm(d1, axis=1)
+    cur = np.zeros(len(l1))
+    nor = np.zeros((len(l1),3))
+    ok = l1 > 1e-12
+    cur[ok] = np.linalg.norm(cross[ok], axis=1) / l1[ok]**3
+    # principal normal, pointing towards the center of curvature
+    n = np.cross(cross, d1)
+    ln = np.linalg.norm(n, axis=1)
+    ok = ln > 1e-12
+    nor[ok] = n[ok] / ln[ok,None]
+    return(ders[:,0], cur, nor)
+
+def getAdaptiveParamList(edge, num, pilot=4):
+    """Returns num parameters, denser where curvature changes quickly.
+    Curvature is sampled on pilot*num uniform parameters, then the parameters are
+    distributed so that each interval holds the same amount of
+    (uniform length + curvature variation)."""
+    import numpy as np
+    pl = np.array(getEdgeParamList(edge, None, None, pilot*num))
+    cur = getEdgeDataArray(edge, pl)[1]
+    dk = np.abs(np.diff(cur))
+    w = np.diff(pl) / (pl[-1] - pl[0])
+    if dk.sum() > 1e-12:
+        w = 0.5 * w + 0.5 * dk / dk.sum()
+    cumul = np.concatenate(([0.], np.cumsum(w)))
+    cumul /= cumul[-1]
+    return(np.interp(np.linspace(0., 1., max(num, 2)), cumul, pl))
+
+def getSoPointsArray(pts, cur, nor, scale):
+    """Same as getSoPoints, from numpy arrays"""
+    import numpy as np
+    w = pts - nor * (cur * scale)[:,None]
+    res = np.empty((2*len(pts),3))
+    res[0::2] = pts
+    res[1::2] = w
+    return([tuple(p) for p in res.tolist()])
+
+def getGeomKey(shape):
+    """Hashable key describing the geometry of an edge, a face or an isoEdge.
+    The key is the definition of the geometry itself, so it survives a recompute
+    that rebuilds an identical shape, and two different geometries never share a key.
+    BSpline and Bezier geometries are described by their poles, weights and knots,
+    other geometries by the BREP content of the shape."""
+    if isinstance(shape, isoEdge):
+        if shape.key is None:
+            shape.key = (getGeomKey(shape.face), shape.ori, shape.param)
+        return(shape.key)
+    if isinstance(shape, Part.Face):
+        geom = shape.Surface
+        bounds = tuple(shape.ParameterRange)
+    else:
+        geom = shape.Curve
+        bounds = (shape.FirstParameter, shape.LastParameter)
+    data = [type(geom).__name__, bounds]
+    if isinstance(geom, (Part.BSplineCurve, Part.BezierCurve)):
+        data.append(tuple((p.x,p.y,p.z) for p in geom.getPoles()))
+        data.append(tuple(geom.getWeights()))
+        data.append(geom.Degree)
+        if isinstance(geom, Part.BSplineCurve):
+            data.append(tuple(geom.KnotSequence))
+            data.append(geom.isPeriodic())
+    elif isinstance(geom, (Part.BSplineSurface, Part.BezierSurface)):
+        data.append(tuple((p.x,p.y,p.z) for row in geom.getPoles() for p in row))
+        data.append(tuple(w for row in geom.getWeights() for w in row))
+        data.append((geom.UDegree, geom.VDegree))
+        if isinstance(geom, Part.BSplineSurface):
+            data.append(tuple(geom.UKnotSequence))
+            data.append(tuple(geom.VKnotSequence))
+            data.append((geom.isUPeriodic(), geom.isVPeriodic()))
+    else:
+        # hashCode is not usable : it is derived from the shape address, that can be reused
+        import hashlib
+        data.append(hashlib.sha1(shape.exportBrepToString().encode()).hexdigest())
+    return(tuple(data))
+
 def getCombPoints(data, scale):
     pts = []
     for i in range(len(data[0])):
@@ -126,6 +229,7 @@ class isoEdge:
         self.Length = self.edge3d.Length
         self.FirstParameter = self.edge3d.FirstParameter
         self.LastParameter = self.edge3d.LastParameter
+        self.key = None
 
     def valueAt(self, p):
         return self.edge3d.valueAt(p)
@@ -164,6 +268,7 @@ class Comb:
         obj.addProperty("App::PropertyIntegerConstraint","Samples","Comb","Number of samples").Samples = 100
         obj.addProperty("App::PropertyInteger","Number","Surface","Number of surface samples").Number = 3
         obj.addProperty("App::PropertyEnumeration","Orientation","Surface","Surface Comb Orientation").Orientation=["U","V","UV"]
+        obj.addProperty("App::PropertyBool","Adaptive","Comb","Refine sampling where curvature changes quickly").Adaptive = False
         #obj.addProperty("App::PropertyFloat","TotalLength","Comb","Total length of edges")
         obj.addProperty("App::PropertyVectorList","CombPoints","Comb","CombPoints")
         obj.addProperty("Part::PropertyPartShape","Shape","Comb", "Shape of comb plot")
@@ -171,6 +276,8 @@ class Comb:
         #obj.Samples = (20,2,1000,10)
         obj.CombPoints = []
         self.edges = []
+        self.samples = None
+        self.settings = None
         self.TotalLength = 0.0
         self.factor = 1.0
         #self.selectedEdgesToProperty( obj, edge)
@@ -215,12 +322,12 @@ class Comb:
                             if 'U' in obj.Orientation:
                                 bounds = g.Surface.bounds()
                                 midParam = bounds[0] + (bounds[1] - bounds[0]) / 2
-                                iso = isoEdge(g.Surface,'U',midParam)       #g.Surface.uIso(midParam).toShape()
+                                iso = self.getIsoEdge(g,'U',midParam)       #g.Surface.uIso(midParam).toShape()
                                 totalLength += iso.Length
                             if 'V' in obj.Orientation:
                                 bounds = g.Surface.bounds()
                                 midParam = bounds[2] + (bounds[3] - bounds[2]) / 2
-                                iso = isoEdge(g.Surface,'V',midParam)    #g.Surface.vIso(midParam).toShape()
+                                iso = self.getIsoEdge(g,'V',midParam)    #g.Surface.vIso(midParam).toShape()
                                 totalLength += iso.Length
                         except:
                             debug("Surface Error")
@@ -259,6 +366,17 @@ class Comb:
                             #debug("Surface Error")
         self.edges = edgeList
  
+    def getIsoEdge(self, face, ori, param, faceKey=None):
+        """Returns the cached isoEdge of face, or builds it"""
+        if faceKey is None:
+            faceKey = getGeomKey(face)
+        key = (faceKey, ori, param)
+        iso = iso_cache.get(key)
+        if iso is None:
+            iso = isoEdge(face.Surface, ori, param)
+            iso.key = key
+            iso_cache.set(key, iso)
+        return iso
  
     def getuIsoEdges(self, face, samples):
         res = []
@@ -274,8 +392,9 @@ class Comb:
             for  i in range(samples-1):
                 n.append(bounds[0] + brange*i/(samples-1))
             n.append(bounds[1])
+        faceKey = getGeomKey(face)
         for t in n:
-            res.append(isoEdge(face.Surface,'U',t))        #(face.Surface.uIso(t).toShape())
+            res.append(self.getIsoEdge(face,'U',t,faceKey))        #(face.Surface.uIso(t).toShape())
         debug("U Iso curves :")
         debug(str(res))
         return res
@@ -295,19 +414,47 @@ class Comb:
             for  i in range(samples-1):
                 n.append(bounds[2] + brange*i/(samples-1))
             n.append(bounds[3])
+        faceKey = getGeomKey(face)
         for t in n:
-            res.append(isoEdge(face.Surface,'V',t))   #(face.Surface.vIso(t).toShape())
+            res.append(self.getIsoEdge(face,'V',t,faceKey))   #(face.Surface.vIso(t).toShape())
         debug("V Iso curves :")
         debug(str(res))
         return res
     
     
+    def getSettings(self, obj):
+        """Properties that the comb samples depend on"""
+        adaptive = False
+        if hasattr(obj, "Adaptive"):
+            adaptive = obj.Adaptive
+        return (obj.Samples, adaptive, obj.Number, obj.Orientation)
+
+    def sampleEdges(self, obj):
+        """Compute points, curvatures and normals of all edges.
+        These samples are shared by getMaxCurv and buildPoints.
+        Each edge is looked up in sample_cache first, by geometry and sampling settings"""
+        self.settings = self.getSettings(obj)
+        nb, adaptive = self.settings[:2]
+        self.samples = []
+        computed = 0
+        for e in self.edges:
+            key = (getGeomKey(e), nb, adaptive)
+            data = sample_cache.get(key)
+            if data is None:
+                if adaptive:
+                    pl = getAdaptiveParamList(e, nb)
+                else:
+                    pl = getEdgeParamList(e, None, None, nb)
+                data = getEdgeDataArray(e, pl)
+                sample_cache.set(key, data)
+                computed += 1
+            self.samples.append(data)
+        debug("%d / %d edges sampled"%(computed, len(self.edges)))
+
     def getMaxCurv(self, obj):
         self.maxCurv = 0.001
-        for e in self.edges:
-            pl = getEdgeParamList(e, None, None, obj.Samples)
-            cl = getEdgeCurvatureList(e, pl)
-            m = max(cl)
+        for pts, cur, nor in self.samples:
+            m = max(cur)
             if self.maxCurv < m:
                 self.maxCurv = m
         debug("max curvature : "+str(self.maxCurv)+"")
@@ -325,12 +472,13 @@ class Comb:
         debug("Curvature Factor : "+str(self.factor)+"")
 
     def buildPoints(self, obj):
+        import numpy as np
         obj.CombPoints = []
         pts = []
-        for e in self.edges:
-            pl = getEdgeParamList(e, None, None, obj.Samples)
-            data = getEdgeData(e, pl)
-            pts += getSoPoints(data , self.factor)
+        if self.samples:
+            pts = getSoPointsArray(np.concatenate([d[0] for d in self.samples]),
+                                   np.concatenate([d[1] for d in self.samples]),
+                                   np.concatenate([d[2] for d in self.samples]), self.factor)
         obj.CombPoints = pts
         debug(str(len(obj.CombPoints))+" Comb points")   #+str(obj.CombPoints)+"")
 
@@ -339,11 +487,22 @@ class Comb:
         #self.selectedEdgesToProperty( obj, edge)
         self.setEdgeList( obj)
         self.computeTotalLength( obj)
+        self.sampleEdges( obj)
         self.getMaxCurv( obj)
         self.getCurvFactor( obj)
         self.buildPoints( obj)
         debug("----- execute -----")
 
+    def rescale(self, obj):
+        """Rebuild the comb points from the current samples.
+        Used when only the scale changed"""
+        t0 = time.time()
+        self.getCurvFactor( obj)
+        self.buildPoints( obj)
+        dt = time.time() - t0
+        if dt > FRAME_BUDGET:
+            debug("Comb rescale : %.1f ms (frame budget %.1f ms)"%(1000*dt, 1000*FRAME_BUDGET))
+
     def onChanged(self, fp, prop):
         #print fp
         if not fp.Edge:
@@ -359,12 +518,18 @@ class Comb:
                 self.factor = 0.5 * self.TotalLength / self.maxCurv
                 fp.Scale = self.factor
             debug("Comb : Scale Property changed to "+str(fp.Scale)+"")
-            self.execute(fp)
+            if getattr(self, "samples", None) and (getattr(self, "settings", None) == self.getSettings(fp)):
+                self.rescale(fp)
+            else:
+                self.execute(fp)
         if prop == "Samples":
             if fp.Samples < 10:
                 fp.Samples = 10
             debug("Comb : Samples Property changed")
             self.execute(fp)
+        if prop == "Adaptive":
+            debug("Comb : Adaptive Property changed")
+            self.execute(fp)
         #if prop == "ScaleAuto":
             #debug("Comb : ScaleAuto Property changed")
             #if fp.ScaleAuto:
@@ -583,9 +748,11 @@ class ParametricComb:
             self.appendEdges(combSelected, edges)
             
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/comb.svg', 'MenuText': 'ParametricComb', 'ToolTip': 'Creates a parametric Comb plot on selected edges'}
+        import lazy_commands
+        return(lazy_commands.resources('ParametricComb'))
 
-FreeCADGui.addCommand('ParametricComb', ParametricComb())
+import lazy_commands
+lazy_commands.add_command('ParametricComb', ParametricComb())
 
 
 
@@ -289,6 +289,8 @@ class profSupCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/profileSupport.svg', 'MenuText': 'Create a profile support plane', 'ToolTip': 'Create a profile support plane'}
+        import lazy_commands
+        return(lazy_commands.resources('profileSupportCmd'))
 
-FreeCADGui.addCommand('profileSupportCmd', profSupCommand())
+import lazy_commands
+lazy_commands.add_command('profileSupportCmd', profSupCommand())
@@ -435,8 +435,10 @@ class SoS:
             FreeCAD.Console.PrintMessage("Please select 1 face (in the 3D view) and optionally 1 sketch\n")
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'SoS', 'ToolTip': 'Maps a sketch on a surface'}
+        import lazy_commands
+        return(lazy_commands.resources('SoS'))
 
-FreeCADGui.addCommand('SoS', SoS())
+import lazy_commands
+lazy_commands.add_command('SoS', SoS())
         
 
@@ -3,6 +3,7 @@ import FreeCAD, Part, math
 import os, dummy, FreeCADGui
 from FreeCAD import Base
 import libS2R
+import async_compute
 import CoinNodes
 from pivy import coin
 
@@ -29,6 +30,7 @@ class sweep2rails:
         obj.addProperty("App::PropertyInteger",    "ProfileSamples", "Base",   "Profile Samples")
         obj.addProperty("App::PropertyInteger",    "RailSamples",    "Base",   "Profile Samples")
         obj.addProperty("App::PropertyBool",       "Extend",         "Base",   "Extend to rail limits")
+        obj.addProperty("App::PropertyBool",       "Background",     "Base",   async_compute.TOOLTIP)
         obj.addProperty("App::PropertyVectorList", "Points",         "Base",   "Points")
         obj.addProperty("Part::PropertyPartShape", "Shape",          "Base",   "Shape")
         obj.Blending = "Blend"
@@ -36,28 +38,46 @@ class sweep2rails:
         obj.RailSamples = 20
         obj.Parametrization = 0.0
         obj.Extend = False
+        obj.Background = False
 
 
     def execute(self, obj):
         if hasattr(obj,"Birail") and hasattr(obj,"Profiles"):
             if (not obj.Birail == None) and (not obj.Profiles == []):
-                s2r = libS2R.SweepOn2Rails()
-                s2r.parametrization = obj.Parametrization
-                s2r.extend = obj.Extend
-                s2r.profileSamples = obj.ProfileSamples
-                s2r.railSamples = obj.RailSamples
-                
-                s2r.setRails(obj.Birail.Shape.Face1)
-                s2r.setProfiles(self.setProfiles(obj.Profiles)) #((e1,e2,e3))
-                s2r.build()
-                #s2r.showLocalProfiles()
-                #s2r.showInterpoCurves()
-                s2r.mix(obj.Blending)
-                #s2r.show()
-                obj.Points = s2r.downgradeArray()
-                obj.Shape = s2r.shapeCloud()
-                return(s2r)
-
+                face = obj.Birail.Shape.Face1
+                profiles = self.setProfiles(obj.Profiles) #((e1,e2,e3))
+                settings = (obj.Parametrization, obj.Extend, obj.ProfileSamples, obj.RailSamples, obj.Blending)
+                def compute(token):
+                    return(self.compute(face, profiles, settings, token))
+                if async_compute.enabled(obj):
+                    key = (async_compute.shape_key([obj.Birail.Shape] + [o.Shape for o in obj.Profiles]), settings)
+                    async_compute.manager.run(obj, key, compute, self.commit)
+                else:
+                    s2r = compute(None)
+                    self.commit(obj, s2r)
+                    return(s2r)
+
+    def compute(self, face, profiles, settings, token=None):
+        """Builds the sweep of the profile edges on the birail face.
+        Doesn't access any document object, so it can run in a worker thread"""
+        s2r = libS2R.SweepOn2Rails()
+        s2r.token = token
+        s2r.parametrization, s2r.extend, s2r.profileSamples, s2r.railSamples, blending = settings
+        s2r.setRails(face)
+        s2r.setProfiles(profiles)
+        s2r.build()
+        #s2r.showLocalProfiles()
+        #s2r.showInterpoCurves()
+        s2r.progress(0.8, "Sweep2Rails mix")
+        s2r.mix(blending)
+        #s2r.show()
+        s2r.progress(0.9, "Sweep2Rails points")
+        s2r.cloud = s2r.shapeCloud()
+        return(s2r)
+
+    def commit(self, obj, s2r):
+        obj.Points = s2r.downgradeArray()
+        obj.Shape = s2r.cloud
 
     def onChanged(self, fp, prop):
         FreeCAD.Console.PrintMessage('%s changed\n'%prop)
@@ -224,9 +244,11 @@ class s2rCommand:
 
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/sw2r.svg', 'MenuText': 'Sweep2Rails', 'ToolTip': 'Sweep profiles on 2 rails'}
+        import lazy_commands
+        return(lazy_commands.resources('sw2r'))
 
-FreeCADGui.addCommand('sw2r', s2rCommand())
+import lazy_commands
+lazy_commands.add_command('sw2r', s2rCommand())
 
 
 
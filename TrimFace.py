@@ -248,9 +248,11 @@ class trim:
         FreeCAD.ActiveDocument.recompute()
             
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/trimFace.svg', 'MenuText': 'Trim face', 'ToolTip': 'Trim a face with a projected curve'}
+        import lazy_commands
+        return(lazy_commands.resources('Trim'))
 
-FreeCADGui.addCommand('Trim', trim())
+import lazy_commands
+lazy_commands.add_command('Trim', trim())
 
 
 
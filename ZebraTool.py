@@ -156,6 +156,8 @@ class ZebraTool:
 
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/zebra.svg', 'MenuText': 'ZebraTool', 'ToolTip': 'Zebra texture for surface inspection'}
+        import lazy_commands
+        return(lazy_commands.resources('ZebraTool'))
 
-FreeCADGui.addCommand('ZebraTool', ZebraTool())
+import lazy_commands
+lazy_commands.add_command('ZebraTool', ZebraTool())
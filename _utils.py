@@ -104,6 +104,145 @@ def ruled_surface(e1,e2):
         return(Part.makeRuledSurface(e1,e2))
 
 
+class LRUCache(object):
+    """Dictionary of bounded size that discards the least recently used items.
+    If maxcost is given, the total cost of the items (see set) is bounded too.
+    The cache can be shared by the main thread and the background jobs (see async_compute).
+    hits and misses count the lookups, for profiling"""
+    def __init__(self, maxsize=128, maxcost=None):
+        import threading
+        from collections import OrderedDict
+        self.maxsize = maxsize
+        self.maxcost = maxcost
+        self.data = OrderedDict()
+        self.costs = dict()
+        self.cost = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return(len(self.data))
+
+    def __contains__(self, key):
+        with self.lock:
+            return(key in self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.data:
+                # move the item to the most recently used end
+                value = self.data.pop(key)
+                self.data[key] = value
+                self.hits += 1
+                return(value)
+            self.misses += 1
+            return(default)
+
+    def set(self, key, value, cost=0):
+        with self.lock:
+            if key in self.data:
+                self.data.pop(key)
+                self.cost -= self.costs.pop(key, 0)
+            self.data[key] = value
+            if cost:
+                self.costs[key] = cost
+                self.cost += cost
+            while self.data and ((len(self.data) > max(self.maxsize, 0)) or (self.maxcost is not None and self.cost > self.maxcost)):
+                old, v = self.data.popitem(last=False)
+                self.cost -= self.costs.pop(old, 0)
+
+    def items(self):
+        """List of the (key, value) items, from least to most recently used"""
+        with self.lock:
+            return(list(self.data.items()))
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.costs.clear()
+            self.cost = 0
+            self.hits = 0
+            self.misses = 0
+
+# element type -> shape attribute
+ELEMENT_LISTS = {"Face": "Faces", "Edge": "Edges", "Vertex": "Vertexes"}
+
+class TopologyIndex(object):
+    """Maps the faces, edges and vertexes of a shape to their "FaceN", "EdgeN", "VertexN" names.
+    Sub-shapes are looked up by hashCode, and confirmed with isSame.
+    Ancestor maps are built on first use, and kept"""
+    def __init__(self, shape):
+        self.shape = shape
+        self.elements = dict()
+        self.names = dict()
+        self.ancestor_maps = dict()
+        for typ, attr in ELEMENT_LISTS.items():
+            subs = getattr(shape, attr)
+            self.elements[typ] = subs
+            for i, sub in enumerate(subs):
+                self.names.setdefault((typ, sub.hashCode()), []).append((sub, i))
+
+    def index(self, sub):
+        """0-based index of sub in the element list of its type, or None"""
+        for s, i in self.names.get((sub.ShapeType, sub.hashCode()), []):
+            if s.isSame(sub):
+                return(i)
+        return(None)
+
+    def name(self, sub):
+        """Element name of sub, like "Edge12", or None"""
+        i = self.index(sub)
+        if i is None:
+            return(None)
+        return("%s%d"%(sub.ShapeType, i+1))
+
+    def element(self, name):
+        """Sub-shape of an element name, like "Face3", or None"""
+        typ = name.rstrip("0123456789")
+        subs = self.elements.get(typ)
+        n = int(name[len(typ):]) if name[len(typ):] else 0
+        if subs is None or n < 1 or n > len(subs):
+            return(None)
+        return(subs[n-1])
+
+    def ancestorMap(self, sub_type, anc_type):
+        """List of the indices of the anc_type ancestors of each sub_type element"""
+        key = (sub_type, anc_type)
+        if key not in self.ancestor_maps:
+            amap = [[] for s in self.elements[sub_type]]
+            for j, anc in enumerate(self.elements[anc_type]):
+                for sub in getattr(anc, ELEMENT_LISTS[sub_type]):
+                    i = self.index(sub)
+                    # seam edges are found twice in their face
+                    if i is not None and (not amap[i] or amap[i][-1] != j):
+                        amap[i].append(j)
+            self.ancestor_maps[key] = amap
+        return(self.ancestor_maps[key])
+
+    def ancestors(self, name, anc_type="Face"):
+        """Names of the anc_type ancestors of the element name"""
+        typ = name.rstrip("0123456789")
+        sub = self.element(name)
+        if sub is None or typ == anc_type:
+            return([])
+        amap = self.ancestorMap(typ, anc_type)
+        return(["%s%d"%(anc_type, j+1) for j in amap[int(name[len(typ):])-1]])
+
+# TopologyIndex of the shapes, by shape hashCode
+topology_cache = LRUCache(16)
+
+def topology_index(shape):
+    """Cached TopologyIndex of shape.
+    A modified shape has a new hashCode, so its index is rebuilt"""
+    key = shape.hashCode()
+    index = topology_cache.get(key)
+    if (index is None) or (not index.shape.isSame(shape)):
+        index = TopologyIndex(shape)
+        topology_cache.set(key, index)
+    return(index)
+
+
 class EasyProxy(object):
     def __init__(self, fp):
         self.document_restored = True
@@ -20,41 +20,24 @@ class adjacentfacesCommand:
     """Select the Adjacent faces of the selected subshape"""
 
     def get_subname(self, shape, sub):
-        if isinstance(sub, Part.Face):
-            for i in range(len(shape.Faces)):
-                if sub.isEqual(shape.Faces[i]):
-                    return("Face%d"%(i+1))
-        elif isinstance(sub, Part.Edge):
-            for i in range(len(shape.Edges)):
-                if sub.isEqual(shape.Edges[i]):
-                    return("Edge%d"%(i+1))
-        if isinstance(sub, Part.Vertex):
-            for i in range(len(shape.Vertexes)):
-                if sub.isEqual(shape.Vertexes[i]):
-                    return("Vertex%d"%(i+1))
+        return(_utils.topology_index(shape).name(sub))
 
     def Activated(self):
-        search_type = Part.Face
-        result = list()
-        obj = None
         s = FreeCADGui.Selection.getSelectionEx()
         FreeCADGui.Selection.clearSelection()
-        subs = list()
         for selo in s:
             if selo.HasSubObjects:
                 obj = selo.Object
-                shape = obj.Shape.copy()
+                index = _utils.topology_index(obj.Shape)
+                subs = list()
                 for subname in selo.SubElementNames:
-                    sub = shape.getElement(subname)
-                    if isinstance(sub, Part.Face):
-                        subs += sub.Edges
+                    if subname.startswith("Face"):
+                        subs += [index.name(e) for e in index.element(subname).Edges]
                     else:
-                        subs.append(sub)
-                for sub in subs:
-                    anc = shape.ancestorsOfType(sub, search_type)
-                    result += anc
-                    for a in anc:
-                        FreeCADGui.Selection.addSelection(obj, self.get_subname(shape, a))
+                        subs.append(subname)
+                for subname in subs:
+                    for anc in index.ancestors(subname, "Face"):
+                        FreeCADGui.Selection.addSelection(obj, anc)
 
     def IsActive(self):
         s = FreeCADGui.Selection.getSelectionEx()
@@ -64,8 +47,10 @@ class adjacentfacesCommand:
         return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Adjacent faces', 'ToolTip': 'Select the Adjacent faces of the selected subshape'}
+        import lazy_commands
+        return(lazy_commands.resources('adjacent_faces'))
 
-FreeCADGui.addCommand('adjacent_faces', adjacentfacesCommand())
+import lazy_commands
+lazy_commands.add_command('adjacent_faces', adjacentfacesCommand())
 
 
@@ -361,9 +361,11 @@ class approx:
         FreeCAD.ActiveDocument.recompute()
             
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Approximate', 'ToolTip': 'Approximate points to NURBS curve or surface'}
+        import lazy_commands
+        return(lazy_commands.resources('Approximate'))
 
-FreeCADGui.addCommand('Approximate', approx())
+import lazy_commands
+lazy_commands.add_command('Approximate', approx())
 
 
 
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+__title__ = "Background compute"
+__author__ = "Christophe Grellier (Chris_G)"
+__license__ = "LGPL 2.1"
+__doc__ = "Runs the geometry stage of heavy features in a worker thread."
+
+import FreeCAD
+import _utils
+
+#debug = _utils.debug
+debug = _utils.doNothing
+
+class Cancelled(Exception):
+    pass
+
+class CancelToken(object):
+    """Shared between a job and its owner.
+    The job calls progress() regularly, that raises Cancelled once the owner called cancel()"""
+    def __init__(self):
+        self.cancelled = False
+        self.fraction = 0.0
+        self.message = ""
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def progress(self, fraction, message=""):
+        self.fraction = fraction
+        self.message = message
+        self.check()
+
+class Job(object):
+    def __init__(self, key, token, future):
+        self.key = key
+        self.token = token
+        self.future = future
+
+class BackgroundCompute(object):
+    """Runs the geometry stage of features in worker threads.
+    A feature execute() gathers its inputs on the main thread, and calls
+    run(obj, key, compute, commit), key being a signature of the inputs :
+    - if the job of key is finished, commit(obj, result) is called, and run returns True
+    - otherwise the job compute(token) is started, superseding the previous job of obj.
+    When the job is done, obj is recomputed, so that commit happens in execute, on the main thread.
+    Without GUI, compute and commit are called immediately.
+    The jobs are threads, not processes : they share the GIL with the GUI.
+    Python code and the OCC calls of the FreeCAD bindings, that don't release the GIL,
+    keep the Python side of the GUI (property editor, python view providers ...) waiting
+    for the duration of a single call. So a job stays responsive, and cancellable,
+    only if it is split in many short calls, with token.progress() between them."""
+    def __init__(self, max_workers=2, poll_interval=100):
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.jobs = dict()
+        self.executor = None
+
+    def pool(self):
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return(self.executor)
+
+    def run(self, obj, key, compute, commit):
+        if not FreeCAD.GuiUp:
+            commit(obj, compute(CancelToken()))
+            return(True)
+        name = (obj.Document.Name, obj.Name)
+        job = self.jobs.get(name)
+        if job is not None and job.key == key:
+            if not job.future.done():
+                debug("%s : job still running"%obj.Label)
+                return(False)
+            del self.jobs[name]
+            try:
+                result = job.future.result()
+            except Cancelled:
+                return(False)
+            except Exception as exc:
+                FreeCAD.Console.PrintError("%s : background compute failed (%s)\n"%(obj.Label, exc))
+                return(False)
+            commit(obj, result)
+            return(True)
+        if job is not None:
+            debug("%s : superseding running job"%obj.Label)
+            job.token.cancel()
+        token = CancelToken()
+        job = Job(key, token, self.pool().submit(compute, token))
+        self.jobs[name] = job
+        self.watch(obj, name, job)
+        return(False)
+
+    def finished(self, obj, key):
+        """True if the job of obj for key is done, and waits for run() to commit it"""
+        if not FreeCAD.GuiUp:
+            return(False)
+        job = self.jobs.get((obj.Document.Name, obj.Name))
+        return(job is not None and job.key == key and job.future.done())
+
+    def cancel(self, obj):
+        job = self.jobs.pop((obj.Document.Name, obj.Name), None)
+        if job is not None:
+            job.token.cancel()
+
+    def watch(self, obj, name, job):
+        """Polls the job from the main thread, shows its progress, and recomputes obj when it is done"""
+        from PySide import QtCore
+        label = obj.Label
+        def poll():
+            if self.jobs.get(name) is not job:
+                # superseded or cancelled
+                return
+            if not job.future.done():
+                self.showProgress("%s : %d%% %s"%(label, int(100 * job.token.fraction), job.token.message))
+                QtCore.QTimer.singleShot(self.poll_interval, poll)
+                return
+            self.showProgress("")
+            try:
+                obj.touch()
+                obj.Document.recompute()
+            except Exception:
+                # the object has been deleted meanwhile
+                self.jobs.pop(name, None)
+        QtCore.QTimer.singleShot(self.poll_interval, poll)
+
+    def showProgress(self, message):
+        try:
+            import FreeCADGui
+            FreeCADGui.getMainWindow().statusBar().showMessage(message)
+        except Exception:
+            pass
+
+manager = BackgroundCompute()
+
+# tooltip of the Background property of the features
+TOOLTIP = ("Compute in a background thread.\n"
+           "The GUI stays usable between the computation steps, "
+           "but each long OCC operation still blocks it until it is done")
+
+def shape_key(shapes):
+    """Cheap signature of a list of shapes, that changes when they are recomputed"""
+    return(tuple([sh.hashCode() for sh in shapes]))
+
+def enabled(obj):
+    return(hasattr(obj, "Background") and obj.Background)
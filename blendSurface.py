@@ -1,3 +1,4 @@
+import time
 import FreeCAD
 import Part
 from curveOnSurface import curveOnSurface
@@ -37,10 +38,22 @@ class blendSurface:
         self.railSamples = 20
         self.profSamples = 20
         self.untwist = False
+        # geometry curves (Part.BezierCurve or Part.BSplineCurve) of the blends,
+        # whichever method built them
         self.curves = []
+        # print diagnostics and timings of blend_curves
+        self.profile = False
+        # CancelToken of the background job (see async_compute), or None
+        self.token = None
+
+    def progress(self, fraction, message=""):
+        """Reports progress to the background job, which raises async_compute.Cancelled if it was cancelled"""
+        if self.token is not None:
+            self.token.progress(fraction, message)
 
     def buildCurves(self): # -----------------------DEPRECATED ---------------------
         for i in range(self.railSamples):
+            self.progress(0.2 * i / self.railSamples, "Blend surface rail samples")
             t1 = self.cos1.firstParameter + (1.0 * i * self.paramRange(self.cos1) / (self.railSamples - 1))
             if not self.untwist:
                 t2 = self.cos2.firstParameter + (1.0 * i * self.paramRange(self.cos2) / (self.railSamples - 1))
@@ -94,6 +107,7 @@ class blendSurface:
             #sc2.reverse()
         blends = list()
         for i in range(self.railSamples):
+            self.progress(1.0 * i / self.railSamples, "Blend surface cross curves")
             pt1 = self.cos1.edgeOnFace.valueAt(self.cos1.param_list[i])
             pt2 = self.cos2.edgeOnFace.valueAt(self.cos2.param_list[i])
             c1 = self.cos1.get_cross_curve_toward_point(self.cos1.param_list[i], pt2, 1e-1, False)
@@ -109,10 +123,10 @@ class blendSurface:
                 b.scale2 = sc2[i].y
             else:
                 b.scale2 = self.scale2
-            b.compute()
-            blends.append(b.shape())
-            self.curves.append(b)
-        return(blends)
+            blends.append(b)
+        nurbs_tools.compute_blends(blends)
+        self.curves += [b.curve() for b in blends]
+        return([b.shape() for b in blends])
 
     def cross_curves(self):
         self.curves = list()
@@ -126,6 +140,7 @@ class blendSurface:
             sc2.reverse()
         blends = list()
         for i in range(self.railSamples):
+            self.progress(1.0 * i / self.railSamples, "Blend surface cross curves")
             b = nurbs_tools.blendCurve(c1[i],c2[i])
             b.cont1 = self.cont1
             b.cont2 = self.cont2
@@ -137,42 +152,53 @@ class blendSurface:
                 b.scale2 = sc2[i].y
             else:
                 b.scale2 = self.scale2
-            b.compute()
-            blends.append(b.shape())
-            self.curves.append(b)
-        return(blends)
+            blends.append(b)
+        nurbs_tools.compute_blends(blends)
+        self.curves += [b.curve() for b in blends]
+        return([b.shape() for b in blends])
     
+    def scale_array(self, sc, scale):
+        """scale of each rail sample, from the result sc of compute_scale, or the constant scale"""
+        import numpy as np
+        if sc:
+            return(np.array([v.y for v in sc]))
+        return(np.full(self.railSamples, float(scale)))
+
     def blend_curves(self):
-        blend_curves = list()
+        """Builds the blend curves of all the rail samples at once.
+        The derivatives of the cross-curves are evaluated in one batch by each curveOnSurface,
+        and the poles of all the blend curves are solved together (see nurbs_tools.blend_poles_array)"""
+        import numpy as np
         import nurbs_tools
+        t0 = time.time()
+        blend_curves = list()
+        self.cos1.profile = self.profile
+        self.cos2.profile = self.profile
         offset_curve_1 = self.cos1.get_offset_curve2d(0.1)
         offset_curve_2 = self.cos2.get_offset_curve2d(0.1)
-        sc1 = self.compute_scale(self.var_scale1, self.cos1.edge)
-        sc2 = self.compute_scale(self.var_scale2, self.cos2.edge)
+        sc1 = self.scale_array(self.compute_scale(self.var_scale1, self.cos1.edge), self.scale1)
+        sc2 = self.scale_array(self.compute_scale(self.var_scale2, self.cos2.edge), self.scale2)
         self.cos1.build_param_list(self.railSamples)
         self.cos2.build_param_list(self.railSamples)
         if self.untwist:
             self.cos2.param_list.reverse()
-            sc2.reverse()
+            sc2 = sc2[::-1]
+        t1 = time.time()
+        self.progress(0.3, "Blend surface derivatives")
+        ders1 = self.cos1.cross_derivatives(offset_curve_1, self.cos1.param_list, self.cont1)
+        self.progress(0.45, "Blend surface derivatives")
+        ders2 = self.cos2.cross_derivatives(offset_curve_2, self.cos2.param_list, self.cont2)
+        t2 = time.time()
+        self.progress(0.6, "Blend surface poles")
+        poles = nurbs_tools.blend_poles_array(ders1, ders2, sc1, sc2)
         for i in range(self.railSamples):
-            c1 = self.cos1.get_cross_curve( offset_curve_1, self.cos1.param_list[i])
-            c2 = self.cos2.get_cross_curve( offset_curve_2, self.cos2.param_list[i])
-            b = nurbs_tools.blendCurve(c1,c2)
-            b.cont1 = self.cont1
-            b.cont2 = self.cont2
-            b.param1 = b.edge1.LastParameter
-            b.param2 = b.edge2.LastParameter
-            if sc1:
-                b.scale1 = sc1[i].y
-            else:
-                b.scale1 = self.scale1
-            if sc2:
-                b.scale2 = sc2[i].y
-            else:
-                b.scale2 = self.scale2
-            b.compute()
-            blend_curves.append(b.shape())
-            self.curves.append(b)
+            self.progress(0.7 + 0.3 * i / self.railSamples, "Blend surface curves")
+            bs = nurbs_tools.blend_curve_from_poles(poles[i])
+            blend_curves.append(bs.toShape())
+            self.curves.append(bs)
+        if self.profile:
+            gaps = [max(c.distToShape(self.cos1.edge)[0], c.distToShape(self.cos2.edge)[0]) for c in blend_curves]
+            FreeCAD.Console.PrintMessage("blend_curves : %d curves, setup %0.3fs, derivatives %0.3fs, poles %0.3fs, max gap to edges %g\n"%(self.railSamples, t1-t0, t2-t1, time.time()-t2, max(gaps)))
         return(blend_curves)
 
     def get_gordon_shapes(self, curvetype=0):
@@ -3,6 +3,7 @@ import FreeCAD, Part, math
 import os, dummy, FreeCADGui
 from FreeCAD import Base
 import blendSurface
+import async_compute
 import CoinNodes
 from pivy import coin
 from PySide.QtGui import *
@@ -64,6 +65,7 @@ class blendSurfFP:
         obj.addProperty("App::PropertyInteger",    "ProfileSamples", "BlendSurface",   "Profile Samples")
         obj.addProperty("App::PropertyInteger",    "RailSamples",    "BlendSurface",   "Edge Samples")
         obj.addProperty("App::PropertyBool",       "Untwist",        "BlendSurface",   "Untwist surface")
+        obj.addProperty("App::PropertyBool",       "Background",     "BlendSurface",   async_compute.TOOLTIP)
         obj.addProperty("App::PropertyVectorList", "Points",         "BlendSurface",   "Points")
         obj.addProperty("App::PropertyVectorList", "ScaleList1",     "BlendSurface",   "Variable scale 1: list of vectors(parameter, scale1, 0)")
         obj.addProperty("App::PropertyVectorList", "ScaleList2",     "BlendSurface",   "Variable scale 2: list of vectors(parameter, scale2, 0)")
@@ -77,6 +79,7 @@ class blendSurfFP:
         obj.ScaleList1 = ((0,1,0),(1,1,0))
         obj.ScaleList2 = ((0,1,0),(1,1,0))
         obj.Untwist = False
+        obj.Background = False
 
     def check_scale_list(self, obj, prop):
         # TODO make the validation more strict
@@ -103,12 +106,23 @@ class blendSurfFP:
                     bs.var_scale1 = obj.ScaleList1
                 if self.check_scale_list(obj, "ScaleList2"):
                     bs.var_scale2 = obj.ScaleList2
-                bs.buildCurves()
-                #pts = bs.getPoints()
-                
-                #obj.Points = downgradeArray(pts)
-                obj.Shape = bs.get_gordon_shapes() #shapeCloud(pts)
-                return(bs)
+                def compute(token):
+                    # bs only holds geometry, so it can be computed in a worker thread
+                    bs.token = token
+                    bs.buildCurves()
+                    #pts = bs.getPoints()
+                    return(bs.get_gordon_shapes()) #shapeCloud(pts)
+                if async_compute.enabled(obj):
+                    settings = repr([obj.getPropertyByName(prop) for prop in ["RailSamples","ProfileSamples","Untwist","Continuity1","Scale1","Continuity2","Scale2","ScaleList1","ScaleList2"]])
+                    key = (async_compute.shape_key([obj.Edge1.Shape, obj.Edge2.Shape]), settings)
+                    async_compute.manager.run(obj, key, compute, self.commit)
+                else:
+                    #obj.Points = downgradeArray(pts)
+                    self.commit(obj, compute(None))
+                    return(bs)
+
+    def commit(self, obj, shape):
+        obj.Shape = shape
 
     def getContinuity(self, cont):
         if cont == "C0":
@@ -306,9 +320,11 @@ class blendSurfCommand:
 
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/blendSurf.svg', 'MenuText': 'Blend Surface', 'ToolTip': 'Blending Surface between to curveOnSurface objects '}
+        import lazy_commands
+        return(lazy_commands.resources('blendSurface'))
 
-FreeCADGui.addCommand('blendSurface', blendSurfCommand())
+import lazy_commands
+lazy_commands.add_command('blendSurface', blendSurfCommand())
 
 
 
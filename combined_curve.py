@@ -117,6 +117,8 @@ class CombinedProjectionCmd:
         return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Combined projection curve', 'ToolTip': 'Builds a 3D curve as the intersection of 2 projected curves'}
+        import lazy_commands
+        return(lazy_commands.resources('combined_projection'))
 
-FreeCADGui.addCommand('combined_projection', CombinedProjectionCmd())
+import lazy_commands
+lazy_commands.add_command('combined_projection', CombinedProjectionCmd())
@@ -135,6 +135,8 @@ class extendCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Extend Curve', 'ToolTip': 'Extends the selected edge'}
+        import lazy_commands
+        return(lazy_commands.resources('extend'))
 
-FreeCADGui.addCommand('extend', extendCommand())
+import lazy_commands
+lazy_commands.add_command('extend', extendCommand())
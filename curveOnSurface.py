@@ -66,6 +66,8 @@ class curveOnSurface:
         self.isValid = False
         self._closed = False
         self._reversed = False
+        # print diagnostics, like the distance of the cross-curves to the edge
+        self.profile = False
         self.validate()
 
     @property
@@ -327,7 +329,8 @@ class curveOnSurface:
         ls = Part.Geom2d.Line2dSegment(p1,p2)
         sh = ls.toShape(self.face.Surface)
         #sh = sh.transformGeometry(self.face.Placement.toMatrix()).Edges[0]
-        FreeCAD.Console.PrintMessage(" %s - %s\n"%(self.edge.Curve, str( sh.distToShape(self.edge)[0])))
+        if self.profile:
+            FreeCAD.Console.PrintMessage(" %s - %s\n"%(self.edge.Curve, str( sh.distToShape(self.edge)[0])))
         #d,pts,info = sh.distToShape(self.edge)
         #if d > 1e-8:
             #bs = sh.Edges[0].Curve.toBSpline()
@@ -335,6 +338,42 @@ class curveOnSurface:
             #return(bs.toShape())
         return(sh)
 
+    def cross_derivatives(self, off, params, n=1, gauss=8):
+        """returns the point and n first derivatives, at the COS, of the cross-curves from offsetCurve off,
+        for all the parameters of the list params (see get_cross_curve).
+        The derivatives are relative to a parameter scaled to the length of each cross-curve.
+        Result is a numpy array of shape (len(params), n+1, 3)"""
+        import numpy as np
+        import nurbs_tools
+        m = len(params)
+        starts = np.zeros((m,2))
+        ends = np.zeros((m,2))
+        for k,u in enumerate(params):
+            u = min(max(u, self.firstParameter), self.lastParameter)
+            fac = (u-self.firstParameter) / (self.lastParameter-self.firstParameter)
+            p1 = off.value(off.FirstParameter + fac*(off.LastParameter-off.FirstParameter))
+            p2 = self.curve2D.value(u)
+            starts[k] = (p1.x, p1.y)
+            ends[k] = (p2.x, p2.y)
+        # the cross-curves are the lines starts + s * d on the surface, s in [0,1]
+        d = ends - starts
+        surf = self.face.Surface
+        # length of the cross-curves, by Gauss-Legendre quadrature
+        x, w = np.polynomial.legendre.leggauss(gauss)
+        uv = starts[:,None] + 0.5 * (x[None,:,None] + 1.0) * d[:,None]
+        sd = nurbs_tools.surface_derivatives_array(surf, uv[...,0].ravel(), uv[...,1].ravel(), 1).reshape(m, gauss, 2, 2, 3)
+        speed = sd[:,:,1,0] * d[:,None,0,None] + sd[:,:,0,1] * d[:,None,1,None]
+        length = 0.5 * (np.sqrt((speed**2).sum(axis=2)) * w).sum(axis=1)
+        length[length <= 0] = 1.0
+        # derivatives of S(starts + s * d) at s = 1, by the chain rule
+        sd = nurbs_tools.surface_derivatives_array(surf, ends[:,0], ends[:,1], n)
+        res = np.zeros((m, n+1, 3))
+        for l in range(n+1):
+            for i in range(l+1):
+                res[:,l] += nurbs_tools.binomial(l, i) * (d[:,0]**i * d[:,1]**(l-i))[:,None] * sd[:,i,l-i]
+            res[:,l] /= (length**l)[:,None]
+        return(res)
+
     #def get_cross_curve_toward_point(self, param, pt, scale=1.0, untwist=False):
         #pl = self.edge.Placement
         #if scale == 0:
@@ -133,6 +133,8 @@ class cosCommand:
 
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'CurveOnSurface', 'ToolTip': 'Create a curve on surface object'}
+        import lazy_commands
+        return(lazy_commands.resources('cos'))
 
-FreeCADGui.addCommand('cos', cosCommand())
+import lazy_commands
+lazy_commands.add_command('cos', cosCommand())
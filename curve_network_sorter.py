@@ -46,91 +46,100 @@ def minColIndex(m, jcol):
 def swap(o, i, j):
     """swap o[i] and o[j]"""
     o[i], o[j] = o[j], o[i]
-    
-def swap_row(o, i, j):
-    """swap rows i and j of 2d array o"""
-    o[i], o[j] = o[j], o[i]
-    
-def swap_col(o, i, j):
-    """swap cols i and j of 2d array o"""
-    for row in o:
-        row[i], row[j] = row[j], row[i]
+
+def stable_order(values):
+    """returns the indices that sort values in ascending order, keeping the order of equal values"""
+    import numpy as np
+    return(np.argsort(values, kind="mergesort"))
 
 class CurveNetworkSorter(object):
+    """Sorts the profiles and guides of a curve network, from the matrices of their intersection parameters.
+    parmsIntersProfiles[i][j] is the parameter on profile i of its intersection with guide j,
+    parmsIntersGuides[i][j] is the parameter on guide j of its intersection with profile i.
+    The matrices are held as numpy arrays, the orders are computed by argsort,
+    and the curves are permuted and reversed once, at the end of Perform()"""
     def __init__(self, profiles, guides, parmsIntersProfiles, parmsIntersGuides):
+        import numpy as np
         self.has_performed = False
         if (len(profiles) < 2) or (len(guides) < 2):
             raise ValueError("Not enough guides or profiles")
         else:
-            self.profiles = profiles
-            self.guides = guides
+            self.input_profiles = list(profiles)
+            self.input_guides = list(guides)
+            self.profiles = self.input_profiles
+            self.guides = self.input_guides
             self.n_profiles = len(profiles)
             self.n_guides = len(guides)
-        self.parmsIntersProfiles = parmsIntersProfiles
-        self.parmsIntersGuides = parmsIntersGuides
+        self.parmsIntersProfiles = np.array(parmsIntersProfiles, dtype=float)
+        self.parmsIntersGuides = np.array(parmsIntersGuides, dtype=float)
+        if not (self.parmsIntersProfiles.ndim == 2 and self.parmsIntersGuides.ndim == 2):
+            raise ValueError("Invalid intersection parameters matrices.")
         if not self.n_profiles == len(self.parmsIntersProfiles):
             raise ValueError("Invalid row size of parmsIntersProfiles matrix.")
         if not self.n_profiles == len(self.parmsIntersGuides):
             raise ValueError("Invalid row size of parmsIntersGuides matrix.")
-        if not self.n_guides == len(self.parmsIntersProfiles[0]):
+        if not self.n_guides == self.parmsIntersProfiles.shape[1]:
             raise ValueError("Invalid col size of parmsIntersProfiles matrix.")
-        if not self.n_guides == len(self.parmsIntersGuides[0]):
+        if not self.n_guides == self.parmsIntersGuides.shape[1]:
             raise ValueError("Invalid col size of parmsIntersGuides matrix.")
-        #????
-        #assert(m_parmsIntersGuides.UpperRow() == n_profiles - 1);
-        #assert(m_parmsIntersProfiles.UpperRow() == n_profiles - 1);
-        #assert(m_parmsIntersGuides.UpperCol() == n_guides - 1);
-        #assert(m_parmsIntersProfiles.UpperCol() == n_guides - 1);
+        # permutations of the input curves, and reversals, applied at the end of Perform()
+        self.profOrder = np.arange(self.n_profiles)
+        self.guidOrder = np.arange(self.n_guides)
+        self.profReversed = np.zeros(self.n_profiles, dtype=bool)
+        self.guidReversed = np.zeros(self.n_guides, dtype=bool)
         self.profIdx = [str(i) for i in range(self.n_profiles)]
         self.guidIdx = [str(i) for i in range(self.n_guides)]
+    def permuteProfiles(self, order):
+        """reorder the profile rows of the matrices, new row i being old row order[i]"""
+        self.profOrder = self.profOrder[order]
+        self.profReversed = self.profReversed[order]
+        self.parmsIntersProfiles = self.parmsIntersProfiles[order]
+        self.parmsIntersGuides = self.parmsIntersGuides[order]
+    def permuteGuides(self, order):
+        """reorder the guide columns of the matrices, new column j being old column order[j]"""
+        self.guidOrder = self.guidOrder[order]
+        self.guidReversed = self.guidReversed[order]
+        self.parmsIntersProfiles = self.parmsIntersProfiles[:,order]
+        self.parmsIntersGuides = self.parmsIntersGuides[:,order]
     def swapProfiles(self, idx1, idx2):
         if (idx1 == idx2):
             return()
-        swap(self.profiles, idx1, idx2)
-        swap(self.profIdx, idx1, idx2)
-        swap_row(self.parmsIntersGuides, idx1, idx2)
-        swap_row(self.parmsIntersProfiles, idx1, idx2)
+        order = list(range(self.n_profiles))
+        swap(order, idx1, idx2)
+        self.permuteProfiles(order)
     def swapGuides(self, idx1, idx2):
         if (idx1 == idx2):
             return()
-        swap(self.guides, idx1, idx2)
-        swap(self.guidIdx, idx1, idx2)
-        swap_col(self.parmsIntersGuides, idx1, idx2)
-        swap_col(self.parmsIntersProfiles, idx1, idx2)
+        order = list(range(self.n_guides))
+        swap(order, idx1, idx2)
+        self.permuteGuides(order)
     def GetStartCurveIndices(self): #prof_idx, guid_idx, guideMustBeReversed):
         """find curves, that begin at the same point (have the smallest parameter at their intersection)"""
-        for irow in range(len(self.profiles)):
-            jmin = minRowIndex(self.parmsIntersProfiles, irow)
-            imin = minColIndex(self.parmsIntersGuides, jmin)
-            if (imin == irow):
-                # we found the start curves
-                #prof_idx = imin
-                #guid_idx = jmin
-                #guideMustBeReversed = False
-                return(imin, jmin, False)
+        import numpy as np
+        jmin = self.parmsIntersProfiles.argmin(axis=1)
+        imin = self.parmsIntersGuides.argmin(axis=0)[jmin]
+        found = np.nonzero(imin == np.arange(self.n_profiles))[0]
+        if len(found):
+            # we found the start curves
+            irow = int(found[0])
+            return(irow, int(jmin[irow]), False)
         # there are situation (a loop) when the previous situation does not exist
         # find curves were the start of a profile hits the end of a guide
-        for irow in range(len(self.profiles)):
-            jmin = minRowIndex(self.parmsIntersProfiles, irow)
-            imax = maxColIndex(self.parmsIntersGuides, jmin)
-            if (imax == irow):
-                # we found the start curves
-                #prof_idx = imax
-                #guid_idx = jmin
-                #guideMustBeReversed = True
-                return(imax, jmin, True)
+        imax = self.parmsIntersGuides.argmax(axis=0)[jmin]
+        found = np.nonzero(imax == np.arange(self.n_profiles))[0]
+        if len(found):
+            irow = int(found[0])
+            return(irow, int(jmin[irow]), True)
         # we have not found the starting curve. The network seems invalid
         raise RuntimeError("Cannot find starting curves of curve network.")
     def Perform(self):
+        import numpy as np
         if self.has_performed:
             return()
 
-        prof_start = 0
-        guide_start = 0
-        nGuid = len(self.guides)
-        nProf = len(self.profiles)
+        nGuid = self.n_guides
+        nProf = self.n_profiles
 
-        guideMustBeReversed = False
         prof_start, guide_start, guideMustBeReversed = self.GetStartCurveIndices()
 
         # put start curves first in array
@@ -140,65 +149,67 @@ class CurveNetworkSorter(object):
         if guideMustBeReversed:
             self.reverseGuide(0)
 
-        # perform a bubble sort for the guides,
-        # such that the guides intersection of the first profile are ascending
-        r = list(range(2, nGuid+1))
-        r.reverse()
-        for n in r: #(int n = nGuid; n > 1; n = n - 1) {
-            for j in range(1,n-1): #(int j = 1; j < n - 1; ++j) {
-                if self.parmsIntersProfiles[0][j] > self.parmsIntersProfiles[0][j+1]:
-                    self.swapGuides(j, j+1)
-        # perform a bubble sort of the profiles,
-        # such that the profiles are in ascending order of the first guide
-        r = list(range(2, nProf+1))
-        r.reverse()
-        for n in r: #(int n = nProf; n > 1; n = n - 1) {
-            for i in range(1,n-1): #(int i = 1; i < n - 1; ++i) {
-                if self.parmsIntersGuides[i][0] > self.parmsIntersGuides[i+1][0]:
-                    self.swapProfiles(i, i+1)
+        # sort the guides, such that the guides intersection of the first profile are ascending
+        order = np.concatenate([[0], 1 + stable_order(self.parmsIntersProfiles[0,1:])])
+        self.permuteGuides(order)
+        # sort the profiles, such that the profiles are in ascending order of the first guide
+        order = np.concatenate([[0], 1 + stable_order(self.parmsIntersGuides[1:,0])])
+        self.permuteProfiles(order)
 
         # reverse profiles, if necessary
-        for iProf in range(1, nProf): #(Standard_Integer iProf = 1; iProf < nProf; ++iProf) {
-            if self.parmsIntersProfiles[iProf][0] > self.parmsIntersProfiles[iProf][nGuid-1]:
-                self.reverseProfile(iProf)
-                debug("reversing profile #%d\n"%iProf)
+        for iProf in np.nonzero(self.parmsIntersProfiles[1:,0] > self.parmsIntersProfiles[1:,nGuid-1])[0] + 1:
+            self.reverseProfile(iProf)
+            debug("reversing profile #%d\n"%iProf)
         # reverse guide, if necessary
-        for iGuid in range(1, nGuid): #(Standard_Integer iGuid = 1; iGuid < nGuid; ++iGuid) {
-            if self.parmsIntersGuides[0][iGuid] > self.parmsIntersGuides[nProf-1][iGuid]:
-                self.reverseGuide(iGuid)
-                debug("reversing guide #%d\n"%iGuid)
+        for iGuid in np.nonzero(self.parmsIntersGuides[0,1:] > self.parmsIntersGuides[nProf-1,1:])[0] + 1:
+            self.reverseGuide(iGuid)
+            debug("reversing guide #%d\n"%iGuid)
+        self.apply()
         self.has_performed = True
+    def apply(self):
+        """build the sorted curve lists, copying the reversed curves"""
+        import nurbs_tools
+        profiles = list()
+        for i, rev in zip(self.profOrder, self.profReversed):
+            c = self.input_profiles[i]
+            if rev and c is not None:
+                c = nurbs_tools.bspline_copy(c, reverse = True, scale = 1.0)
+            profiles.append(c)
+        guides = list()
+        for j, rev in zip(self.guidOrder, self.guidReversed):
+            c = self.input_guides[j]
+            if rev and c is not None:
+                c = nurbs_tools.bspline_copy(c, reverse = True, scale = 1.0)
+            guides.append(c)
+        self.profiles = profiles
+        self.guides = guides
+        self.profIdx = [("-" if rev else "") + str(i) for i, rev in zip(self.profOrder, self.profReversed)]
+        self.guidIdx = [("-" if rev else "") + str(j) for j, rev in zip(self.guidOrder, self.guidReversed)]
     def reverseProfile(self, profileIdx):
+        """reverse the intersection parameters of profile profileIdx. The curve is reversed by apply()"""
         pIdx = int(profileIdx)
-        profile = self.profiles[profileIdx]
+        profile = self.input_profiles[self.profOrder[pIdx]]
+        row = self.parmsIntersProfiles[pIdx]
         if not profile is None: #.IsNull()
             firstParm = profile.FirstParameter
             lastParm =  profile.LastParameter
         else:
-            firstParm = self.parmsIntersProfiles[pIdx][int(minRowIndex(self.parmsIntersProfiles, pIdx))]
-            lastParm =  self.parmsIntersProfiles[pIdx][int(maxRowIndex(self.parmsIntersProfiles, pIdx))]
+            firstParm = row.min()
+            lastParm =  row.max()
         # compute new parameters
-        for icol in range(len(self.guides)): #(int icol = 0; icol < static_cast<int>(NGuides()); ++icol) {
-            self.parmsIntersProfiles[pIdx][icol] = -self.parmsIntersProfiles[pIdx][icol] + firstParm + lastParm
-        if not profile is None: #.IsNull()
-            import nurbs_tools
-            profile = nurbs_tools.bspline_copy(profile, reverse = True, scale = 1.0)
-            self.profiles[profileIdx] = profile
-        self.profIdx[profileIdx] = "-" + self.profIdx[profileIdx]
+        row[:] = -row + firstParm + lastParm
+        self.profReversed[pIdx] = not self.profReversed[pIdx]
     def reverseGuide(self, guideIdx):
+        """reverse the intersection parameters of guide guideIdx. The curve is reversed by apply()"""
         gIdx = int(guideIdx)
-        guide = self.guides[guideIdx]
+        guide = self.input_guides[self.guidOrder[gIdx]]
+        col = self.parmsIntersGuides[:,gIdx]
         if not guide is None: #.IsNull()
             firstParm = guide.FirstParameter
             lastParm =  guide.LastParameter
         else:
-            firstParm = self.parmsIntersGuides[int(minColIndex(self.parmsIntersGuides, gIdx))][gIdx]
-            lastParm =  self.parmsIntersGuides[int(maxColIndex(self.parmsIntersGuides, gIdx))][gIdx]
+            firstParm = col.min()
+            lastParm =  col.max()
         # compute new parameters
-        for irow in range(len(self.profiles)):
-            self.parmsIntersGuides[irow][gIdx] = -self.parmsIntersGuides[irow][gIdx] + firstParm + lastParm
-        if not guide is None: #.IsNull()
-            import nurbs_tools
-            guide = nurbs_tools.bspline_copy(guide, reverse = True, scale = 1.0)
-            self.guides[guideIdx] = guide
-        self.guidIdx[guideIdx] = "-" + self.guidIdx[guideIdx]
+        col[:] = -col + firstParm + lastParm
+        self.guidReversed[gIdx] = not self.guidReversed[gIdx]
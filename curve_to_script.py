@@ -53,10 +53,8 @@ def curve_to_script(i,c):
 class NurbsToConsole:
     "Brings the selected BSpline curves to the python console"
     def GetResources(self):
-        return {'Pixmap'  : TOOL_ICON,
-                'MenuText': "BSpline to Console",
-                'Accel': "",
-                'ToolTip': "BSpline curves to python console"}
+        import lazy_commands
+        return(lazy_commands.resources('bspline_to_console'))
 
     def Activated(self):
         s = FreeCADGui.Selection.getSelectionEx()
@@ -76,4 +74,5 @@ class NurbsToConsole:
         else:
             return False
 
-FreeCADGui.addCommand('bspline_to_console',NurbsToConsole())
+import lazy_commands
+lazy_commands.add_command('bspline_to_console', NurbsToConsole())
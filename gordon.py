@@ -30,6 +30,8 @@ import FreeCAD
 import Part
 from math import pi
 from BSplineAlgorithms import BSplineAlgorithms
+import nurbs_tools
+from nurbs_tools import curve_to_data, curve_from_data, surface_to_data, surface_from_data
 
 def debug(o):
     if isinstance(o,Part.BSplineCurve):
@@ -63,6 +65,224 @@ def find(val, array, tol=1e-5):
             return(int(i))
     return(-1)
 
+def curve_hash(c):
+    """Hash of the definition of a BSplineCurve, stable across sessions"""
+    import hashlib
+    return(hashlib.sha1(repr(curve_to_data(c)).encode()).hexdigest())
+
+class Packed(object):
+    """Picklable form of a BSpline curve or surface"""
+    def __init__(self, kind, data):
+        self.kind = kind
+        self.data = data
+
+def pack(value):
+    """Replace the BSpline curves and surfaces of value (possibly nested in lists, tuples and dicts) by picklable data"""
+    if isinstance(value, Part.BSplineCurve):
+        return(Packed("curve", curve_to_data(value)))
+    elif isinstance(value, Part.BSplineSurface):
+        return(Packed("surface", surface_to_data(value)))
+    elif isinstance(value, (list, tuple)):
+        return(type(value)(pack(v) for v in value))
+    elif isinstance(value, dict):
+        return(dict((k, pack(v)) for k, v in value.items()))
+    return(value)
+
+def unpack(value):
+    """Inverse of pack"""
+    if isinstance(value, Packed):
+        if value.kind == "curve":
+            return(curve_from_data(value.data))
+        return(surface_from_data(value.data))
+    elif isinstance(value, (list, tuple)):
+        return(type(value)(unpack(v) for v in value))
+    elif isinstance(value, dict):
+        return(dict((k, unpack(v)) for k, v in value.items()))
+    return(value)
+
+class NetworkCache(object):
+    """Content addressed cache of the stages of InterpolateCurveNetwork.
+    Keys are built from the hashes of the curves and the tolerances :
+    - "pair" : intersections of a profile and a guide
+    - "reparam" : reparametrized curve
+    - "network" : final result, including the skinning surfaces
+    Entries are stored in picklable form and rebuilt on each hit,
+    so cached geometry is never shared with the caller.
+    The cache is bounded by its number of entries, and by the pickled size of the entries (maxbytes).
+    It can be used from the main thread and the background jobs at the same time.
+    If path is given, entries are loaded from this file, and save() writes them back, if they changed."""
+    def __init__(self, maxsize=4096, path=None, maxbytes=256*1024*1024):
+        import threading
+        import _utils
+        self.entries = _utils.LRUCache(maxsize, maxbytes)
+        self.lock = threading.Lock()
+        self.path = path
+        self.stats = dict()
+        self.changed = False
+        if path:
+            self.load()
+    def key(self, stage, *args):
+        import hashlib
+        return("%s:%s"%(stage, hashlib.sha1(repr(args).encode()).hexdigest()))
+    def get(self, key):
+        stage = key.split(":")[0]
+        with self.lock:
+            hits, misses = self.stats.get(stage, (0, 0))
+            value = self.entries.get(key)
+            if value is None:
+                self.stats[stage] = (hits, misses + 1)
+                return(None)
+            self.stats[stage] = (hits + 1, misses)
+        return(unpack(value))
+    def set(self, key, value):
+        import pickle
+        packed = pack(value)
+        size = len(pickle.dumps(packed, 2))
+        with self.lock:
+            self.entries.set(key, packed, size)
+            self.changed = True
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.stats = dict()
+            self.changed = True
+    def save(self, path=None, force=False):
+        """Writes the entries to path, if they changed since the last load or save"""
+        import pickle
+        path = path or self.path
+        if not path:
+            return(False)
+        with self.lock:
+            if not (self.changed or force):
+                return(False)
+            items = self.entries.items()
+            self.changed = False
+        with open(path, "wb") as f:
+            pickle.dump(items, f, 2)
+        return(True)
+    def load(self, path=None):
+        import os
+        import pickle
+        path = path or self.path
+        if not (path and os.path.exists(path)):
+            return(False)
+        try:
+            with open(path, "rb") as f:
+                items = pickle.load(f)
+        except Exception as exc:
+            debug("NetworkCache : failed to load %s (%s)"%(path, exc))
+            return(False)
+        with self.lock:
+            for k, v in items:
+                self.entries.set(k, v, len(pickle.dumps(v, 2)))
+        return(True)
+
+def intersect_profile(task):
+    """Process pool worker. task = (profile data, [(guide_idx, guide data), ...], par_tol)
+    Returns a list of (guide_idx, intersections, fallback, time)"""
+    import time
+    profile_data, guides, par_tol = task
+    profile = curve_from_data(profile_data)
+    bsa = BSplineAlgorithms(par_tol)
+    res = []
+    for j, guide_data in guides:
+        nb = bsa.nbFallbacks
+        t1 = time.time()
+        inters = bsa.intersections(profile, curve_from_data(guide_data), par_tol)
+        res.append((j, inters, bsa.nbFallbacks > nb, time.time() - t1))
+    return(res)
+
+class CurveNetworkIntersector(object):
+    """Compute the intersections of all the profiles with all the guides.
+    Every pair is computed, with a BSplineAlgorithms object, so that curves that
+    miss each other by a small gap still get their nearest points (distToShape fallback).
+    The pairs already known (from the cache) are not computed again.
+    In parallel mode, the profiles are sent to a process pool, with the guides they must be
+    intersected with. The pool is only used without GUI (a fork of the GUI process is not safe),
+    otherwise, or if the pool can't be used, the pairs are computed serially"""
+    def __init__(self, profiles, guides, tol=1e-5, par_tol=1e-10, parallel=False, max_workers=None):
+        self.profiles = profiles
+        self.guides = guides
+        self.tolerance = tol
+        self.par_tolerance = par_tol
+        self.parallel = parallel
+        self.max_workers = max_workers
+        # {(profile_idx, guide_idx): intersections} already known, they are not computed again
+        self.known = dict()
+        self.stats = dict()
+    def tasks(self):
+        """intersect_profile tasks of the pairs that are not known"""
+        guides_data = dict()
+        tasks = []
+        for i in range(len(self.profiles)):
+            guides = []
+            for j in range(len(self.guides)):
+                if not (i,j) in self.known:
+                    if not j in guides_data:
+                        guides_data[j] = curve_to_data(self.guides[j])
+                    guides.append((j, guides_data[j]))
+            if guides:
+                tasks.append((i, (curve_to_data(self.profiles[i]), guides, self.par_tolerance)))
+        return(tasks)
+    def perform_parallel(self, results, pair_times):
+        """Computes the unknown pairs in a process pool. Returns the number of fallbacks"""
+        from concurrent.futures import ProcessPoolExecutor
+        tasks = self.tasks()
+        fallbacks = 0
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            for (i, task), res in zip(tasks, pool.map(intersect_profile, [t for i, t in tasks])):
+                for j, inters, fallback, t in res:
+                    results[(i,j)] = inters
+                    pair_times[(i,j)] = t
+                    if fallback:
+                        fallbacks += 1
+        return(fallbacks)
+    def perform_serial(self, results, pair_times):
+        """Computes the unknown pairs in this process. Returns the number of fallbacks"""
+        import time
+        bsa = BSplineAlgorithms(self.par_tolerance)
+        fallbacks = 0
+        for i in range(len(self.profiles)):
+            for j in range(len(self.guides)):
+                if (i,j) in self.known:
+                    continue
+                nb = bsa.nbFallbacks
+                t1 = time.time()
+                results[(i,j)] = bsa.intersections(self.profiles[i], self.guides[j], self.par_tolerance)
+                pair_times[(i,j)] = time.time() - t1
+                if bsa.nbFallbacks > nb:
+                    fallbacks += 1
+        return(fallbacks)
+    def perform(self):
+        """Returns a dict {(profile_idx, guide_idx): intersections}"""
+        import time
+        t0 = time.time()
+        results = dict(self.known)
+        pair_times = dict()
+        fallbacks = None
+        nb_pairs = len(self.profiles) * len(self.guides)
+        pool = self.parallel and (not FreeCAD.GuiUp) and (nb_pairs - len(self.known) > 1)
+        if pool:
+            try:
+                fallbacks = self.perform_parallel(results, pair_times)
+            except Exception as exc:
+                debug("CurveNetworkIntersector : process pool failed (%s), switching to serial mode"%exc)
+                pool = False
+                results = dict(self.known)
+                pair_times = dict()
+        if fallbacks is None:
+            fallbacks = self.perform_serial(results, pair_times)
+        self.stats = {"pairs": len(results),
+                      "reused": len(self.known),
+                      "computed": len(pair_times),
+                      "fallbacks": fallbacks,
+                      "pool": pool,
+                      "pair_times": pair_times,
+                      "max_pair_time": max(pair_times.values()) if pair_times else 0.,
+                      "total_time": time.time() - t0}
+        debug("CurveNetworkIntersector : %(pairs)d pairs, %(fallbacks)d distToShape fallbacks, %(total_time)0.3fs"%self.stats)
+        return(results)
+
 class GordonSurfaceBuilder(object):
     """Build a Gordon surface from a network of curves"""
     def __init__(self, profiles, guides, params_u, params_v, tol=1e-5, par_tol=1e-7):
@@ -139,11 +359,11 @@ class GordonSurfaceBuilder(object):
                                            # 1, static_cast<Standard_Integer>(self.intersectionParamsV.size()));
 
         # use splines in u-direction to get intersection points
+        # all the intersection parameters of a profile are evaluated at once
         for spline_idx in range(len(self.profiles)): #(size_t spline_idx = 0; spline_idx < self.profiles.size(); ++spline_idx) {
+            pts = nurbs_tools.curve_values(self.profiles[spline_idx], self.intersectionParamsU)[:,0]
             for intersection_idx in range(len(self.intersectionParamsU)): #(size_t intersection_idx = 0; intersection_idx < self.intersectionParamsU.size(); ++intersection_idx) {
-                spline_u = self.profiles[spline_idx]
-                parameter = self.intersectionParamsU[intersection_idx]
-                intersection_pnts[intersection_idx][spline_idx] = spline_u.value(parameter)
+                intersection_pnts[intersection_idx][spline_idx] = FreeCAD.Vector(*pts[intersection_idx])
 
         # check, whether to build a closed continuous surface
         bsa = BSplineAlgorithms(self.par_tol)
@@ -206,15 +426,15 @@ class GordonSurfaceBuilder(object):
         assert(self.skinningSurfGuides.NbUPoles == self.skinningSurfProfiles.NbUPoles and self.skinningSurfProfiles.NbUPoles == self.tensorProdSurf.NbUPoles)
         assert(self.skinningSurfGuides.NbVPoles == self.skinningSurfProfiles.NbVPoles and self.skinningSurfProfiles.NbVPoles == self.tensorProdSurf.NbVPoles)
 
-        self.gordonSurf = self.skinningSurfProfiles.copy()
-
         # creating the Gordon Surface = s_u + s_v - tps by adding the control points
-        for cp_u_idx in range(1, self.gordonSurf.NbUPoles+1): #(int cp_u_idx = 1; cp_u_idx <= self.gordonSurf->NbUPoles(); ++cp_u_idx) {
-            for cp_v_idx in range(1, self.gordonSurf.NbVPoles+1): #(int cp_v_idx = 1; cp_v_idx <= self.gordonSurf->NbVPoles(); ++cp_v_idx) {
-                cp_surf_u = self.skinningSurfProfiles.getPole(cp_u_idx, cp_v_idx)
-                cp_surf_v = self.skinningSurfGuides.getPole(cp_u_idx, cp_v_idx)
-                cp_tensor = self.tensorProdSurf.getPole(cp_u_idx, cp_v_idx)
-                self.gordonSurf.setPole(cp_u_idx, cp_v_idx, cp_surf_u + cp_surf_v - cp_tensor)
+        # the three pole grids are combined in a single array operation
+        cp_surf_u = nurbs_tools.surface_poles_array(self.skinningSurfProfiles)
+        cp_surf_v = nurbs_tools.surface_poles_array(self.skinningSurfGuides)
+        cp_tensor = nurbs_tools.surface_poles_array(self.tensorProdSurf)
+        poles = nurbs_tools.array_to_vectors(cp_surf_u + cp_surf_v - cp_tensor)
+        s = self.skinningSurfProfiles
+        self.gordonSurf = Part.BSplineSurface()
+        self.gordonSurf.buildFromPolesMultsKnots(poles, s.getUMultiplicities(), s.getVMultiplicities(), s.getUKnots(), s.getVKnots(), s.isUPeriodic(), s.isVPeriodic(), s.UDegree, s.VDegree, s.getWeights())
 
     def check_curve_network_compatibility(self): # self.profiles, self.guides, self.intersectionParamsU, self.intersectionParamsV, tol):
         # find out the 'average' scale of the B-splines in order to being able to handle a more approximate dataset and find its intersections
@@ -250,6 +470,24 @@ class GordonSurfaceBuilder(object):
         #Part.show(Part.Compound(ucurves))
         #Part.show(Part.Compound(vcurves))
 
+class TokenProgress(object):
+    """ProgressIndicator replacement that reports to an async_compute.CancelToken"""
+    def __init__(self, token):
+        self.token = token
+        self.message = ""
+        self.total = 1
+        self.count = 0
+    def start(self, message, total):
+        self.message = message
+        self.total = max(total, 1)
+        self.count = 0
+        self.token.progress(0., message)
+    def next(self):
+        self.count += 1
+        self.token.progress(float(self.count) / self.total, self.message)
+    def stop(self):
+        pass
+
 class InterpolateCurveNetwork(object):
     """Bspline surface interpolating a network of curves"""
     def __init__(self, profiles, guides, tol=1e-5, tol2=1e-10):
@@ -265,14 +503,33 @@ class InterpolateCurveNetwork(object):
             self.tolerance = tol
         if tol2 > 0.0:
             self.par_tolerance = tol2
+        # timings of the intersection engine, see CurveNetworkIntersector
+        self.intersection_stats = dict()
+        # compute the intersections in a process pool, without GUI only (see CurveNetworkIntersector)
+        self.parallel = False
+        # optional NetworkCache
+        self.cache = None
+        # optional async_compute.CancelToken, when computed in a background thread
+        self.token = None
     def error(self,mes):
         print(mes)
     def perform(self):
         if self.has_performed:
             return()
+        key = None
+        if self.cache is not None:
+            # computed before make_curves_compatible, that modifies the input curves
+            key = self.cache.key("network", [curve_hash(c) for c in self.profiles], [curve_hash(c) for c in self.guides], self.tolerance, self.par_tolerance)
+            result = self.cache.get(key)
+            if result is not None:
+                debug("-> network found in cache")
+                self.restore(result)
+                return()
         debug("-> ")
         self.make_curves_compatible()
         debug("-> make_curves_compatible -> OK")
+        if self.token is not None:
+            self.token.check()
         builder = GordonSurfaceBuilder(self.profiles, self.guides, self.intersectionParamsU, self.intersectionParamsV, self.tolerance, self.par_tolerance)
         debug("-> GordonSurfaceBuilder -> OK")
         self.gordon_surf = builder.surface_gordon()
@@ -285,6 +542,23 @@ class InterpolateCurveNetwork(object):
         self.curve_network = builder.curve_network()
         self.has_performed = True
         debug("-> builder successfully finished")
+        if key is not None:
+            self.cache.set(key, {"profiles": self.profiles,
+                                 "guides": self.guides,
+                                 "intersectionParamsU": self.intersectionParamsU,
+                                 "intersectionParamsV": self.intersectionParamsV,
+                                 "gordon_surf": self.gordon_surf,
+                                 "skinning_surf_profiles": self.skinning_surf_profiles,
+                                 "skinning_surf_guides": self.skinning_surf_guides,
+                                 "tensor_prod_surf": self.tensor_prod_surf})
+    def restore(self, result):
+        """Set the results of perform from a NetworkCache entry"""
+        for name, value in result.items():
+            setattr(self, name, value)
+        profiles = Part.Compound([c.toShape() for c in self.profiles])
+        guides = Part.Compound([c.toShape() for c in self.guides])
+        self.curve_network = Part.Compound([profiles,guides])
+        self.has_performed = True
     def surface_profiles(self):
         self.perform()
         return(self.skinning_surf_profiles)
@@ -308,10 +582,26 @@ class InterpolateCurveNetwork(object):
         return(self.curve_network)
     def compute_intersections(self, intersection_params_u, intersection_params_v):
         debug("\ncompute_intersections")
+        engine = CurveNetworkIntersector(self.profiles, self.guides, self.tolerance, self.par_tolerance, self.parallel)
+        if self.cache is not None:
+            phash = [curve_hash(c) for c in self.profiles]
+            ghash = [curve_hash(c) for c in self.guides]
+            keys = dict()
+            for i in range(len(self.profiles)):
+                for j in range(len(self.guides)):
+                    keys[(i,j)] = self.cache.key("pair", phash[i], ghash[j], self.tolerance, self.par_tolerance)
+                    inters = self.cache.get(keys[(i,j)])
+                    if inters is not None:
+                        engine.known[(i,j)] = inters
+        all_intersections = engine.perform()
+        self.intersection_stats = engine.stats
+        if self.cache is not None:
+            for ij, inters in all_intersections.items():
+                if not ij in engine.known:
+                    self.cache.set(keys[ij], inters)
         for spline_u_idx in range(len(self.profiles)):
             for spline_v_idx in range(len(self.guides)):
-                
-                currentIntersections = BSplineAlgorithms(self.par_tolerance).intersections(self.profiles[spline_u_idx], self.guides[spline_v_idx], self.par_tolerance)
+                currentIntersections = all_intersections[(spline_u_idx, spline_v_idx)]
                 if len(currentIntersections) < 1:
                     self.error("U-directional B-spline and v-directional B-spline don't intersect each other!")
                     self.error("profile %d / guide %d"%(spline_u_idx, spline_v_idx))
@@ -355,8 +645,8 @@ class InterpolateCurveNetwork(object):
         sorterObj.Perform()
 
         # get the sorted matrices and vectors
-        intersection_params_u = sorterObj.parmsIntersProfiles
-        intersection_params_v = sorterObj.parmsIntersGuides
+        intersection_params_u = sorterObj.parmsIntersProfiles.tolist()
+        intersection_params_v = sorterObj.parmsIntersGuides.tolist()
 
         # TODO check the code below
         # copy sorted curves back into our curve arrays
@@ -440,7 +730,11 @@ class InterpolateCurveNetwork(object):
         max_cp_v = max(min_v, min(max_cp_v + 10, max_v))
 
         
-        progressbar = FreeCAD.Base.ProgressIndicator()
+        if self.token is None:
+            progressbar = FreeCAD.Base.ProgressIndicator()
+        else:
+            # the ProgressIndicator can only be used in the main thread
+            progressbar = TokenProgress(self.token)
         progressbar.start("Computing Gordon surface ...",nProfiles+nGuides)
         # reparametrize u-directional B-splines
         for spline_u_idx in range(nProfiles): #(int spline_u_idx = 0; spline_u_idx < nProfiles; ++spline_u_idx) {
@@ -461,7 +755,7 @@ class InterpolateCurveNetwork(object):
             profile = self.profiles[spline_u_idx]
             self.error("reparametrizing u curve %d"%spline_u_idx)
             debug(profile)
-            self.profiles[spline_u_idx] = bsa.reparametrizeBSplineContinuouslyApprox(profile, oldParametersProfile, newParametersProfiles, max_cp_u)
+            self.profiles[spline_u_idx] = self.reparametrize(bsa, profile, oldParametersProfile, newParametersProfiles, max_cp_u)
             debug(self.profiles[spline_u_idx])
             progressbar.next()
 
@@ -484,13 +778,23 @@ class InterpolateCurveNetwork(object):
             guide = self.guides[spline_v_idx]
             self.error("reparametrizing v curve %d"%spline_v_idx)
             debug(guide)
-            self.guides[spline_v_idx] = bsa.reparametrizeBSplineContinuouslyApprox(guide, oldParameterGuide, newParametersGuides, max_cp_v)
+            self.guides[spline_v_idx] = self.reparametrize(bsa, guide, oldParameterGuide, newParametersGuides, max_cp_v)
             debug(self.guides[spline_v_idx])
             progressbar.next()
             
         progressbar.stop()
         self.intersectionParamsU = newParametersProfiles
         self.intersectionParamsV = newParametersGuides
+    def reparametrize(self, bsa, curve, old_parameters, new_parameters, n_control_pnts):
+        """bsa.reparametrizeBSplineContinuouslyApprox, through the cache, if any"""
+        if self.cache is None:
+            return(bsa.reparametrizeBSplineContinuouslyApprox(curve, old_parameters, new_parameters, n_control_pnts))
+        key = self.cache.key("reparam", curve_hash(curve), list(old_parameters), list(new_parameters), n_control_pnts)
+        result = self.cache.get(key)
+        if result is None:
+            result = bsa.reparametrizeBSplineContinuouslyApprox(curve, old_parameters, new_parameters, n_control_pnts)
+            self.cache.set(key, result)
+        return(result)
     def eliminate_inaccuracies_network_intersections(self, sortedProfiles, sortedGuides, intersection_params_u, intersection_params_v):
         nProfiles = len(sortedProfiles)
         nGuides = len(sortedGuides)
@@ -5,16 +5,37 @@ __author__ = "Christophe Grellier (Chris_G)"
 __license__ = "LGPL 2.1"
 __doc__ = "Creates a surface that skins a network of curves."
 
-import sys
-if sys.version_info.major >= 3:
-    from importlib import reload
-
 import FreeCAD
 import FreeCADGui
 import Part
 import _utils
+import async_compute
 
 TOOL_ICON = _utils.iconsPath() + '/gordon.svg'
+
+# Results of the curve network interpolation, shared by all Gordon features.
+# Set CACHE_FILE (or call set_cache_file) to keep them across sessions.
+CACHE_SIZE = 4096
+# bound of the pickled size of the cache entries, in bytes
+CACHE_BYTES = 256 * 1024 * 1024
+CACHE_FILE = None
+network_cache = None
+
+def get_network_cache():
+    global network_cache
+    if network_cache is None:
+        import gordon
+        network_cache = gordon.NetworkCache(CACHE_SIZE, CACHE_FILE, CACHE_BYTES)
+    return(network_cache)
+
+def set_cache_file(path):
+    """Persist the Gordon cache in file path. None disables persistence"""
+    global CACHE_FILE
+    CACHE_FILE = path
+    cache = get_network_cache()
+    cache.path = path
+    if path:
+        cache.load()
 #debug = _utils.debug
 #debug = _utils.doNothing
 
@@ -42,6 +63,115 @@ def debug(o):
     else:
         FreeCAD.Console.PrintMessage("%s\n"%o)
 
+class AABBTree(object):
+    """Bounding volume hierarchy over axis aligned boxes,
+    used to find the pairs of boxes that overlap"""
+    def __init__(self, mins, maxs, leaf_size=8):
+        import numpy as np
+        self.mins = np.array(mins, dtype=float).reshape(-1,3)
+        self.maxs = np.array(maxs, dtype=float).reshape(-1,3)
+        self.leaf_size = leaf_size
+        # (min, max, left child, right child, box indices of a leaf)
+        self.nodes = list()
+        self.root = -1
+        if len(self.mins):
+            self.root = self.build(np.arange(len(self.mins)))
+
+    def build(self, idx):
+        import numpy as np
+        lo = self.mins[idx].min(axis=0)
+        hi = self.maxs[idx].max(axis=0)
+        if len(idx) <= self.leaf_size:
+            self.nodes.append((lo, hi, -1, -1, idx))
+            return(len(self.nodes) - 1)
+        # split at the median center, along the longest axis
+        axis = np.argmax(hi - lo)
+        centers = self.mins[idx, axis] + self.maxs[idx, axis]
+        order = idx[np.argsort(centers, kind="mergesort")]
+        half = len(order) // 2
+        left = self.build(order[:half])
+        right = self.build(order[half:])
+        self.nodes.append((lo, hi, left, right, None))
+        return(len(self.nodes) - 1)
+
+    def query(self, lo, hi):
+        """Returns the indices of the boxes that overlap the box (lo, hi)"""
+        import numpy as np
+        result = list()
+        stack = [self.root] if self.root >= 0 else []
+        while stack:
+            nlo, nhi, left, right, idx = self.nodes[stack.pop()]
+            if np.any(nlo > hi) or np.any(lo > nhi):
+                continue
+            if idx is None:
+                stack += [left, right]
+            else:
+                ok = np.all(self.mins[idx] <= hi, axis=1) & np.all(lo <= self.maxs[idx], axis=1)
+                result += idx[ok].tolist()
+        return(result)
+
+    def pairs(self):
+        """Returns the list of (i, j), i < j, of overlapping boxes"""
+        result = list()
+        for i in range(len(self.mins)):
+            for j in self.query(self.mins[i], self.maxs[i]):
+                if j > i:
+                    result.append((i, j))
+        return(result)
+
+def classify_edges(edges, tol):
+    """Split a flat list of edges into guides and profiles.
+    Edges closer than tol are in contact, and must belong to different families.
+    Families are propagated over the whole contact graph, starting with edges[0] as a guide.
+    Exact distances are only computed for the edges whose bounding boxes overlap.
+    Returns (guides, profiles, stats)"""
+    import time
+    t0 = time.time()
+    mins = list()
+    maxs = list()
+    for e in edges:
+        b = e.BoundBox
+        mins.append((b.XMin - 0.5 * tol, b.YMin - 0.5 * tol, b.ZMin - 0.5 * tol))
+        maxs.append((b.XMax + 0.5 * tol, b.YMax + 0.5 * tol, b.ZMax + 0.5 * tol))
+    candidates = AABBTree(mins, maxs).pairs()
+    t1 = time.time()
+    neighbours = [list() for e in edges]
+    contacts = 0
+    for i, j in candidates:
+        d, pts, info = edges[i].distToShape(edges[j])
+        if d < tol:
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+            contacts += 1
+    t2 = time.time()
+    # 2-coloring of the contact graph
+    family = [None] * len(edges)
+    components = 0
+    conflicts = 0
+    for start in range(len(edges)):
+        if family[start] is not None:
+            continue
+        components += 1
+        family[start] = 0
+        queue = [start]
+        for i in queue:
+            for j in neighbours[i]:
+                if family[j] is None:
+                    family[j] = 1 - family[i]
+                    queue.append(j)
+                elif family[j] == family[i]:
+                    conflicts += 1
+    guides = [e for e, f in zip(edges, family) if f == 0]
+    profiles = [e for e, f in zip(edges, family) if f == 1]
+    stats = {"edges": len(edges),
+             "candidates": len(candidates),
+             "contacts": contacts,
+             "components": components,
+             "conflicts": conflicts // 2,
+             "tree_time": t1 - t0,
+             "distance_time": t2 - t1,
+             "total_time": time.time() - t0}
+    return(guides, profiles, stats)
 
 class gordon:
     """Creates a surface that skins a network of curves"""
@@ -50,35 +180,46 @@ class gordon:
         obj.addProperty("App::PropertyLinkList", "Sources", "Gordon", "Curve network")
         obj.addProperty("App::PropertyFloat", "Tol3D", "Gordon", "3D tolerance").Tol3D = 1e-2
         obj.addProperty("App::PropertyFloat", "Tol2D", "Gordon", "Parametric tolerance").Tol2D = 1e-5
+        obj.addProperty("App::PropertyBool", "Background", "Gordon", async_compute.TOOLTIP).Background = False
         obj.Proxy = self
 
     def execute(self, obj):
         if len(obj.Sources) == 0:
             return()
-        elif len(obj.Sources) == 2:
-            guides = obj.Sources[0].Shape.Edges
-            profiles = obj.Sources[1].Shape.Edges
+        sources = [o.Shape for o in obj.Sources]
+        tol3d = obj.Tol3D
+        tol2d = obj.Tol2D
+        def compute(token):
+            return(self.compute([sh.Edges for sh in sources], tol3d, tol2d, token))
+        if async_compute.enabled(obj):
+            key = (async_compute.shape_key(sources), tol3d, tol2d)
+            async_compute.manager.run(obj, key, compute, self.commit)
+        else:
+            self.commit(obj, compute(None))
+
+    def compute(self, sources, tol3d, tol2d, token=None):
+        """Builds the Gordon surface shape of the edge lists sources.
+        Doesn't access any document object, so it can run in a worker thread"""
+        if len(sources) == 2:
+            guides = sources[0]
+            profiles = sources[1]
         else:
             edges = list()
-            for o in obj.Sources:
-                edges += o.Shape.Edges
-            profiles = list()
-            e0 = edges[0]
-            guides = [e0]
-            for e in edges[1:]:
-                d,pts,info = e0.distToShape(e)
-                if d < obj.Tol3D:
-                    profiles.append(e)
-                else:
-                    guides.append(e)
+            for e in sources:
+                edges += e
+            guides, profiles, stats = classify_edges(edges, tol3d)
+            debug("Gordon : %(edges)d edges classified in %(total_time)0.3fs (%(candidates)d candidate pairs, %(contacts)d contacts)"%stats)
+            if stats["conflicts"] or stats["components"] > 1:
+                FreeCAD.Console.PrintWarning("Gordon : ambiguous curve network (%(components)d components, %(conflicts)d contacts between curves of the same family)\n"%stats)
         
         import gordon
-        reload(gordon)
         guide_curves = [e.Curve.toBSpline() for e in guides]
         profile_curves = [e.Curve.toBSpline() for e in profiles]
 
         # create the gordon surface
-        gordon = gordon.InterpolateCurveNetwork(profile_curves, guide_curves, obj.Tol3D, obj.Tol2D)
+        gordon = gordon.InterpolateCurveNetwork(profile_curves, guide_curves, tol3d, tol2d)
+        gordon.cache = get_network_cache()
+        gordon.token = token
         #gordon.perform()
         #s = gordon.surface_intersections()
         #debug(s)
@@ -92,7 +233,14 @@ class gordon:
             #poly.append(Part.makePolygon(row))
         #obj.Shape = gordon.curve_network()
         # display curves and resulting surface
-        obj.Shape = gordon.surface().toShape()
+        return(gordon.surface().toShape())
+
+    def commit(self, obj, shape):
+        obj.Shape = shape
+        cache = get_network_cache()
+        if cache.path:
+            # only written if new entries were computed
+            cache.save()
 
 class gordonVP:
     def __init__(self,vobj):
@@ -141,6 +289,8 @@ class gordonCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Gordon surface', 'ToolTip': 'Creates a surface that skins a network of curves'}
+        import lazy_commands
+        return(lazy_commands.resources('gordon'))
 
-FreeCADGui.addCommand('gordon', gordonCommand())
+import lazy_commands
+lazy_commands.add_command('gordon', gordonCommand())
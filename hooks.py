@@ -239,9 +239,11 @@ class hookCmd:
         FreeCAD.ActiveDocument.recompute()
             
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/discretize.svg', 'MenuText': 'Hook', 'ToolTip': 'Creates a hook on edge'}
+        import lazy_commands
+        return(lazy_commands.resources('hook'))
 
-FreeCADGui.addCommand('hook', hookCmd())
+import lazy_commands
+lazy_commands.add_command('hook', hookCmd())
 
 
 
@@ -262,9 +262,11 @@ class interpolate:
         FreeCAD.ActiveDocument.recompute()
             
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Interpolate', 'ToolTip': 'Interpolate points with a BSpline curve'}
+        import lazy_commands
+        return(lazy_commands.resources('Interpolate'))
 
-FreeCADGui.addCommand('Interpolate', interpolate())
+import lazy_commands
+lazy_commands.add_command('Interpolate', interpolate())
 
 
 
@@ -9,10 +9,13 @@ multi  = isocurves.multiIso(face,10,20)
 Part.show(multi.toShape())
 '''
 
-from operator import itemgetter
 import FreeCAD
 from FreeCAD import Base
 import Part
+import _utils
+
+#debug = _utils.debug
+debug = _utils.doNothing
 
 class curve(object):
     '''Base class of nurbs curves'''
@@ -43,6 +46,151 @@ class curveOnSurface(curve):
     '''defines a curve on a surface'''
 
 
+# {face hashCode: faceBoundary2d}
+boundary_cache = _utils.LRUCache(32)
+
+def in_range(c2d, par, fp, lp, tol):
+    """True if par is in [fp, lp], modulo the period of periodic curves"""
+    if c2d.isPeriodic():
+        per = c2d.period()
+        while par < fp - tol:
+            par += per
+        while par > lp + tol:
+            par -= per
+    return((par >= fp - tol) and (par <= lp + tol))
+
+class faceBoundary2d(object):
+    """2D boundary of a face, made of the pcurves of all its wires.
+    The pcurves are extracted once, and indexed by their U and V intervals,
+    so that an iso line is only intersected with the pcurves that it can cross."""
+    def __init__(self, face, tol=1e-7):
+        self.face = face
+        self.bounds = face.ParameterRange
+        self.tol = tol * max(self.bounds[1] - self.bounds[0], self.bounds[3] - self.bounds[2], 1.0)
+        self.pcurves = []
+        self.boxes = []
+        for w in face.Wires:
+            for e in w.Edges:
+                try:
+                    c2d, fp, lp = face.curveOnSurface(e)
+                except (RuntimeError, TypeError, ValueError):
+                    continue
+                self.pcurves.append((c2d, fp, lp))
+                self.boxes.append(self.pcurveBox(c2d, fp, lp))
+        debug("faceBoundary2d : %d pcurves"%len(self.pcurves))
+
+    def pcurveBox(self, c2d, fp, lp, samples=16):
+        """[umin, umax, vmin, vmax] of the pcurve.
+        The poles of a BSpline approximation bound the curve, samples are used as a fallback"""
+        try:
+            pts = c2d.toBSpline(fp, lp).getPoles()
+            pad = self.tol
+        except Exception:
+            pts = [c2d.value(fp + i * (lp - fp) / samples) for i in range(samples + 1)]
+            pad = 0.01 * max(self.bounds[1] - self.bounds[0], self.bounds[3] - self.bounds[2])
+        us = [p.x for p in pts]
+        vs = [p.y for p in pts]
+        return([min(us) - pad, max(us) + pad, min(vs) - pad, max(vs) + pad])
+
+    def candidates(self, direc, params):
+        """For each parameter of params, the indices of the pcurves whose interval contains it.
+        Sweeps the sorted parameters, with the pcurves sorted by interval start,
+        and a heap of the active pcurves sorted by interval end."""
+        import heapq
+        lo, hi = (0, 1) if direc == 'U' else (2, 3)
+        starts = sorted(range(len(self.boxes)), key=lambda i: self.boxes[i][lo])
+        order = sorted(range(len(params)), key=lambda i: params[i])
+        result = [None] * len(params)
+        active = []
+        n = 0
+        for i in order:
+            p = params[i]
+            while n < len(starts) and self.boxes[starts[n]][lo] <= p:
+                heapq.heappush(active, (self.boxes[starts[n]][hi], starts[n]))
+                n += 1
+            while active and active[0][0] < p:
+                heapq.heappop(active)
+            result[i] = [idx for end, idx in active]
+        return(result)
+
+    def isoLine(self, direc, param):
+        """2D line segment of the iso curve, across the parameter range of the face"""
+        if direc == 'U':
+            v1 = Base.Vector2d(param, self.bounds[2])
+            v2 = Base.Vector2d(param, self.bounds[3])
+        else:
+            v1 = Base.Vector2d(self.bounds[0], param)
+            v2 = Base.Vector2d(self.bounds[1], param)
+        return(Part.Geom2d.Line2dSegment(v1, v2))
+
+    def intersections(self, l2d, indices):
+        """Sorted parameters, on l2d, of its intersections with the pcurves of indices"""
+        pars = []
+        for idx in indices:
+            c2d, fp, lp = self.pcurves[idx]
+            try:
+                inter = l2d.intersectCC(c2d)
+            except RuntimeError:
+                continue
+            for pt in inter:
+                v = Base.Vector2d(pt.x, pt.y)
+                if in_range(c2d, c2d.parameter(v), fp, lp, self.tol):
+                    pars.append(l2d.parameter(v))
+        pars.sort()
+        # merge the duplicates, at the vertices of the boundary
+        merged = []
+        for p in pars:
+            if not merged or p - merged[-1] > self.tol:
+                merged.append(p)
+        return(merged)
+
+    def segments(self, l2d, pars):
+        """Parameter intervals of l2d that are inside the face.
+        Each interval between 2 intersections is classified by its midpoint,
+        so that holes and tangent contacts are handled"""
+        segs = []
+        for p0, p1 in zip(pars[:-1], pars[1:]):
+            mid = l2d.value(0.5 * (p0 + p1))
+            if not self.face.isPartOfDomain(mid.x, mid.y):
+                continue
+            if segs and abs(segs[-1][1] - p0) <= self.tol:
+                segs[-1][1] = p1
+            else:
+                segs.append([p0, p1])
+        return(segs)
+
+    def trim(self, direc, params):
+        """For each parameter of params, the list of (l2d, first, last) trimmed iso lines"""
+        result = []
+        for param, indices in zip(params, self.candidates(direc, params)):
+            l2d = self.isoLine(direc, param)
+            pars = self.intersections(l2d, indices)
+            result.append([(l2d, p0, p1) for p0, p1 in self.segments(l2d, pars)])
+        return(result)
+
+    def toEdges(self, direc, params):
+        """Edges of the iso curves of params, trimmed by the face boundary"""
+        edges = []
+        for param, segs in zip(params, self.trim(direc, params)):
+            if not segs:
+                debug("%s iso %f : no intersection points"%(direc, param))
+            for l2d, p0, p1 in segs:
+                e = l2d.toShape(self.face, p0, p1)
+                if isinstance(e, Part.Edge):
+                    edges.append(e)
+                else:
+                    FreeCAD.Console.PrintMessage("Failed to create isoCurve shape\n")
+        return(edges)
+
+def boundary(face):
+    """Cached faceBoundary2d of face"""
+    key = face.hashCode()
+    fb = boundary_cache.get(key)
+    if fb is None or not fb.face.isSame(face):
+        fb = faceBoundary2d(face)
+        boundary_cache.set(key, fb)
+    return(fb)
+
 class isoCurve:
     '''isoCurve of a surface'''
     def __init__(self, face, direc = 'U', param = 0):
@@ -64,10 +212,7 @@ class isoCurve:
             self.parameter = param
 
     def faceBounds2d(self):
-        edges2d = []
-        for edge3d in self.face.OuterWire.Edges:
-            edges2d.append(self.face.curveOnSurface(edge3d))
-        return(edges2d)
+        return(boundary(self.face).pcurves)
 
     def getIntersectionPoints(self,l2d,bounds):
         pts = []
@@ -81,33 +226,16 @@ class isoCurve:
         return(pts)
 
     def toShape(self):
-        bounds = self.faceBounds2d()
-        prange = [0,1]
         if self.direction == 'U':
             self.curve = self.face.Surface.uIso(self.parameter)
-            v1 = Base.Vector2d(self.parameter,self.bounds[2])
-            v2 = Base.Vector2d(self.parameter,self.bounds[3])
-            l2d = Part.Geom2d.Line2dSegment(v1,v2)
-            pts = self.getIntersectionPoints(l2d,bounds)
-            if pts:
-                sortedPts = sorted(pts,key=itemgetter(1))
-                prange = [l2d.parameter(Base.Vector2d(sortedPts[0][0], sortedPts[0][1])), l2d.parameter(Base.Vector2d(sortedPts[-1][0], sortedPts[-1][1]))]
-            else:
-                FreeCAD.Console.PrintMessage("No intersection points")
-        elif self.direction == 'V':
+        else:
             self.curve = self.face.Surface.vIso(self.parameter)
-            v1 = Base.Vector2d(self.bounds[0], self.parameter)
-            v2 = Base.Vector2d(self.bounds[1], self.parameter)
-            l2d = Part.Geom2d.Line2dSegment(v1,v2)
-            pts = self.getIntersectionPoints(l2d,bounds)
-            if pts:
-                sortedPts = sorted(pts,key=itemgetter(0))
-                prange = [l2d.parameter(Base.Vector2d(sortedPts[0][0], sortedPts[0][1])), l2d.parameter(Base.Vector2d(sortedPts[-1][0], sortedPts[-1][1]))]
-            else:
-                FreeCAD.Console.PrintMessage("No intersection points")
-        e = l2d.toShape(self.face,prange[0],prange[1])
-        if isinstance(e, Part.Edge):
-            return(e)
+        edges = boundary(self.face).toEdges(self.direction, [self.parameter])
+        if len(edges) == 1:
+            return(edges[0])
+        elif edges:
+            # the iso curve crosses a hole of the face
+            return(Part.Compound(edges))
         else:
             FreeCAD.Console.PrintMessage("Failed to create isoCurve shape")
             return(None)
@@ -145,11 +273,10 @@ class multiIso:
         #self.computeV()
 
     def toShape(self):
-        c = []
-        for u in self.uiso:
-            c.append(u.toShape())
-        for v in self.viso:
-            c.append(v.toShape())
+        """All the iso curves, trimmed in one sweep per direction on the cached face boundary"""
+        fb = boundary(self.face)
+        c = fb.toEdges('U', [iso.parameter for iso in self.uiso])
+        c += fb.toEdges('V', [iso.parameter for iso in self.viso])
         return(Part.Compound(c))
 
     def paramList(self, n, fp, lp):
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+__title__ = "Lazy commands"
+__author__ = "Christophe Grellier (Chris_G)"
+__license__ = "LGPL 2.1"
+__doc__ = "Command proxies that import the module of the real command on first activation."
+
+import sys
+import time
+import FreeCAD
+import FreeCADGui
+import _utils
+
+#debug = _utils.debug
+debug = _utils.doNothing
+
+ICONS = _utils.iconsPath()
+
+# (command name, module, resources)
+# This table is the only source of the command resources : the GetResources method
+# of each command returns resources(command name)
+COMMANDS = [
+    ("extend", "curveExtendFP", {'Pixmap': ICONS + '/extendcurve.svg', 'MenuText': 'Extend Curve', 'ToolTip': 'Extends the selected edge'}),
+    ("join", "JoinCurves", {'Pixmap': ICONS + '/joincurve.svg', 'MenuText': 'Join Curves', 'ToolTip': 'Joins the selected edges into BSpline Curves'}),
+    ("split", "splitCurves", {'Pixmap': ICONS + '/splitcurve.svg', 'MenuText': 'Split Curve', 'ToolTip': 'Splits the selected edge'}),
+    ("Discretize", "Discretize", {'Pixmap': ICONS + '/discretize.svg', 'MenuText': 'Discretize', 'ToolTip': 'Discretize an edge or a wire'}),
+    ("Approximate", "approximate", {'Pixmap': ICONS + '/approximate.svg', 'MenuText': 'Approximate', 'ToolTip': 'Approximate points to NURBS curve or surface'}),
+    ("ParametricBlendCurve", "ParametricBlendCurve", {'Pixmap': ICONS + '/blend1.svg', 'MenuText': 'ParametricBlendCurve', 'ToolTip': 'Creates a parametric blend curve'}),
+    ("ParametricComb", "ParametricComb", {'Pixmap': ICONS + '/comb.svg', 'MenuText': 'ParametricComb', 'ToolTip': 'Creates a parametric Comb plot on selected edges'}),
+    ("ZebraTool", "ZebraTool", {'Pixmap': ICONS + '/zebra.svg', 'MenuText': 'ZebraTool', 'ToolTip': 'Zebra texture for surface inspection'}),
+    ("Trim", "TrimFace", {'Pixmap': ICONS + '/trimFace.svg', 'MenuText': 'Trim face', 'ToolTip': 'Trim a face with a projected curve'}),
+    ("GeomInfo", "GeomInfo", {'Pixmap': ICONS + '/info.svg', 'MenuText': 'Geometry Info', 'ToolTip': 'displays info about the geometry of the selected topology'}),
+    ("extract", "ExtractShapes", {'Pixmap': ICONS + '/extract.svg', 'MenuText': 'Extract', 'ToolTip': 'Extract selected subshapes from objects'}),
+    ("IsoCurve", "IsoCurve", {'Pixmap': ICONS + '/isocurve.svg', 'MenuText': 'IsoCurve', 'ToolTip': 'IsoCurve: Create an IsoCurve from a face'}),
+    ("SoS", "Sketch_On_Surface", {'Pixmap': ICONS + '/sketch_surf.svg', 'MenuText': 'SoS', 'ToolTip': 'Maps a sketch on a surface'}),
+    ("sw2r", "Sweep2Rails", {'Pixmap': ICONS + '/sw2r.svg', 'MenuText': 'Sweep2Rails', 'ToolTip': 'Sweep profiles on 2 rails'}),
+    ("hook", "hooks", {'Pixmap': ICONS + '/discretize.svg', 'MenuText': 'Hook', 'ToolTip': 'Creates a hook on edge'}),
+    ("cos", "curveOnSurfaceFP", {'Pixmap': ICONS + '/curveOnSurface.svg', 'MenuText': 'CurveOnSurface', 'ToolTip': 'Create a curve on surface object'}),
+    ("blendSurface", "blendSurfaceFP", {'Pixmap': ICONS + '/blendSurf.svg', 'MenuText': 'Blend Surface', 'ToolTip': 'Blending Surface between to curveOnSurface objects '}),
+    ("solid", "parametricSolid", {'Pixmap': ICONS + '/solid.svg', 'MenuText': 'Make Solid', 'ToolTip': 'Make a parametric solid from selected faces'}),
+    ("profileSupportCmd", "ProfileSketch", {'Pixmap': ICONS + '/profileSupport.svg', 'MenuText': 'Create a profile support plane', 'ToolTip': 'Create a profile support plane'}),
+    ("pasteSVG", "pasteSVG", {'Pixmap': ICONS + '/svg.svg', 'MenuText': 'paste SVG', 'ToolTip': 'Pastes the SVG content of the clipboard'}),
+    ("profile", "pipeshellProfileFP", {'Pixmap': ICONS + '/profile.svg', 'MenuText': 'Profile object', 'ToolTip': 'Creates a Profile object for PipeShell'}),
+    ("pipeshell", "pipeshellFP", {'Pixmap': ICONS + '/pipeshell.svg', 'MenuText': 'PipeShell object', 'ToolTip': 'Creates a PipeShell object'}),
+    ("gordon", "gordonFP", {'Pixmap': ICONS + '/gordon.svg', 'MenuText': 'Gordon surface', 'ToolTip': 'Creates a surface that skins a network of curves'}),
+    ("to_console", "toConsole", {'Pixmap': ICONS + '/toconsole.svg', 'MenuText': 'to Console', 'ToolTip': 'Objects to console'}),
+    ("combined_projection", "combined_curve", {'Pixmap': ICONS + '/combined_curve.svg', 'MenuText': 'Combined projection curve', 'ToolTip': 'Builds a 3D curve as the intersection of 2 projected curves'}),
+    ("bspline_to_console", "curve_to_script", {'Pixmap': ICONS + '/toconsole.svg', 'MenuText': 'BSpline to Console', 'ToolTip': 'BSpline curves to python console'}),
+    ("SublinkEditor", "sublink_edit", {'Pixmap': ICONS + '/sublink_edit.svg', 'MenuText': 'Sublink editor', 'ToolTip': 'Editor widget for sublink properties of objects'}),
+    ("adjacent_faces", "adjacent_faces", {'Pixmap': 'WhatsThis.svg', 'MenuText': 'Adjacent faces', 'ToolTip': 'Select the Adjacent faces of the selected subshape'}),
+    ("Interpolate", "interpolate", {'Pixmap': ICONS + '/interpolate.svg', 'MenuText': 'Interpolate', 'ToolTip': 'Interpolate points with a BSpline curve'}),
+]
+
+# {module name: import time in seconds}
+import_times = dict()
+# {command name: command} registered by the workbench modules through add_command
+loaded_commands = dict()
+# names of the commands registered as LazyCommand proxies
+lazy_names = set()
+
+def resources(name):
+    """Resources of the command name, as returned by its GetResources method"""
+    for cmd_name, module, res in COMMANDS:
+        if cmd_name == name:
+            return(dict(res))
+    return(dict())
+
+def add_command(name, cmd):
+    """Registers a command of a workbench module, instead of FreeCADGui.addCommand.
+    The command is kept in loaded_commands, whichever way its module is imported,
+    and only added to FreeCADGui if it has no LazyCommand proxy"""
+    loaded_commands[name] = cmd
+    if not name in lazy_names:
+        FreeCADGui.addCommand(name, cmd)
+
+def load_module(name):
+    """Import module name, if needed. Its commands are registered in loaded_commands by add_command.
+    The import time is stored in import_times"""
+    if name in sys.modules:
+        return(sys.modules[name])
+    t0 = time.time()
+    module = __import__(name)
+    import_times[name] = time.time() - t0
+    debug("Curves : %s imported in %0.3fs"%(name, import_times[name]))
+    return(module)
+
+class LazyCommand(object):
+    """Command proxy that carries the resources of a command.
+    The module of the real command is imported on first activation"""
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+
+    def command(self):
+        if not self.name in loaded_commands:
+            load_module(self.module)
+        return(loaded_commands.get(self.name))
+
+    def GetResources(self):
+        return(resources(self.name))
+
+    def Activated(self, *args):
+        cmd = self.command()
+        if cmd is None:
+            FreeCAD.Console.PrintError("Curves : command %s not found in module %s\n"%(self.name, self.module))
+            return
+        cmd.Activated(*args)
+
+    def IsActive(self):
+        # until the module is loaded, the command is active if there is a document
+        cmd = loaded_commands.get(self.name)
+        if cmd is not None and hasattr(cmd, "IsActive"):
+            return(cmd.IsActive())
+        return(FreeCAD.ActiveDocument is not None)
+
+def register(commands=COMMANDS, lazy=True):
+    """Add the commands to FreeCADGui.
+    With lazy=False, all the modules are imported now, which fills import_times"""
+    existing = FreeCADGui.listCommands()
+    for name, module, res in commands:
+        if name in existing:
+            # already registered, by a module imported before the workbench
+            continue
+        if lazy:
+            lazy_names.add(name)
+            FreeCADGui.addCommand(name, LazyCommand(name, module))
+        else:
+            load_module(module)
+
+def import_report():
+    """Print the import time of the modules loaded so far, slowest first"""
+    total = 0.
+    for name, t in sorted(import_times.items(), key=lambda item: -item[1]):
+        FreeCAD.Console.PrintMessage("%8.3fs  %s\n"%(t, name))
+        total += t
+    FreeCAD.Console.PrintMessage("%8.3fs  total\n"%total)
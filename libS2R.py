@@ -12,6 +12,89 @@ DEBUG = False
 EXTEND = True
 
 
+def matrix_array(m):
+    """Returns the (3,4) numpy array of the affine part of a FreeCAD.Matrix"""
+    import numpy as np
+    return(np.array(((m.A11, m.A12, m.A13, m.A14),
+                     (m.A21, m.A22, m.A23, m.A24),
+                     (m.A31, m.A32, m.A33, m.A34))))
+
+def transform_points(m, pts):
+    """Applies a (3,4) matrix array to an array of points (n,3)"""
+    import numpy as np
+    return(np.dot(pts, m[:,:3].T) + m[:,3])
+
+def sample_edge(edge, nb):
+    """Returns nb uniform parameters of edge, and the (nb,3) array of the points"""
+    import numpy as np
+    import nurbs_tools
+    params = np.linspace(edge.FirstParameter, edge.LastParameter, nb)
+    if isinstance(edge.Curve, Part.BSplineCurve):
+        pts = nurbs_tools.curve_values(edge.Curve, params)[:,0]
+    else:
+        pts = np.array([(v.x, v.y, v.z) for v in [edge.valueAt(t) for t in params]])
+    return(params, pts)
+
+def approximate_profile(pts):
+    bspline = Part.BSplineCurve()
+    bspline.approximate(Points = pts, ParamType = 'Chordlength') # 'Uniform' 'Centripetal'
+    return(bspline)
+
+class RailSampler(object):
+    """Sampled polyline of a rail, used to find its contact with the profiles.
+    The nearest samples give a seed, that is refined on the exact curves"""
+    def __init__(self, edge, nb=512):
+        self.edge = edge
+        self.params, self.points = sample_edge(edge, nb)
+        self.tree = None
+        try:
+            from scipy.spatial import cKDTree
+            self.tree = cKDTree(self.points)
+        except ImportError:
+            pass
+
+    def nearest(self, pts):
+        """Returns the distances and the indices of the samples nearest to pts"""
+        import numpy as np
+        if self.tree is not None:
+            return(self.tree.query(pts))
+        d = np.linalg.norm(pts[:,None,:] - self.points[None,:,:], axis=2)
+        idx = d.argmin(axis=1)
+        return(d[np.arange(len(pts)), idx], idx)
+
+    def contact(self, edge, nb=100, maxIter=20, tol=1e-10):
+        """Returns (edge parameter, rail parameter, distance) of the closest points of edge and the rail,
+        or None if the Newton refinement fails"""
+        import numpy as np
+        params, pts = sample_edge(edge, nb)
+        dist, idx = self.nearest(pts)
+        k = int(np.argmin(dist))
+        s = params[k]
+        t = self.params[idx[k]]
+        seed = dist[k]
+        r0, r1 = self.edge.FirstParameter, self.edge.LastParameter
+        p0, p1 = edge.FirstParameter, edge.LastParameter
+        for i in range(maxIter):
+            # Newton step on f(s,t) = |P(s) - R(t)|^2 / 2
+            d = edge.valueAt(s) - self.edge.valueAt(t)
+            dp = edge.derivative1At(s)
+            dr = self.edge.derivative1At(t)
+            g = np.array((dp.dot(d), -dr.dot(d)))
+            h = np.array(((edge.derivative2At(s).dot(d) + dp.dot(dp), -dp.dot(dr)),
+                          (-dp.dot(dr), -self.edge.derivative2At(t).dot(d) + dr.dot(dr))))
+            try:
+                ds, dt = np.linalg.solve(h, -g)
+            except np.linalg.LinAlgError:
+                break
+            s = min(max(s + ds, p0), p1)
+            t = min(max(t + dt, r0), r1)
+            if abs(ds) < tol * (p1 - p0) and abs(dt) < tol * (r1 - r0):
+                break
+        d = edge.valueAt(s).distanceToPoint(self.edge.valueAt(t))
+        if d > seed + 1e-7:
+            return(None)
+        return(float(s), float(t), d)
+
 class profile:
     
     def __init__(self, curve):
@@ -79,7 +162,7 @@ class birail:
         return(m)
     
 
-class SweepOn2Rails:
+class SweepOn2Rails(object):
     
     def __init__(self):
         self.birail = None
@@ -91,12 +174,34 @@ class SweepOn2Rails:
         self.parametrization = 0.5
         self.transvec = FreeCAD.Vector(0,1,0)
         self.fac = 10
+        self.railSamplers = None
+        # CancelToken of the background job (see async_compute), or None
+        self.token = None
+
+    def progress(self, fraction, message=""):
+        """Reports progress to the background job, which raises async_compute.Cancelled if it was cancelled"""
+        if self.token is not None:
+            self.token.progress(fraction, message)
         
     def setRails(self, ruledSurf):
         # TODO: Check for twisted Ruled Surface
         self.birail = birail(ruledSurf)
+        self.railSamplers = None
 
     def getContactParams(self, pro):
+        """Returns (rail1 param, rail2 param, profile, profile param on rail1, profile param on rail2)
+        Contacts are seeded from the sampled rails and refined on the exact curves.
+        distToShape is only used if the refinement fails"""
+        if self.railSamplers is None:
+            self.railSamplers = [RailSampler(r) for r in self.birail.rails]
+        c1 = self.railSamplers[0].contact(pro)
+        c2 = self.railSamplers[1].contact(pro)
+        if (c1 is None) or (c2 is None):
+            return(self.getContactParamsExact(pro))
+        FreeCAD.Console.PrintMessage('\nProfile parameters :\n%s\n%s\n'%(str(c1[0]),str(c2[0])))
+        return((c1[1], c2[1], pro, c1[0], c2[0]))
+
+    def getContactParamsExact(self, pro):
         dts1 = pro.distToShape(self.birail.rails[0])
         dts2 = pro.distToShape(self.birail.rails[1])
         #FreeCAD.Console.PrintMessage('\nProfile :\n%s\n%s\n'%(str(dts1),str(dts2)))
@@ -116,13 +221,11 @@ class SweepOn2Rails:
         return((rail1ContactParam, rail2ContactParam, pro, pro1ContactParam, pro2ContactParam))
             
     def setProfiles(self, plist):
-        data = []
         self.knots1, self.knots2 = [],[]
-        for pro in plist:
-            pts = pro.discretize(100)
-            bspline = Part.BSplineCurve()
-            bspline.approximate(Points = pts, ParamType = 'Chordlength') # 'Uniform' 'Centripetal'
-            bs = Part.Edge(bspline) #, pro.FirstParameter, pro.LastParameter)
+        data = []
+        for i, pro in enumerate(plist):
+            self.progress(0.3 * i / len(plist), "Sweep2Rails profile %d"%(i+1))
+            bs = Part.Edge(approximate_profile(pro.discretize(100))) #, pro.FirstParameter, pro.LastParameter)
             data.append(self.getContactParams(bs))
         sortedProfs = sorted(data,key=itemgetter(0)) # Sort profiles on rail1ContactParam
         self.profiles = []
@@ -163,13 +266,14 @@ class SweepOn2Rails:
         FreeCAD.Console.PrintMessage('\nMatrix 1\n%s\n'%str(m1))
         FreeCAD.Console.PrintMessage('\nMatrix 2\n%s\n'%str(m2))
         # Not sure it will work on Curve Poles ----v
-        pts = pro.realCurve.Curve.getPoles()
+        import numpy as np
+        pts = np.array([(p.x, p.y, p.z) for p in pro.realCurve.Curve.getPoles()])
         c1 = pro.realCurve.Curve.copy()
         c2 = pro.realCurve.Curve.copy()
-        for i in range(len(pts)):
-            #np = m1.inverse().multiply(p)
-            c1.setPole(i+1, m1.inverse().multiply(pts[i]))
-            c2.setPole(i+1, m2.inverse().multiply(pts[i]))
+        for c, m in ((c1, m1), (c2, m2)):
+            local = transform_points(matrix_array(m.inverse()), pts)
+            for i in range(len(local)):
+                c.setPole(i+1, FreeCAD.Vector(*local[i]))
         pro.localCurve1 = Part.Edge(c1, pro.FirstParameter, pro.LastParameter)
         pro.localCurve2 = Part.Edge(c2, pro.FirstParameter, pro.LastParameter)
 
@@ -249,6 +353,7 @@ class SweepOn2Rails:
         c2 = []
         k = range(len(self.profiles))
         for i in range(self.profileSamples):
+            self.progress(0.3 + 0.3 * i / self.profileSamples, "Sweep2Rails interpolation")
             pts1 = []
             pts2 = []
             for pro in self.profiles:
@@ -279,41 +384,42 @@ class SweepOn2Rails:
                 el.append(Part.Edge(c))
         return(Part.Compound(el))
 
+    def railFrames(self, params):
+        """Returns the 2 arrays (nb_params, 3, 4) of the rail matrices at the birail parameters"""
+        import numpy as np
+        frames = (np.empty((len(params),3,4)), np.empty((len(params),3,4)))
+        for i in range(len(params)):
+            self.progress(0.6 + 0.2 * i / len(params), "Sweep2Rails rail frames")
+            for r in range(2):
+                t = self.birail.paramCurves[r].value(params[i]).y
+                frames[r][i] = matrix_array(self.birail.matrixAt(t,r))
+        return(frames)
+
     def discretize(self):
-        p1 = []
-        p2 = []
+        """Evaluates the 2 sweeps on a railSamples x profileSamples grid.
+        Each interpolating curve is evaluated at all the rail samples in one call,
+        then the rail matrices are applied to the whole rows of points"""
+        import numpy as np
+        import nurbs_tools
         n = len(self.profiles) - 1
-        #gr = int(1.0 * self.railSamples / n) + 1
-        #self.railSamples = gr * n
-        for i in range(self.railSamples):
-            pts1 = []
-            pts2 = []
-            t = 1.0 * n * i / (self.railSamples - 1)
-            # Get the good matrices from the birail
-            t1 = self.birail.paramCurves[0].value(t).y
-            t2 = self.birail.paramCurves[1].value(t).y
-            m1 = self.birail.matrixAt(t1,0)
-            m2 = self.birail.matrixAt(t2,1)
-            for ri in range(self.profileSamples):
-
-
-                # Pick a point on interpolating curves
-                e1 = Part.Edge(self.interpoCurves[0][ri])
-                pt1 = e1.valueAt(t) #u1)
-                
-                e2 = Part.Edge(self.interpoCurves[1][ri])
-                pt2 = e2.valueAt(t) #u2)
-                
-                v = FreeCAD.Vector(self.transvec)
-                v.multiply(- t * self.fac)
-                
-                pts1.append(m1.multiply(pt1.add(v)))
-                pts2.append(m2.multiply(pt2.add(v)))
-                
-            p1.append(pts1)
-            p2.append(pts2)
-            
-        self.results = (p1,p2)
+        params = np.array([1.0 * n * i / (self.railSamples - 1) for i in range(self.railSamples)])
+        frames = self.railFrames(params)
+        tv = self.transvec
+        trans = np.outer(- params * self.fac, (tv.x, tv.y, tv.z))
+        arrays = []
+        for r in range(2):
+            # pts[i,j] : point of profile sample j at rail sample i
+            pts = np.stack([nurbs_tools.curve_values(c, params)[:,0] for c in self.interpoCurves[r][:self.profileSamples]], axis=1)
+            pts += trans[:,None,:]
+            m = frames[r]
+            arrays.append(np.einsum('ijk,irk->irj', m[:,:,:3], pts) + m[:,None,:,3])
+        self.resultArrays = tuple(arrays)
+
+    @property
+    def results(self):
+        """The 2 grids of points of discretize, as lists of rows of FreeCAD.Vector"""
+        import nurbs_tools
+        return(tuple(nurbs_tools.array_to_vectors(a) for a in self.resultArrays))
  
     def downgradeArray(self):
         pt1 = []
@@ -322,6 +428,7 @@ class SweepOn2Rails:
         return(pt1)
 
     def mix(self, method = "Rail1"):
+        import numpy as np
         # mix the 2 sets of points here
         #pt1 = []
         #for row in self.results[0]:
@@ -330,27 +437,22 @@ class SweepOn2Rails:
         #for row in self.results[1]:
             #pt2 += row
 
+        import nurbs_tools
+        a1, a2 = self.resultArrays
         if method == "Rail1":
-            self.result = self.results[0]
+            arr = a1
         elif method == "Rail2":
-            self.result = self.results[1]
-        elif method in ["Average","Blend"]:
-            arr2d = []
-            l = len(self.results[0][0])-1
-            for i in range(len(self.results[0])):
-                row = []
-                for j in range(len(self.results[0][0])):
-                    p1 = FreeCAD.Vector(self.results[0][i][j])
-                    p2 = FreeCAD.Vector(self.results[1][i][j])
-                    if method == "Average":
-                        p1.multiply(0.5)
-                        p2.multiply(0.5)
-                    else:
-                        p1.multiply(1.0*(l-j)/l)
-                        p2.multiply(1.0*j/l)
-                    row.append(p1.add(p2))
-                arr2d.append(row)
-            self.result = arr2d
+            arr = a2
+        elif method == "Average":
+            arr = 0.5 * (a1 + a2)
+        elif method == "Blend":
+            l = a1.shape[1] - 1
+            w = (1.0 * np.arange(l + 1) / l)[None,:,None]
+            arr = (1.0 - w) * a1 + w * a2
+        else:
+            return
+        self.resultArray = arr
+        self.result = nurbs_tools.array_to_vectors(arr)
         
     def shapeCloud(self):
         v = []
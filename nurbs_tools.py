@@ -16,10 +16,27 @@ def error(s):
     FreeCAD.Console.PrintError(s)
 
 class BsplineBasis(object):
-    """Computes basis functions of a bspline curve, and its derivatives"""
-    def __init__(self):
-        self.knots = [0.0, 0.0, 1.0, 1.0]
-        self.degree = 1
+    """Computes basis functions of a bspline curve, and its derivatives.
+    find_span, basis_funs and ders_basis_funs process a single parameter, and are the reference implementation.
+    find_spans, ders_basis_funs_array and evaluate_array process many parameters per call,
+    with the selected backend (see BASIS_BACKENDS)"""
+    def __init__(self, knots=None, degree=1, backend=None):
+        if knots is None:
+            knots = [0.0, 0.0, 1.0, 1.0]
+        self.knots = knots
+        self.degree = degree
+        self.backend = backend
+        # work buffers of the array backends, reused by successive calls
+        self.scratch = dict()
+
+    @property
+    def knots(self):
+        return(self._knots)
+
+    @knots.setter
+    def knots(self, knots):
+        import numpy as np
+        self._knots = np.ascontiguousarray(knots, dtype=float)
 
     def find_span(self,u):
         """ Determine the knot span index.
@@ -137,6 +154,507 @@ class BsplineBasis(object):
             f[span-self.degree+i] = val
         return(f)
 
+    def find_spans(self, params):
+        """ Determine the knot span indices of a set of parameters (int array)"""
+        return(find_spans(self._knots, self.degree, params))
+
+    def ders_basis_funs_array(self, params, n, spans=None):
+        """ Compute nonzero basis functions and their derivatives for a set of parameters.
+        - input: parameters (sequence of floats), number of derivatives n (int), optional span indices
+        - output: (spans, ders) where ders is an array of shape (nb_params, n+1, degree+1)
+        """
+        import numpy as np
+        u = np.atleast_1d(np.asarray(params, dtype=float))
+        if spans is None:
+            spans = self.find_spans(u)
+        backend = self.backend or BASIS_BACKEND
+        if backend == "python":
+            ders = np.array([self.ders_basis_funs(i, t, n) for i,t in zip(spans, u)]).reshape(len(u), n+1, self.degree+1)
+        elif backend == "numba" and numba_kernel() is not None:
+            ders = np.zeros((len(u), n+1, self.degree+1))
+            ndu, left, right, a = self.buffers("numba", (self.degree+1, self.degree+1), (self.degree+1,), (self.degree+1,), (2, self.degree+1))
+            numba_kernel()(self._knots, self.degree, spans, u, n, ders, ndu, left, right, a)
+        else:
+            ders = ders_basis_funs_array(self._knots, self.degree, spans, u, n, self.scratch)
+        return(spans, ders)
+
+    def evaluate_array(self, params, d):
+        """ Compute the derivative d of the basis functions at a set of parameters, in compact form.
+        - input: parameters (sequence of floats), derivative d (int)
+        - output: (first, values) where first (int array) is the index of the first nonzero basis function
+        of each parameter, and values the array of shape (nb_params, degree+1) of the nonzero values
+        """
+        spans, ders = self.ders_basis_funs_array(params, d)
+        return(spans - self.degree, ders[:,d,:])
+
+    def buffers(self, name, *shapes):
+        """Returns the work arrays name of the given shapes, allocated on first use"""
+        import numpy as np
+        bufs = self.scratch.get(name)
+        if bufs is None or [b.shape for b in bufs] != list(shapes):
+            bufs = [np.zeros(sh) for sh in shapes]
+            self.scratch[name] = bufs
+        return(bufs)
+
+# Default backend of BsplineBasis array methods :
+# "numpy" : vectorized over the parameters
+# "numba" : compiled loops over the parameters, if numba is installed, numpy otherwise
+# "python" : BsplineBasis.ders_basis_funs for each parameter (reference)
+BASIS_BACKENDS = ["numpy", "numba", "python"]
+BASIS_BACKEND = "numpy"
+
+def set_basis_backend(name):
+    """Select the default backend of the BsplineBasis array methods, and of basis_matrix"""
+    global BASIS_BACKEND
+    if not name in BASIS_BACKENDS:
+        raise ValueError("set_basis_backend : unknown backend %r"%name)
+    if name == "numba" and numba_kernel() is None:
+        error("numba is not available, using numpy basis functions\n")
+        name = "numpy"
+    BASIS_BACKEND = name
+
+def ders_basis_funs_loop(knots, degree, spans, params, n, ders, ndu, left, right, a):
+    """ Scalar loops of BsplineBasis.ders_basis_funs over a set of parameters, on preallocated arrays.
+    The results are written in ders, of shape (nb_params, n+1, degree+1).
+    This function is compiled by numba_kernel()"""
+    p = degree
+    for m in range(params.shape[0]):
+        i = spans[m]
+        u = params[m]
+        ndu[0,0] = 1.0
+        for j in range(1, p+1):
+            left[j] = u - knots[i+1-j]
+            right[j] = knots[i+j] - u
+            saved = 0.0
+            for r in range(j):
+                ndu[j,r] = right[r+1] + left[j-r]
+                temp = ndu[r,j-1] / ndu[j,r]
+                ndu[r,j] = saved + right[r+1] * temp
+                saved = left[j-r] * temp
+            ndu[j,j] = saved
+        for j in range(p+1):
+            ders[m,0,j] = ndu[j,p]
+        for r in range(p+1):
+            s1 = 0
+            s2 = 1
+            for j in range(p+1):
+                a[0,j] = 0.0
+                a[1,j] = 0.0
+            a[0,0] = 1.0
+            for k in range(1, n+1):
+                d = 0.0
+                if k > p:
+                    ders[m,k,r] = 0.0
+                    continue
+                rk = r-k
+                pk = p-k
+                if r >= k:
+                    a[s2,0] = a[s1,0] / ndu[pk+1,rk]
+                    d = a[s2,0] * ndu[rk,pk]
+                if rk >= -1:
+                    j1 = 1
+                else:
+                    j1 = -rk
+                if (r-1) <= pk:
+                    j2 = k-1
+                else:
+                    j2 = p-r
+                for j in range(j1, j2+1):
+                    a[s2,j] = (a[s1,j] - a[s1,j-1]) / ndu[pk+1,rk+j]
+                    d += a[s2,j] * ndu[rk+j,pk]
+                if r <= pk:
+                    a[s2,k] = -a[s1,k-1] / ndu[pk+1,r]
+                    d += a[s2,k] * ndu[r,pk]
+                ders[m,k,r] = d
+                s1, s2 = s2, s1
+        f = p
+        for k in range(1, n+1):
+            for j in range(p+1):
+                ders[m,k,j] *= f
+            f *= (p-k)
+
+_numba_kernel = []
+
+def numba_kernel():
+    """Returns ders_basis_funs_loop compiled by numba, or None if numba is not installed"""
+    if not _numba_kernel:
+        try:
+            import numba
+            _numba_kernel.append(numba.njit(cache=True)(ders_basis_funs_loop))
+        except ImportError:
+            _numba_kernel.append(None)
+    return(_numba_kernel[0])
+
+# ---------------------------------------------------
+# Vectorized basis functions evaluation
+# Same algorithms as BsplineBasis, but all the parameters are processed at once
+
+def find_spans(knots, degree, params):
+    """ Determine the knot span indices of a set of parameters.
+    - input: flat knot vector, degree (int), parameters (sequence of floats)
+    - output: the knot span indices (numpy array of ints)
+    Vectorized version of BsplineBasis.find_span
+    """
+    import numpy as np
+    knots = np.asarray(knots, dtype=float)
+    u = np.atleast_1d(np.asarray(params, dtype=float))
+    n = len(knots)-degree-1
+    spans = np.searchsorted(knots, u, side='right') - 1
+    return(np.clip(spans, degree, n-1))
+
+def ders_basis_funs_array(knots, degree, spans, params, n, scratch=None):
+    """ Compute nonzero basis functions and their derivatives for a set of parameters.
+    - input: flat knot vector, degree (int), knot span indices (int array),
+    parameters (float array), number of derivatives n (int),
+    optional dictionary where the work arrays are kept between calls
+    - output: basis functions and derivatives (numpy array of shape (nb_params, n+1, degree+1))
+    Vectorized version of BsplineBasis.ders_basis_funs (Nurbs Book Algo A2.3 p.72)
+    """
+    import numpy as np
+    knots = np.asarray(knots, dtype=float)
+    u = np.atleast_1d(np.asarray(params, dtype=float))
+    spans = np.atleast_1d(spans)
+    p = degree
+    m = len(u)
+    if scratch is None:
+        scratch = dict()
+    bufs = scratch.get("numpy")
+    if bufs is None or bufs[0].shape != (p+1, p+1, m):
+        bufs = [np.empty((p+1, p+1, m)), np.zeros((p+1, m)), np.zeros((p+1, m)), np.empty((2, p+1, m)), np.empty(m), np.empty(m), np.empty(m)]
+        scratch["numpy"] = bufs
+    ndu, left, right, a, saved, temp, d = bufs
+    ders = np.zeros((n+1, p+1, m))
+    ndu[0,0] = 1.0
+    for j in range(1, p+1):
+        np.subtract(u, knots[spans+1-j], out=left[j])
+        np.subtract(knots[spans+j], u, out=right[j])
+        saved[:] = 0.0
+        for r in range(j):
+            np.add(right[r+1], left[j-r], out=ndu[j,r])
+            np.divide(ndu[r,j-1], ndu[j,r], out=temp)
+            np.multiply(right[r+1], temp, out=ndu[r,j])
+            ndu[r,j] += saved
+            np.multiply(left[j-r], temp, out=saved)
+        ndu[j,j] = saved
+    ders[0] = ndu[:,p]
+    # derivatives of order higher than the degree are null
+    nd = min(n, p)
+    for r in range(p+1):
+        s1 = 0
+        s2 = 1
+        a[:] = 0.0
+        a[0,0] = 1.0
+        for k in range(1, nd+1):
+            d[:] = 0.0
+            rk = r-k
+            pk = p-k
+            if r >= k:
+                np.divide(a[s1,0], ndu[pk+1,rk], out=a[s2,0])
+                np.multiply(a[s2,0], ndu[rk,pk], out=d)
+            if rk >= -1:
+                j1 = 1
+            else:
+                j1 = -rk
+            if (r-1) <= pk:
+                j2 = k-1
+            else:
+                j2 = p-r
+            for j in range(j1, j2+1):
+                a[s2,j] = (a[s1,j] - a[s1,j-1]) / ndu[pk+1,rk+j]
+                d += a[s2,j] * ndu[rk+j,pk]
+            if r <= pk:
+                np.divide(a[s1,k-1], ndu[pk+1,r], out=a[s2,k])
+                a[s2,k] *= -1.0
+                d += a[s2,k] * ndu[r,pk]
+            ders[k,r] = d
+            s1, s2 = s2, s1
+    r = p
+    for k in range(1, nd+1):
+        ders[k] *= r
+        r *= (p-k)
+    return(ders.transpose(2, 0, 1))
+
+def basis_matrix(degree, knots, params, derivOrder=0, form="dense"):
+    """ Compute the matrix of the basis functions (or derivative) of a bspline, at a set of parameters.
+    - input: degree (int), flat knot vector, parameters (sequence of floats),
+    derivative order (int), form of the result (str)
+    - output, depending on form:
+        "dense"   : numpy array of shape (nb_params, nb_poles)
+        "compact" : (first, values) where first (int array) is the index of the first nonzero
+                    basis function of each row, and values the array of shape (nb_params, degree+1)
+                    of the nonzero values
+        "sparse"  : scipy.sparse.csr_matrix of shape (nb_params, nb_poles)
+    bsplineBasisMat of BSplineAlgorithms and BSplineApproxInterp use this function.
+    The basis functions are computed by the default backend of BsplineBasis (see set_basis_backend).
+    """
+    import numpy as np
+    u = np.atleast_1d(np.asarray(params, dtype=float))
+    ncp = len(knots) - degree - 1
+    first, values = BsplineBasis(knots, degree).evaluate_array(u, derivOrder)
+    if form == "compact":
+        return(first, values)
+    rows = np.repeat(np.arange(len(u)), degree+1)
+    cols = (first[:,None] + np.arange(degree+1)).ravel()
+    if form == "sparse":
+        from scipy import sparse
+        return(sparse.csr_matrix((values.ravel(), (rows, cols)), shape=(len(u), ncp)))
+    elif form == "dense":
+        mx = np.zeros((len(u), ncp))
+        mx[rows, cols] = values.ravel()
+        return(mx)
+    else:
+        raise ValueError("basis_matrix : unknown form %r"%form)
+
+def curve_derivatives_array(degree, knots, poles, params, n=0, weights=None):
+    """ Compute the points and derivatives of a bspline curve at a set of parameters.
+    - input: degree (int), flat knot vector, poles (sequence of FreeCAD.Vector or array (nb_poles, dim)),
+    parameters (sequence of floats), number of derivatives n (int), optional weights
+    - output: numpy array of shape (nb_params, n+1, dim)
+    Rational curves use Nurbs Book Algo A4.2 p.127
+    """
+    import numpy as np
+    if len(poles) > 0 and isinstance(poles[0], FreeCAD.Vector):
+        poles = [(p.x, p.y, p.z) for p in poles]
+    P = np.asarray(poles, dtype=float)
+    u = np.atleast_1d(np.asarray(params, dtype=float))
+    spans, ders = BsplineBasis(knots, degree).ders_basis_funs_array(u, n)
+    # indices of the poles of each parameter, shape (nb_params, degree+1)
+    idx = spans[:,None] - degree + np.arange(degree+1)
+    if weights is None:
+        return(np.einsum('mkj,mjd->mkd', ders, P[idx]))
+    w = np.asarray(weights, dtype=float)
+    Aders = np.einsum('mkj,mjd->mkd', ders, P[idx] * w[idx,None])
+    wders = np.einsum('mkj,mj->mk', ders, w[idx])
+    CK = np.zeros_like(Aders)
+    for k in range(n+1):
+        v = Aders[:,k].copy()
+        for i in range(1, k+1):
+            v -= binomial(k, i) * wders[:,i,None] * CK[:,k-i]
+        CK[:,k] = v / wders[:,0,None]
+    return(CK)
+
+def curve_values(curve, params, n=0):
+    """ Compute the points and derivatives of a Part.BSplineCurve at a set of parameters.
+    - input: BSplineCurve, parameters (sequence of floats), number of derivatives n (int)
+    - output: numpy array of shape (nb_params, n+1, 3)
+    Periodic curves are evaluated by OCC
+    """
+    import numpy as np
+    if curve.isPeriodic():
+        res = np.zeros((len(params), n+1, 3))
+        for i,u in enumerate(params):
+            v = curve.value(u)
+            res[i,0] = (v.x, v.y, v.z)
+            for k in range(1, n+1):
+                v = curve.getDN(u, k)
+                res[i,k] = (v.x, v.y, v.z)
+        return(res)
+    weights = None
+    if curve.isRational():
+        weights = curve.getWeights()
+    return(curve_derivatives_array(curve.Degree, curve.KnotSequence, curve.getPoles(), params, n, weights))
+
+def interpolate_array(points, degree=3):
+    """ Interpolate several point sequences with bspline curves that share the same parameters and knots,
+    so that a single linear system is solved for all the curves.
+    - input: points (array of shape (nb_points, nb_curves, dim)), degree (int)
+    - output: (poles, mults, knots, degree), poles being an array of shape (nb_points, nb_curves, dim),
+    or None if the sequences are too short or degenerated
+    The parameters are the average of the chord length parametrizations of the sequences,
+    and the knots are averaged from the parameters (Nurbs Book eq. 9.8 p.365)
+    """
+    import numpy as np
+    pts = np.asarray(points, dtype=float)
+    m = len(pts)
+    if m < 2:
+        return(None)
+    degree = min(degree, m-1)
+    chords = np.sqrt(((pts[1:] - pts[:-1])**2).sum(axis=2))
+    totals = chords.sum(axis=0)
+    valid = totals > 0
+    if not valid.any():
+        return(None)
+    cumul = np.cumsum(chords[:,valid], axis=0) / totals[valid]
+    params = np.concatenate([[0.0], cumul.mean(axis=1)])
+    params[-1] = 1.0
+    if np.any(np.diff(params) <= 0):
+        return(None)
+    inner = [params[j:j+degree].mean() for j in range(1, m-degree)]
+    flat = [0.0]*(degree+1) + inner + [1.0]*(degree+1)
+    mx = basis_matrix(degree, flat, params)
+    poles = np.linalg.solve(mx, pts.reshape(m, -1)).reshape(pts.shape)
+    knots = [0.0] + inner + [1.0]
+    mults = [degree+1] + [1]*len(inner) + [degree+1]
+    return(poles, mults, knots, degree)
+
+def surface_poles_array(surf):
+    """ Returns the poles of a BSplineSurface as a numpy array of shape (nb_u_poles, nb_v_poles, 3)"""
+    import numpy as np
+    return(np.array([[(p.x, p.y, p.z) for p in row] for row in surf.getPoles()], dtype=float))
+
+def surface_derivatives_array(surf, u, v, n=1):
+    """ Compute the partial derivatives of a surface at a set of (u,v) parameters.
+    - input: surface, parameters u and v (sequences of floats), maximum derivative order n (int)
+    - output: numpy array of shape (nb_params, n+1, n+1, 3), res[:,i,j] being the derivative
+    of order i in u and j in v. Only the derivatives with i+j <= n are computed.
+    Non rational, non periodic BSpline surfaces are evaluated by numpy, other surfaces by OCC
+    """
+    import numpy as np
+    u = np.atleast_1d(np.asarray(u, dtype=float))
+    v = np.atleast_1d(np.asarray(v, dtype=float))
+    if isinstance(surf, Part.BSplineSurface) and not (surf.isURational() or surf.isVRational() or surf.isUPeriodic() or surf.isVPeriodic()):
+        P = surface_poles_array(surf)
+        su, du = BsplineBasis(surf.UKnotSequence, surf.UDegree).ders_basis_funs_array(u, n)
+        sv, dv = BsplineBasis(surf.VKnotSequence, surf.VDegree).ders_basis_funs_array(v, n)
+        iu = su[:,None] - surf.UDegree + np.arange(surf.UDegree+1)
+        iv = sv[:,None] - surf.VDegree + np.arange(surf.VDegree+1)
+        return(np.einsum('mia,mjb,mabd->mijd', du, dv, P[iu[:,:,None], iv[:,None,:]]))
+    res = np.zeros((len(u), n+1, n+1, 3))
+    for k in range(len(u)):
+        for i in range(n+1):
+            for j in range(n+1-i):
+                if i == 0 and j == 0:
+                    p = surf.value(u[k], v[k])
+                else:
+                    p = surf.getDN(u[k], v[k], i, j)
+                res[k,i,j] = (p.x, p.y, p.z)
+    return(res)
+
+def end_derivatives(curve, par, n):
+    """ Point and n first derivatives of a curve at parameter par, with respect to
+    a parameter scaled to the curve length, like curvematch does.
+    - output: numpy array of shape (n+1, 3)
+    """
+    import numpy as np
+    fp = curve.FirstParameter
+    lp = curve.LastParameter
+    par = min(max(par, fp), lp)
+    fac = (lp - fp) / curve.length()
+    res = np.zeros((n+1, 3))
+    v = curve.value(par)
+    res[0] = (v.x, v.y, v.z)
+    for k in range(1, n+1):
+        v = curve.getDN(par, k)
+        res[k] = (v.x, v.y, v.z)
+        res[k] *= fac**k
+    return(res)
+
+def blend_poles_array(ders1, ders2, scale1=1.0, scale2=1.0, maxDegree=25):
+    """ Compute the poles of many blend curves at once, from the derivatives of the curves they join.
+    - input: ders1, ders2 (arrays of shape (nb_blends, cont+1, 3)) : point and derivatives of the
+    joined curves at the blend ends, with respect to a parameter scaled to the curve length (see end_derivatives),
+    scale1, scale2 (floats or arrays of shape (nb_blends,)) : negative scales reverse the curves,
+    maxDegree (int) : maximum degree of the blend curves
+    - output: poles (array of shape (nb_blends, cont1+cont2+2, 3)) of the blend curves,
+    that go from the end of curve 2 to the end of curve 1, like blendCurve.compute.
+    The knots of the blend curves are createKnotsMults(min(cont1+cont2+1, maxDegree), cont1+cont2+2)
+    """
+    import numpy as np
+    d1 = np.asarray(ders1, dtype=float)
+    d2 = np.asarray(ders2, dtype=float)
+    m = len(d1)
+    nb = d1.shape[1] + d2.shape[1]
+    degree = min(nb - 1, maxDegree)
+    knots = createKnots(degree, nb)
+    start = d1[:,0]
+    end = d2[:,0]
+    chord = np.sqrt(((end - start)**2).sum(axis=1))
+    t = np.linspace(0.0, 1.0, nb)
+    poles = start[:,None] + t[None,:,None] * (end - start)[:,None]
+    s1 = np.broadcast_to(np.asarray(scale1, dtype=float), (m,))
+    s2 = np.broadcast_to(np.asarray(scale2, dtype=float), (m,))
+    match_start_poles(poles, d1, s1 * chord, degree, knots)
+    poles = poles[:,::-1].copy()
+    match_start_poles(poles, d2, s2 * chord, degree, knotSeqReverse(knots))
+    return(poles)
+
+def match_start_poles(poles, ders, scale, degree, knots):
+    """ Set the first poles of bspline curves of same degree and knots (poles array of shape (nb_curves, nb_poles, 3)),
+    so that their derivatives at start match ders (array of shape (nb_curves, level+1, 3)).
+    The knots are scaled to abs(scale), and ders is reversed if scale < 0.
+    The derivatives at start only depend on the first poles, so a triangular system is solved
+    """
+    import numpy as np
+    knots = np.asarray(knots, dtype=float)
+    ran = knots[-1] - knots[0]
+    level = min(ders.shape[1], poles.shape[1]) - 1
+    # mx[l,i] : derivative l at start of basis function i
+    mx = BsplineBasis(knots, degree).ders_basis_funs_array([knots[0]], level)[1][0]
+    fac = np.where(scale < 0, -1.0, 1.0) * np.abs(scale) / ran
+    for l in range(level+1):
+        if l > degree or mx[l,l] == 0:
+            error("Zero !\n")
+            break
+        p = ders[:,l] * (fac**l)[:,None]
+        for i in range(l):
+            p -= mx[l,i] * poles[:,i]
+        poles[:,l] = p / mx[l,l]
+
+def blend_curve_from_poles(poles, maxDegree=25):
+    """ Build the BSplineCurve of the poles computed by blend_poles_array"""
+    nb = len(poles)
+    degree = min(nb - 1, maxDegree)
+    knots, mults = createKnotsMults(degree, nb)
+    bs = Part.BSplineCurve()
+    bs.buildFromPolesMultsKnots(array_to_vectors(poles), mults, knots, False, degree)
+    return(bs)
+
+def compute_blends(blends):
+    """ Compute a list of blendCurve objects.
+    The blends of same continuities and maximum degree are solved together by blend_poles_array"""
+    import numpy as np
+    groups = dict()
+    for b in blends:
+        if not b.getChord():
+            b.Curve = None
+            continue
+        groups.setdefault((b.cont1, b.cont2, b.maxDegree), []).append(b)
+    for (cont1, cont2, maxDegree), group in groups.items():
+        ders1 = np.array([end_derivatives(b.edge1, b.param1, cont1) for b in group])
+        ders2 = np.array([end_derivatives(b.edge2, b.param2, cont2) for b in group])
+        poles = blend_poles_array(ders1, ders2, [b.scale1 for b in group], [b.scale2 for b in group], maxDegree)
+        for b, p in zip(group, poles):
+            b.Curve = blend_curve_from_poles(p, maxDegree)
+
+def array_to_vectors(arr):
+    """ Converts a numpy array of shape (..., 3) to nested lists of FreeCAD.Vector"""
+    if len(arr.shape) == 1:
+        return(FreeCAD.Vector(*arr))
+    return([array_to_vectors(a) for a in arr])
+
+def curve_to_data(c):
+    """Picklable description of a BSplineCurve"""
+    poles = [(p.x, p.y, p.z) for p in c.getPoles()]
+    return((poles, c.getMultiplicities(), c.getKnots(), c.isPeriodic(), c.Degree, c.getWeights(), c.isRational()))
+
+def curve_from_data(data):
+    """Rebuild a BSplineCurve from curve_to_data output"""
+    if isinstance(data, Part.BSplineCurve):
+        return(data)
+    poles, mults, knots, periodic, degree, weights, rational = data
+    c = Part.BSplineCurve()
+    c.buildFromPolesMultsKnots([FreeCAD.Vector(*p) for p in poles], mults, knots, periodic, degree, weights, rational)
+    return(c)
+
+def surface_to_data(s):
+    """Picklable description of a BSplineSurface"""
+    poles = [[(p.x, p.y, p.z) for p in row] for row in s.getPoles()]
+    return((poles, s.getUMultiplicities(), s.getVMultiplicities(), s.getUKnots(), s.getVKnots(),
+            s.isUPeriodic(), s.isVPeriodic(), s.UDegree, s.VDegree, s.getWeights()))
+
+def surface_from_data(data):
+    """Rebuild a BSplineSurface from surface_to_data output"""
+    poles, umults, vmults, uknots, vknots, uperiodic, vperiodic, udegree, vdegree, weights = data
+    s = Part.BSplineSurface()
+    s.buildFromPolesMultsKnots([[FreeCAD.Vector(*p) for p in row] for row in poles],
+                               umults, vmults, uknots, vknots, uperiodic, vperiodic, udegree, vdegree, weights)
+    return(s)
+
+def binomial(n, k):
+    """ Binomial coefficient (n k)"""
+    from math import factorial
+    return(factorial(n) // (factorial(k) * factorial(n-k)))
+
 # This KnotVector class is equivalent to the following knotSeq* functions
 # I am not sure what is best: a class or a set of independent functions ?
 
@@ -314,64 +832,16 @@ def curvematch(c1, c2, par1, level=0, scale=1.0):
     - level (integer) is the level of continuity at join point (C0, G1, G2, G3, etc)
     - scale (float) is a scaling factor of the modified poles of curve C2
     newC2 = curvematch(C1, C2, par1, level=0, scale=1.0)'''
-    c1 = c1.toNurbs()
-    c2 = c2.toNurbs()
-    len1 = c1.length()
-    #len2 = c2.length()
-    len2 = c2.EndPoint.distanceToPoint(c2.StartPoint)
-    # scale the knot vector of C2
-    seq2 = knotSeqScale(c2.KnotSequence, 1.0 * abs(scale) * len2)
-    # get a scaled / reversed copy of C1
-    if scale < 0:
-        bs1 = bspline_copy(c1, True, len1) # reversed
-    else:
-        bs1 = bspline_copy(c1, False, len1) # not reversed
-    if par1 <= c1.FirstParameter:
-        par = c1.FirstParameter
-    elif par1 >= c1.LastParameter:
-        par = c1.LastParameter
-    else:
-        par = par1
-    pt1 = c1.value(par) # point on input curve C1
-    npar = nearest_parameter(bs1,pt1)
-
-    p1 = bs1.getPoles()
-    basis1 = BsplineBasis()
-    basis1.knots = bs1.KnotSequence
-    basis1.degree = bs1.Degree
-    
-    p2 = c2.getPoles()
-    basis2 = BsplineBasis()
-    basis2.knots = seq2
-    basis2.degree = c2.Degree
-    
-    # Compute the (level+1) first poles of C2
-    l = 0
-    while l <= level:
-        #FreeCAD.Console.PrintMessage("\nDerivative %d\n"%l)
-        ev1 = basis1.evaluate(npar,d=l)
-        ev2 = basis2.evaluate(c2.FirstParameter,d=l)
-        #FreeCAD.Console.PrintMessage("Basis %d - %r\n"%(l,ev1))
-        #FreeCAD.Console.PrintMessage("Basis %d - %r\n"%(l,ev2))
-        poles1 = FreeCAD.Vector()
-        for i in range(len(ev1)):
-            poles1 += 1.0*ev1[i]*p1[i]
-        val = ev2[l]
-        if val == 0:
-            error("Zero !")
-            break
-        else:
-            poles2 = FreeCAD.Vector()
-            for i in range(l):
-                poles2 += 1.0*ev2[i]*p2[i]
-            np = (poles1-poles2)
-            np.multiply(1.0/val)
-            #FreeCAD.Console.PrintMessage("Moving P%d from (%0.2f,%0.2f,%0.2f) to (%0.2f,%0.2f,%0.2f)\n"%(l,p2[l].x,p2[l].y,p2[l].z,np.x,np.y,np.z))
-            p2[l] = np
-        l += 1
-    nc = c2.copy()
-    for i in range(len(p2)):
-        nc.setPole(i+1,p2[i])
+    import numpy as np
+    nc = c2.toNurbs()
+    # derivatives of C1, with respect to a parameter scaled to its length (reversed if scale < 0)
+    ders = end_derivatives(c1, par1, level)
+    # the knot vector of C2 is scaled to the chord length
+    len2 = nc.EndPoint.distanceToPoint(nc.StartPoint)
+    poles = np.array([(p.x, p.y, p.z) for p in nc.getPoles()])[None]
+    match_start_poles(poles, ders[None], np.array([scale * len2]), nc.Degree, nc.KnotSequence)
+    for i in range(min(level+1, nc.NbPoles)):
+        nc.setPole(i+1, FreeCAD.Vector(*poles[0,i]))
     return(nc)
 
 class blendCurve(object):
@@ -449,26 +919,7 @@ class blendCurve(object):
         #return(res)
 
     def compute(self):
-        nbPoles = self.cont1 + self.cont2 + 2
-        e = self.getChord()
-        if not e:
-            self.Curve = None
-            return()
-        try:
-            poles = e.discretize(nbPoles)
-        except Part.OCCError:
-            self.Curve = None
-            return()
-        degree = nbPoles - 1
-        if degree > self.maxDegree:
-            degree = self.maxDegree
-        knots, mults = createKnotsMults(degree, nbPoles)
-        weights = [1.0 for k in range(nbPoles)]
-        be = Part.BSplineCurve()
-        be.buildFromPolesMultsKnots(poles, mults , knots, False, degree, weights, False)
-        nc = curvematch(self.edge1, be, self.param1, self.cont1, self.scale1)
-        rev = bspline_copy(nc, True, False)
-        self.Curve = curvematch(self.edge2, rev, self.param2, self.cont2, self.scale2)
+        compute_blends([self])
 
     def getPoles(self):
         if self.Curve:
@@ -540,56 +991,97 @@ def move_param(c,p1,p2):
 
 def move_params(c,p1,p2):
     curves = list()
-    p1.insert(0,c.FirstParameter)
-    p1.append(c.LastParameter)
-    p2.insert(0,c.FirstParameter)
-    p2.append(c.LastParameter)
+    p1 = [c.FirstParameter] + list(p1) + [c.LastParameter]
+    p2 = [c.FirstParameter] + list(p2) + [c.LastParameter]
     for i in range(len(p1)-1):
         c1 = c.copy()
         c1.segment(p2[i],p2[i+1])
         knots1 = knotSeqScale(c1.getKnots(), p1[i+1]-p1[i], p1[i])
-        print("%s -> %s"%(c1.getKnots(),knots1))
         c1.setKnots(knots1)
         curves.append(c1)
     return(curves)
 
+def concatenate_curves(curves, breaks=None):
+    """ Join non periodic BSpline curves, connected end to start, into a single curve.
+    - input: list of curves, optional list of len(curves)+1 increasing parameters :
+    curve i is then mapped on [breaks[i], breaks[i+1]] in the result.
+    By default, each curve keeps its parameter range length, and follows the previous one.
+    - output: (curve, junctions) where junctions are the indices (starting at 1) of the junction knots
+    The curves of lower degree are elevated to the highest degree. The junctions have multiplicity degree (C0).
+    The arrays of the result are filled in one pass, and the curve is built once.
+    """
+    import numpy as np
+    degree = max([c.Degree for c in curves])
+    data = list()
+    rational = False
+    for c in curves:
+        if c.Degree < degree:
+            c = c.copy()
+            c.increaseDegree(degree)
+        data.append((c.getPoles(), c.getWeights(), c.getKnots(), c.getMultiplicities()))
+        rational = rational or c.isRational()
+    nb_poles = sum([len(d[0]) for d in data]) - len(data) + 1
+    nb_knots = sum([len(d[2]) for d in data]) - len(data) + 1
+    poles = np.empty((nb_poles, 3))
+    weights = np.empty(nb_poles)
+    knots = np.empty(nb_knots)
+    mults = np.empty(nb_knots, dtype=int)
+    junctions = list()
+    ip = 0
+    ik = 0
+    for i, (p, w, k, m) in enumerate(data):
+        k = np.array(k, dtype=float)
+        w = np.array(w, dtype=float)
+        if breaks is not None:
+            k = breaks[i] + (k - k[0]) * (breaks[i+1] - breaks[i]) / (k[-1] - k[0])
+        first = 0
+        if i > 0:
+            first = 1
+            # the common knot and pole are only added once
+            k += knots[ik-1] - k[0]
+            # scale the weights so that the common pole has the same weight in both curves
+            w *= weights[ip-1] / w[0]
+            mults[ik-1] = degree
+            junctions.append(ik)
+        n = len(p) - first
+        poles[ip:ip+n] = [(v.x, v.y, v.z) for v in p[first:]]
+        weights[ip:ip+n] = w[first:]
+        nk = len(k) - first
+        knots[ik:ik+nk] = k[first:]
+        mults[ik:ik+nk] = m[first:]
+        ip += n
+        ik += nk
+    res = Part.BSplineCurve()
+    res.buildFromPolesMultsKnots(array_to_vectors(poles), mults.tolist(), knots.tolist(), False, degree, weights.tolist(), rational)
+    return(res, junctions)
+
 def join_curve(c1,c2):
-    c = Part.BSplineCurve()
-    # poles (sequence of Base.Vector), [mults , knots, periodic, degree, weights (sequence of float), CheckRational]
-    new_poles = c1.getPoles()
-    new_poles.extend(c2.getPoles()[1:])
-    new_weights = c1.getWeights()
-    new_weights.extend(c2.getWeights()[1:])
-    new_mults = c1.getMultiplicities()[:-1]
-    new_mults.append(c1.Degree)
-    new_mults.extend(c2.getMultiplicities()[1:])
-    knots1 = c1.getKnots()
-    knots2 = [knots1[-1] + k for k in c2.getKnots()]
-    new_knots = knots1
-    new_knots.extend(knots2[1:])
-    print("poles   -> %r"%new_poles)
-    print("weights -> %r"%new_weights)
-    print("mults   -> %r"%new_mults)
-    print("knots   -> %r"%new_knots)
-    c.buildFromPolesMultsKnots(new_poles, new_mults, new_knots, False, c1.Degree, new_weights, True)
-    return(c)
+    return(concatenate_curves([c1, c2])[0])
 
 def join_curves(curves):
-    c0 = curves[0]
-    for c in curves[1:]:
-        c0 = join_curve(c0,c)
-    return(c0)
+    return(concatenate_curves(curves)[0])
 
 def reparametrize(c, p1, p2):
-    '''Reparametrize a BSplineCurve so that parameter p1 is moved to p2'''
+    '''Reparametrize a BSplineCurve so that parameter p2 is moved to p1.
+    p1 and p2 can be lists of increasing parameters inside the curve range.
+    The curve is reparametrized linearly between these parameters, and keeps its range'''
+    import numpy as np
     if not isinstance(p1,(list, tuple)):
-        c1,c2 = move_param(c, p1, p2)
-        c = join_curve(c1,c2)
-        return(c)
-    else:
-        curves = move_params(c, p1, p2)
-        c = join_curves(curves)
-        return(c)
+        p1 = [p1]
+        p2 = [p2]
+    fp = c.FirstParameter
+    lp = c.LastParameter
+    old = [fp] + [float(p) for p in p2] + [lp]
+    new = [fp] + [float(p) for p in p1] + [lp]
+    # with multiplicity degree at the old parameters, the curve is reparametrized
+    # by mapping its knots, and keeping its poles
+    nc = c.copy()
+    if len(old) > 2:
+        nc.insertKnots(old[1:-1], [c.Degree] * (len(old) - 2), 0.0, False)
+    knots = np.interp(nc.getKnots(), old, new)
+    res = Part.BSplineCurve()
+    res.buildFromPolesMultsKnots(nc.getPoles(), nc.getMultiplicities(), knots.tolist(), False, nc.Degree, nc.getWeights(), nc.isRational())
+    return(res)
 
 def param_samples(edge, samples=10):
     fp = edge.FirstParameter
@@ -742,3 +1234,31 @@ def test(parm):
     print(basis1.evaluate(parm,d=1).A1.tolist())
     print(basis1.evaluate(parm,d=2).A1.tolist())
 
+def benchmark_basis(degrees=(1, 2, 3, 5), counts=(10, 100, 1000, 10000), backends=None, repeat=3):
+    """Times BsplineBasis.ders_basis_funs_array for each backend, degree and number of parameters,
+    and prints the best time per call and the maximum deviation to the python reference"""
+    import time
+    import numpy as np
+    if backends is None:
+        backends = [b for b in BASIS_BACKENDS if not (b == "numba" and numba_kernel() is None)]
+    print("%-8s %6s %8s %12s %10s"%("backend", "degree", "params", "time (ms)", "deviation"))
+    for degree in degrees:
+        nb_poles = 4 * degree + 8
+        knots = [0.0]*degree + list(np.linspace(0, 1, nb_poles - degree + 1)) + [1.0]*degree
+        nder = min(2, degree)
+        for count in counts:
+            params = np.random.rand(count)
+            reference = BsplineBasis(knots, degree, "python").ders_basis_funs_array(params, nder)[1]
+            for backend in backends:
+                bb = BsplineBasis(knots, degree, backend)
+                # first call may compile, or allocate the work arrays
+                ders = bb.ders_basis_funs_array(params, nder)[1]
+                best = None
+                for i in range(repeat):
+                    t0 = time.time()
+                    bb.ders_basis_funs_array(params, nder)
+                    t = time.time() - t0
+                    if best is None or t < best:
+                        best = t
+                dev = np.abs(ders - reference).max()
+                print("%-8s %6d %8d %12.3f %10.2e"%(backend, degree, count, 1000 * best, dev))
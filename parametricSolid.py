@@ -80,6 +80,8 @@ class solidCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Make Solid', 'ToolTip': 'Make a parametric solid from selected faces'}
+        import lazy_commands
+        return(lazy_commands.resources('solid'))
 
-FreeCADGui.addCommand('solid', solidCommand())
+import lazy_commands
+lazy_commands.add_command('solid', solidCommand())
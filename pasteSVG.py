@@ -31,6 +31,8 @@ class pasteSVG:
         #return(True)
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/svg.svg', 'MenuText': 'paste SVG', 'ToolTip': 'Pastes the SVG content of the clipboard'}
+        import lazy_commands
+        return(lazy_commands.resources('pasteSVG'))
 
-FreeCADGui.addCommand('pasteSVG', pasteSVG())
+import lazy_commands
+lazy_commands.add_command('pasteSVG', pasteSVG())
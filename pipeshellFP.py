@@ -4,6 +4,7 @@ import FreeCADGui
 import Part
 import dummy
 import _utils
+import async_compute
 
 path_curvesWB = os.path.dirname(dummy.__file__)
 path_curvesWB_icons =  os.path.join( path_curvesWB, 'Resources', 'icons')
@@ -15,6 +16,32 @@ def debug(string):
         FreeCAD.Console.PrintMessage(string)
         FreeCAD.Console.PrintMessage("\n")
 
+# Swept shapes, by sweep key (see pipeShell.sweepKey)
+# so that changing the output doesn't sweep the profiles again.
+# Entries are (input shapes, result) : holding the inputs keeps their hashCode from being reused
+sweep_cache = _utils.LRUCache(32)
+
+def cache_get(key, inputs):
+    """Cached result of key, if it was built from the same input shapes"""
+    entry = sweep_cache.get(key)
+    if entry is None:
+        return(None)
+    shapes, value = entry
+    if len(shapes) != len(inputs):
+        return(None)
+    for s1, s2 in zip(shapes, inputs):
+        if not s1.isSame(s2):
+            return(None)
+    return(value)
+
+def cache_set(key, inputs, value):
+    sweep_cache.set(key, (inputs, value))
+
+# Progressive mode : the exact shape is built after IDLE_DELAY ms without edition
+IDLE_DELAY = 1000
+idle_timers = dict()
+final_requests = set()
+
 class pipeShell:
     "PipeShell featurePython object"
     def __init__(self, obj):
@@ -37,6 +64,9 @@ class pipeShell:
         obj.addProperty("App::PropertyBool",       "Corrected",   "Mode",      "Corrected Frenet").Corrected = False
         obj.addProperty("App::PropertyBool",       "EquiCurvi",   "Mode",      "Curvilinear equivalence").EquiCurvi = False
         obj.addProperty("App::PropertyEnumeration","Contact",     "Mode",      "Type of contact to auxiliary spine").Contact = ["NoContact","Contact","ContactOnBorder"]
+        obj.addProperty("App::PropertyBool",       "Background",  "Settings",  async_compute.TOOLTIP).Background = False
+        obj.addProperty("App::PropertyBool",       "Progressive", "Settings",  "Show a preview while editing, build the exact shape when idle").Progressive = False
+        obj.addProperty("App::PropertyInteger",    "PreviewSamples", "Settings", "Number of samples of the progressive preview").PreviewSamples = 10
         obj.Mode = "DiscreteTrihedron"
         obj.Contact = "NoContact"
         obj.Output = "Sections"
@@ -252,22 +282,116 @@ class pipeShell:
         if ps.isReady():
             output = self.getprop(obj, "Output")
             solid = self.getprop(obj, "Solid") or False
-            if (output == "Surface") or (not hasattr(ps,'simulate')):
-                ps.build()
-                if solid:
-                    ps.makeSolid()
-                obj.Shape = ps.shape()
+            samples = self.getprop(obj, "Samples") or 100
+            maxdeg = self.getprop(obj, "MaxDegree")
+            inputs = self.sweepInputs(obj, edges, profs)
+            key = self.sweepKey(obj, inputs, profs)
+            job_key = (key, output, solid, samples)
+            if async_compute.enabled(obj) and async_compute.manager.finished(obj, job_key):
+                # the exact shape requested by schedule() is ready.
+                # This recompute comes from the job itself, it must not start a new preview
+                async_compute.manager.run(obj, job_key, None, self.commit)
+                return
+            if self.isPreview(obj):
+                # cheap sections, the exact shape is built when editing goes idle
+                async_compute.manager.cancel(obj)
+                samples = obj.PreviewSamples or 10
+                self.commit(obj, self.buildShape(ps, key, inputs, "Sections", solid, samples, maxdeg))
+                self.schedule(obj)
+                return
+            def compute(token):
+                return(self.buildShape(ps, key, inputs, output, solid, samples, maxdeg, token))
+            if async_compute.enabled(obj):
+                async_compute.manager.run(obj, job_key, compute, self.commit)
             else:
-                shapes = ps.simulate(self.getprop(obj, "Samples") or 100)
-                if output == "Lofted sections":
-                    obj.Shape = Part.makeLoft(shapes, solid, False, False, self.getprop(obj, "MaxDegree"))
-                else:
-                    rails = self.getRails(shapes)
-                    c = Part.Compound(shapes + rails)
-                    obj.Shape = c
+                self.commit(obj, compute(None))
         else:
             FreeCAD.Console.PrintError("\nFailed to create shape\n")
 
+    def sweepInputs(self, obj, edges, profs):
+        """Input shapes of the sweep"""
+        shapes = edges + [p.Shape for p in profs]
+        for prop in ["Support", "Auxiliary"]:
+            linked = self.getprop(obj, prop)
+            if linked:
+                shapes.append(linked.Shape)
+        return(shapes)
+
+    def sweepKey(self, obj, shapes, profs):
+        """Signature of the inputs and settings of the sweep, that don't include the output options"""
+        settings = [obj.getPropertyByName(prop) for prop in ["Mode","MaxDegree","MaxSegments","Tol3d","TolBound","TolAng","Direction","Location","Corrected","EquiCurvi","Contact"]]
+        for p in profs:
+            loc = self.getVertex(p, "Location")
+            settings.append((self.getprop(p, "Contact"), self.getprop(p, "Correction"), loc.Point if loc else None))
+        return((async_compute.shape_key(shapes), repr(settings)))
+
+    def isPreview(self, obj):
+        """In progressive mode, every execution is a preview, except the one requested by schedule()"""
+        if not (FreeCAD.GuiUp and hasattr(obj, "Progressive") and obj.Progressive):
+            return(False)
+        name = (obj.Document.Name, obj.Name)
+        if name in final_requests:
+            final_requests.discard(name)
+            return(False)
+        return(True)
+
+    def schedule(self, obj):
+        """(Re)starts the idle timer of obj, that recomputes it with the exact shape"""
+        from PySide import QtCore
+        name = (obj.Document.Name, obj.Name)
+        timer = idle_timers.get(name)
+        if timer is None:
+            timer = QtCore.QTimer()
+            timer.setSingleShot(True)
+            def build():
+                final_requests.add(name)
+                try:
+                    obj.touch()
+                    obj.Document.recompute()
+                except Exception:
+                    # the object has been deleted meanwhile
+                    idle_timers.pop(name, None)
+                final_requests.discard(name)
+            timer.timeout.connect(build)
+            idle_timers[name] = timer
+        timer.start(IDLE_DELAY)
+
+    def buildShape(self, ps, key, inputs, output, solid, samples, maxdeg, token=None):
+        """Builds the output shape of the ready pipeShell ps, through sweep_cache.
+        Doesn't access any document object, so it can run in a worker thread"""
+        if not hasattr(ps,'simulate'):
+            output = "Surface"
+        shape = cache_get((key, output, solid, samples), inputs)
+        if shape is not None:
+            debug("PipeShell : %s found in cache"%output)
+            return(shape)
+        if output == "Surface":
+            if token is not None:
+                token.check()
+            ps.build()
+            if solid:
+                if token is not None:
+                    token.progress(0.8, "PipeShell solid")
+                ps.makeSolid()
+            shape = ps.shape()
+        else:
+            shapes = cache_get((key, "Simulate", samples), inputs)
+            if shapes is None:
+                shapes = ps.simulate(samples)
+                cache_set((key, "Simulate", samples), inputs, shapes)
+            if token is not None:
+                token.progress(0.5, "PipeShell sections")
+            if output == "Lofted sections":
+                shape = Part.makeLoft(shapes, solid, False, False, maxdeg)
+            else:
+                rails = self.getRails(shapes)
+                shape = Part.Compound(shapes + rails)
+        cache_set((key, output, solid, samples), inputs, shape)
+        return(shape)
+
+    def commit(self, obj, shape):
+        obj.Shape = shape
+
     def getCode(self, cont):
         if cont == "Contact":
             return(long(1))
@@ -276,23 +400,63 @@ class pipeShell:
         else:
             return(long(0))
 
-    def getRails(self, shapes):
-        nbvert = len(shapes[0].Vertexes)
+    def getRails(self, shapes, param_tol=1e-3):
+        """Interpolates a rail through each vertex index of the sections.
+        The rails whose chord length parameters match their average within param_tol
+        share the same parameters, so they are solved all together.
+        The other rails (different vertex spacing, null length) are interpolated one by one,
+        with their own chord length parameters"""
+        import numpy as np
+        import nurbs_tools
+        vertexes = [s.Vertexes for s in shapes]
+        nbvert = min([len(v) for v in vertexes])
+        pts = np.array([[(v.Point.x, v.Point.y, v.Point.z) for v in vl[:nbvert]] for vl in vertexes])
+        if len(pts) < 2:
+            return(self.getRailsSerial(pts))
+        chords = np.sqrt(((pts[1:] - pts[:-1])**2).sum(axis=2))
+        lengths = chords.sum(axis=0)
+        valid = lengths > 0
+        params = np.zeros((len(pts), nbvert))
+        params[1:,valid] = np.cumsum(chords[:,valid], axis=0) / lengths[valid]
+        batch = np.zeros(nbvert, dtype=bool)
+        if valid.any():
+            mean = params[:,valid].mean(axis=1)
+            batch = valid & (np.abs(params - mean[:,None]).max(axis=0) <= param_tol)
+        res = None
+        if batch.sum() > 1:
+            res = nurbs_tools.interpolate_array(pts[:,batch])
+        if res is None:
+            return(self.getRailsSerial(pts))
+        poles, mults, knots, degree = res
         edges = []
+        k = 0
         for i in range(nbvert):
-            pts = []
-            for s in shapes:
-                pts.append(s.Vertexes[i].Point)
-            try:
-                bs = Part.BSplineCurve()
-                bs.interpolate(pts)
-                edges.append(bs.toShape())
-                debug("Rail %d : BSpline curve"%i)
-            except Part.OCCError:
-                po = Part.makePolygon(pts)
-                edges.append(po)
-                debug("Rail %d : Polygon"%i)
+            if not batch[i]:
+                debug("Rail %d : interpolated alone"%i)
+                edges.append(self.interpolateRail(i, pts[:,i]))
+                continue
+            bs = Part.BSplineCurve()
+            bs.buildFromPolesMultsKnots(nurbs_tools.array_to_vectors(poles[:,k]), mults, knots, False, degree)
+            edges.append(bs.toShape())
+            k += 1
+        debug("%d rails, %d batched"%(len(edges), k))
         return(edges)
+
+    def getRailsSerial(self, pts):
+        """Interpolates each rail separately"""
+        return([self.interpolateRail(i, pts[:,i]) for i in range(pts.shape[1])])
+
+    def interpolateRail(self, i, pts):
+        """Interpolates a single rail, with a polygon fallback"""
+        pl = [FreeCAD.Vector(*p) for p in pts]
+        try:
+            bs = Part.BSplineCurve()
+            bs.interpolate(pl)
+            debug("Rail %d : BSpline curve"%i)
+            return(bs.toShape())
+        except Part.OCCError:
+            debug("Rail %d : Polygon"%i)
+            return(Part.makePolygon(pl))
                 
 
 class pipeShellVP:
@@ -369,6 +533,8 @@ class pipeShellCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/pipeshell.svg', 'MenuText': 'PipeShell object', 'ToolTip': 'Creates a PipeShell object'}
+        import lazy_commands
+        return(lazy_commands.resources('pipeshell'))
 
-FreeCADGui.addCommand('pipeshell', pipeShellCommand())
+import lazy_commands
+lazy_commands.add_command('pipeshell', pipeShellCommand())
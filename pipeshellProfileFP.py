@@ -156,6 +156,8 @@ class profileCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : path_curvesWB_icons+'/profile.svg', 'MenuText': 'Profile object', 'ToolTip': 'Creates a Profile object for PipeShell'}
+        import lazy_commands
+        return(lazy_commands.resources('profile'))
 
-FreeCADGui.addCommand('profile', profileCommand())
+import lazy_commands
+lazy_commands.add_command('profile', profileCommand())
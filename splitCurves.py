@@ -159,6 +159,8 @@ class splitCommand:
             return(False)
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Split Curve', 'ToolTip': 'Splits the selected edge'}
+        import lazy_commands
+        return(lazy_commands.resources('split'))
 
-FreeCADGui.addCommand('split', splitCommand())
+import lazy_commands
+lazy_commands.add_command('split', splitCommand())
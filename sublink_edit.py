@@ -266,9 +266,11 @@ class sle:
         return False
 
     def GetResources(self):
-        return {'Pixmap' : TOOL_ICON, 'MenuText': 'Sublink editor', 'ToolTip': 'Editor widget for sublink properties of objects'}
+        import lazy_commands
+        return(lazy_commands.resources('SublinkEditor'))
 
-FreeCADGui.addCommand('SublinkEditor', sle())
+import lazy_commands
+lazy_commands.add_command('SublinkEditor', sle())
 
 
 
@@ -16,10 +16,8 @@ debug = _utils.doNothing
 class ToConsole:
     "Brings the selected objects to the python console"
     def GetResources(self):
-        return {'Pixmap'  : TOOL_ICON,
-                'MenuText': "to Console",
-                'Accel': "",
-                'ToolTip': "Objects to console"}
+        import lazy_commands
+        return(lazy_commands.resources('to_console'))
 
     def Activated(self):
         doc = ''
@@ -69,4 +67,5 @@ class ToConsole:
         else:
             return False
 
-FreeCADGui.addCommand('to_console',ToConsole())
+import lazy_commands
+lazy_commands.add_command('to_console', ToConsole())